@@ -0,0 +1,181 @@
+import hashlib
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+@dataclass
+class CachedResponse:
+    query: str
+    answer: str
+    model: str
+    latency: float  # 原始生成耗时(秒)
+    created_at: float
+    doc_version: Optional[str]
+
+
+# 比较问题文本时忽略的空白与标点
+_QUERY_NOISE = re.compile(r"[\s\.,!?;:，。！？；：、~～…\"'“”‘’]+")
+
+
+def is_standalone_query(tool_query: str, user_text: str) -> bool:
+    """模型传给 query_manual 的查询是否就是用户原话（忽略空白、标点与大小写）
+
+    Note:
+        - 追问（例如“那第二步呢”）需要结合历史改写成完整问题，改写后的查询与原话不同，
+          这类回答依赖上下文，不能缓存或跨用户复用
+    """
+    normalized = _QUERY_NOISE.sub("", tool_query).lower()
+    return bool(normalized) and normalized == _QUERY_NOISE.sub("", user_text).lower()
+
+
+def document_version(path: str) -> Optional[str]:
+    """文档内容哈希，用于判断缓存的回答是否基于当前版本的文档"""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        return None
+
+
+class SemanticResponseCache:
+    """产品说明类问题的语义回答缓存
+
+    Note:
+        - 以问题向量为键，余弦相似度不低于 threshold 视为同一问题
+        - 只缓存由 query_manual 工具回答、且生成时不带用户个人信息的回答；
+          回复带了用户记忆、摘要或历史时，缓存的是后台另行生成的不带个人信息的副本
+        - 以 query_manual 的查询为键，且只缓存查询与用户原话一致（无需结合历史改写）的问题
+        - 条目带 TTL；产品文档重新索引时整体失效（invalidate），多 worker 部署时
+          通过 ConnectionManager 的跨进程事件通知所有 worker
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl: float = 3600,
+        max_entries: int = 1000,
+        doc_version: Optional[str] = None,
+        enabled: bool = True,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.doc_version = doc_version
+        self.enabled = enabled
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._entries: List[CachedResponse] = []
+
+        # 运行指标
+        self.lookups = 0
+        self.hits = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self) -> None:
+        now = time.time()
+        keep = [i for i, e in enumerate(self._entries) if now - e.created_at < self.ttl]
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = self._vectors[keep]
+
+    def lookup(self, embedding: List[float]) -> Optional[CachedResponse]:
+        """查找语义相同问题的缓存回答"""
+        if not self.enabled:
+            return None
+        self.lookups += 1
+        self._expire()
+        if not self._entries:
+            return None
+        scores = self._vectors @ self._normalize(embedding)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        entry = self._entries[best]
+        if entry.doc_version != self.doc_version:
+            return None
+        self.hits += 1
+        return entry
+
+    def store(
+        self,
+        query: str,
+        embedding: List[float],
+        answer: str,
+        model: str,
+        latency: float,
+    ) -> None:
+        if not self.enabled or not answer:
+            return
+        vector = self._normalize(embedding)[None, :]
+        self._vectors = (
+            vector if not self._entries else np.vstack([self._vectors, vector])
+        )
+        self._entries.append(
+            CachedResponse(
+                query=query,
+                answer=answer,
+                model=model,
+                latency=latency,
+                created_at=time.time(),
+                doc_version=self.doc_version,
+            )
+        )
+        if len(self._entries) > self.max_entries:
+            self._entries = self._entries[-self.max_entries :]
+            self._vectors = self._vectors[-self.max_entries :]
+        self.stores += 1
+
+    def record_saved(self, seconds: float) -> None:
+        """记录一次命中节省的时间（原始生成耗时 - 回放耗时）"""
+        self.saved_seconds += max(seconds, 0.0)
+
+    def invalidate(self, doc_version: Optional[str] = None) -> None:
+        """清空缓存（产品文档重新索引后调用）"""
+        self._entries = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self.doc_version = doc_version
+        self.invalidations += 1
+        logger.info(f"回答缓存已清空，文档版本: {doc_version}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "saved_ms": round(self.saved_seconds * 1000, 2),
+            "doc_version": self.doc_version,
+        }
+
+
+_response_cache: SemanticResponseCache | None = None
+
+
+def get_response_cache() -> SemanticResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = SemanticResponseCache(
+            threshold=settings.RESPONSE_CACHE_THRESHOLD,
+            ttl=settings.RESPONSE_CACHE_TTL,
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            doc_version=document_version(settings.PRODUCT_DOC_PATH),
+            enabled=settings.RESPONSE_CACHE_ENABLED,
+        )
+    return _response_cache
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from app.memory.memory_service import MemoryService, get_memory_service
+from app.rag.embedder import AliyunEmbedder, get_aliyun_embedder
+
+
+class RetrievalContext:
+    """单轮对话的检索上下文
+
+    Note:
+        - 同一轮对话中相同文本的向量只计算一次，供记忆检索、手册检索等复用
+        - 用户记忆检索可在收到消息后立即启动，与本轮其他准备工作并行执行
+        - 记录本轮调用过的工具、查询与工具结果，回答是否可跨用户缓存（shareable），
+          以及生成时是否带了用户记忆、摘要或历史（personalized）
+    """
+
+    def __init__(
+        self,
+        query: str,
+        user_id: str,
+        embedder: Optional[AliyunEmbedder] = None,
+        memory_service: Optional[MemoryService] = None,
+    ):
+        self.query = query
+        self.user_id = user_id
+        self.embedder = embedder or get_aliyun_embedder()
+        self.memory_service = memory_service or get_memory_service()
+        self._embeddings: Dict[str, asyncio.Task] = {}
+        self._memory_task: Optional[asyncio.Task] = None
+        self.tool_calls: List[str] = []
+        self.tool_queries: List[str] = []  # 传给 query_manual 的查询
+        self.tool_result = ""  # 注入模型的工具结果
+        self.shareable = False
+        self.personalized = False
+
+    async def _embed_one(self, text: str) -> List[float]:
+        return (await self.embedder.embed_texts([text]))[0]
+
+    def embed(self, text: Optional[str] = None) -> "asyncio.Task[List[float]]":
+        """获取文本向量（默认为用户本轮输入），同一文本只请求一次"""
+        text = self.query if text is None else text
+        task = self._embeddings.get(text.strip())
+        if task is None:
+            task = asyncio.create_task(self._embed_one(text))
+            self._embeddings[text.strip()] = task
+        return task
+
+    async def _search_memory(self, top_k: int) -> List[dict]:
+        embedding = await self.embed()
+        return await self.memory_service.search_user_memory_parsed(
+            query=self.query, user_id=self.user_id, top_k=top_k, embedding=embedding
+        )
+
+    def start_memory_search(self, top_k: int = 5) -> "asyncio.Task[List[dict]]":
+        """提前启动用户记忆检索，重复调用返回同一个任务"""
+        if self._memory_task is None:
+            self._memory_task = asyncio.create_task(self._search_memory(top_k))
+        return self._memory_task
+
+    async def memories(self) -> List[dict]:
+        return await self.start_memory_search()
+
+    def cancel(self):
+        """取消尚未完成的检索任务（例如本轮对话提前结束）"""
+        for task in [*self._embeddings.values(), self._memory_task]:
+            if task is not None and not task.done():
+                task.cancel()
@@ -1,4 +1,5 @@
-from typing import Any, Dict, List, AsyncGenerator
+from contextlib import aclosing
+from typing import Any, Dict, List, AsyncGenerator, Tuple
 from openai.types.chat import (
     ChatCompletionMessageParam,
     ChatCompletionChunk,
@@ -8,9 +9,11 @@ from openai.types.chat import (
 from app.llm.openai_client import get_DOUBAO_llm_text_client
 from app.core.config import settings
 from app.prompt.systemPrompt import SystemPrompt, build_prompt
-from app.services.rag_service import RAGService
+from app.services.rag_service import get_rag_service
 import json
-from app.memory.memory_service import get_memory_service
+from app.agents.retrieval_context import RetrievalContext
+from app.services.conversation_summary_service import get_conversation_summarizer
+from app.agents.response_cache import get_response_cache, is_standalone_query
 
 
 # 工具定义（注册给模型）
@@ -33,15 +36,20 @@ query_manual_tool_schema: ChatCompletionToolParam = {
 }
 
 
-# 工具函数（由代码执行）
-async def call_query_manual_tool(args: Dict[str, Any]) -> str:
+# 工具函数（由代码执行），返回参考信息片段列表
+async def call_query_manual_tool(
+    args: Dict[str, Any], context: RetrievalContext
+) -> List[str]:
     query = args["query"]
-    rag_service = RAGService()
-    chunks = await rag_service.query(query)
-    return "\n".join(chunks)
+    context.tool_queries.append(query)
+    # 与用户输入相同的查询直接复用本轮已计算的向量
+    embedding = await context.embed(query)
+    rag_service = get_rag_service()
+    return await rag_service.query(query, embedding=embedding)
 
 
-memory_service = get_memory_service()
+# 回答只依赖产品文档、可跨用户缓存的工具
+SHAREABLE_TOOLS = {"query_manual"}
 
 
 # 智能体类
@@ -55,31 +63,64 @@ class NormalAgent:
             "query_manual": call_query_manual_tool,
         }
 
-    async def _handle_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> str:
+    async def _handle_tool_calls(
+        self, tool_calls: List[Dict[str, Any]], context: RetrievalContext
+    ) -> str:
         results = []
         for call in tool_calls:
             name = call.get("name")
             args = call.get("arguments", {})
             if name in self.tool_map:
-                result = await self.tool_map[name](args)
-                results.append(result)
-        return "\n".join(results)
+                context.tool_calls.append(name)
+                results.extend(await self.tool_map[name](args, context))
+        # 工具结果按返回顺序在预算内保留
+        return self.client.context.fit_tool_results(results)
+
+    async def shared_answer(
+        self, query: str, context: RetrievalContext
+    ) -> Tuple[str, str]:
+        """基于本轮的工具结果生成不带用户记忆、摘要与历史的回答，用于跨用户缓存
+
+        Returns:
+            (回答文本, 模型名称)
+        """
+        response = await self.client.chat(
+            build_prompt(SystemPrompt.TOOL_UESD_CALL, tool_result=context.tool_result),
+            ChatCompletionUserMessageParam(role="user", content=query),
+            [],
+        )
+        return response.choices[0].message.content or "", response.model
 
     async def run(
-        self, query: str, user_uuid: str, history: list[ChatCompletionMessageParam]
+        self,
+        query: str,
+        user_uuid: str,
+        history: list[ChatCompletionMessageParam],
+        context: RetrievalContext | None = None,
     ) -> AsyncGenerator[ChatCompletionChunk, None]:
+        """执行一轮对话
+
+        Args:
+            query: 用户输入
+            user_uuid: 用户ID
+            history: 历史消息
+            context: 本轮检索上下文，调用方可提前创建并启动记忆检索
+        """
+        context = context or RetrievalContext(query=query, user_id=user_uuid)
         user_prompt = ChatCompletionUserMessageParam(role="user", content=query)
-        parsed_memories = await memory_service.search_user_memory_parsed(
-            user_id=user_uuid, query=query
-        )
-        memory_text = "\n".join(
-            f"【{m['category']}】{m['content']}" for m in parsed_memories
+        parsed_memories = await context.memories()
+        # 记忆按相关度排序，在预算内保留
+        memory_text = self.client.context.fit_memories(
+            [f"【{m['category']}】{m['content']}" for m in parsed_memories]
         )
+        # 超出历史窗口的更早对话以摘要形式注入
+        summary_text = get_conversation_summarizer().get(user_uuid)
         stream = self.client.stream_chat_with_tools(
             system=build_prompt(
                 SystemPrompt.BASE_CALL,
                 assistant_name="MGAgent",
                 user_memory=memory_text,
+                conversation_summary=summary_text,
             ),
             history=history,
             prompt=user_prompt,
@@ -87,28 +128,49 @@ class NormalAgent:
             tool_choice="auto",
         )
 
-        async for chunk in stream:
-            choice = chunk.choices[0]
-
-            if chunk.id == "tool_calls_final" and choice.delta.tool_calls:
-                tool_calls = []
-                for tool_call in choice.delta.tool_calls:
-                    tool_info = {
-                        "name": tool_call.function.name,
-                        "arguments": json.loads(tool_call.function.arguments or "{}"),
-                    }
-                    tool_calls.append(tool_info)
-
-                tool_result_text = await self._handle_tool_calls(tool_calls)
-                async for chunk in self.client.stream_chat(
-                    build_prompt(
-                        SystemPrompt.TOOL_UESD_CALL,
-                        tool_result=tool_result_text,
-                        user_memory=memory_text,
-                    ),
-                    user_prompt,
-                    history,
-                ):
+        # 本生成器被关闭时同步关闭内层流，上游连接随之释放
+        async with aclosing(stream):
+            async for chunk in stream:
+                choice = chunk.choices[0]
+
+                if chunk.id == "tool_calls_final" and choice.delta.tool_calls:
+                    tool_calls = []
+                    for tool_call in choice.delta.tool_calls:
+                        tool_info = {
+                            "name": tool_call.function.name,
+                            "arguments": json.loads(
+                                tool_call.function.arguments or "{}"
+                            ),
+                        }
+                        tool_calls.append(tool_info)
+
+                    tool_result_text = await self._handle_tool_calls(
+                        tool_calls, context
+                    )
+                    # 只调用产品说明工具、且查询未经改写（无需结合历史）的回答可跨用户缓存
+                    context.shareable = (
+                        get_response_cache().enabled
+                        and bool(context.tool_calls)
+                        and set(context.tool_calls) <= SHAREABLE_TOOLS
+                        and all(
+                            is_standalone_query(q, query) for q in context.tool_queries
+                        )
+                    )
+                    # 回复照常带用户记忆、摘要与历史生成；带了个人信息时缓存的副本另行生成
+                    context.tool_result = tool_result_text
+                    context.personalized = bool(memory_text or summary_text or history)
+                    tool_stream = self.client.stream_chat(
+                        build_prompt(
+                            SystemPrompt.TOOL_UESD_CALL,
+                            tool_result=tool_result_text,
+                            user_memory=memory_text,
+                            conversation_summary=summary_text,
+                        ),
+                        user_prompt,
+                        history,
+                    )
+                    async with aclosing(tool_stream):
+                        async for chunk in tool_stream:
+                            yield chunk
+                else:
                     yield chunk
-            else:
-                yield chunk
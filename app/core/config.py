@@ -1,11 +1,26 @@
 from pydantic_settings import BaseSettings
-from typing import Literal
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
     APP_NAME: str = "UserApp"
     ENV: Literal["dev", "production"] = "production"
     DATABASE_URL: str
+    # 异步数据库连接池
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    # 聊天记录批量写入（write-behind）
+    CHAT_RECORD_FLUSH_INTERVAL: float = 0.05
+    CHAT_RECORD_FLUSH_BATCH: int = 200
+    CHAT_RECORD_MAX_PENDING: int = 10000
+    # 每个用户在内存中保留的历史对话轮数
+    CHAT_HISTORY_TURNS: int = 7
+    # 超出历史窗口的对话合并为滚动摘要：累积 N 条淘汰消息后更新一次，摘要长度上限(字)
+    CONVERSATION_SUMMARY_ENABLED: bool = True
+    CONVERSATION_SUMMARY_BATCH_MESSAGES: int = 4
+    CONVERSATION_SUMMARY_MAX_CHARS: int = 300
 
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440
@@ -17,15 +32,77 @@ class Settings(BaseSettings):
     ALI_LLM_KEY: str
     ALI_LLM_BASE_URL: str
     EMBEDDING_MODEL_NAME: str = "text-embedding-v3"
+    EMBEDDING_DIMENSIONS: int = 1024
+    # 向量化请求并发与限流（RPM/TPM 为 0 表示不限制）
+    EMBEDDING_BATCH_SIZE: int = 10
+    EMBEDDING_CONCURRENCY: int = 4
+    EMBEDDING_RPM: int = 1800
+    EMBEDDING_TPM: int = 1200000
+    EMBEDDING_MAX_RETRIES: int = 5
+    EMBEDDING_RETRY_BASE_DELAY: float = 0.5
+    # 向量缓存：内存 LRU + 可选 SQLite 磁盘缓存（不配置路径则只使用内存缓存）
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_TTL: float = 3600
+    EMBEDDING_DISK_CACHE_PATH: Optional[str] = None
+    EMBEDDING_DISK_CACHE_TTL: float = 30 * 24 * 3600
 
     HUOSHAN_LLM_KEY: str
     HUOSHAN_LLM_BASE_URL: str
+    # 产品说明问答的语义回答缓存（相似度阈值、TTL 秒、最大条目数）
+    PRODUCT_DOC_PATH: str = "docs/product.md"
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_THRESHOLD: float = 0.95
+    RESPONSE_CACHE_TTL: float = 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    # 流式回复合并发送：缓冲超过 N 秒或 N 字节时发送一帧
+    STREAM_FLUSH_INTERVAL: float = 0.02
+    STREAM_FLUSH_BYTES: int = 256
+    # 每个连接的发送队列：最大帧数、溢出策略（coalesce/drop/disconnect）、单次发送超时(秒)
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SEND_OVERFLOW_POLICY: Literal["coalesce", "drop", "disconnect"] = "coalesce"
+    WS_SEND_TIMEOUT: float = 10.0
+    # 心跳与空闲回收（0 表示不启用）：每 N 秒检查一次，向启用心跳的客户端发送 ping，
+    # 超过 IDLE_TIMEOUT 秒无活动则关闭；协议见 README
+    WS_HEARTBEAT_INTERVAL: float = 0
+    WS_IDLE_TIMEOUT: float = 0
+    # 多 worker 部署时的跨进程消息路由：memory（单进程）或 redis
+    PUBSUB_BACKEND: Literal["memory", "redis"] = "memory"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    # 启动时预加载 tiktoken 编码的等待时间(秒)，超时后加载在后台继续
+    TOKENIZER_LOAD_TIMEOUT: float = 10.0
+    # 流式请求附带 usage 统计（stream_options.include_usage），服务不支持时关闭
+    LLM_STREAM_INCLUDE_USAGE: bool = True
 
     LANGSMITH_TRACING: bool
     LANGSMITH_API_KEY: str
     LANGSMITH_ENDPOINT: str
     LANGSMITH_PROJECT: str
 
+    # 后台任务队列（记忆提取等非实时任务）
+    BACKGROUND_QUEUE_CONCURRENCY: int = 4
+    BACKGROUND_QUEUE_MAXSIZE: int = 1000
+    BACKGROUND_QUEUE_PUT_TIMEOUT: float = 1.0
+    BACKGROUND_QUEUE_DRAIN_TIMEOUT: float = 10.0
+
+    # 记忆提取按用户累积多轮后批量执行：满 N 轮或空闲超时(秒)时触发
+    MEMORY_EXTRACTION_BATCH_TURNS: int = 5
+    MEMORY_EXTRACTION_IDLE_SECONDS: float = 120.0
+    # 记忆提取前的本地过滤（短句/应答词/与已有记忆高度相似时跳过）
+    MEMORY_GATE_ENABLED: bool = True
+    MEMORY_GATE_MIN_CHARS: int = 6
+    MEMORY_GATE_NOVELTY_THRESHOLD: float = 0.95
+
+    # 用户记忆本地缓存：总内存上限与单用户最多缓存条数（超过则走 Milvus 检索）
+    MEMORY_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    MEMORY_CACHE_MAX_ROWS_PER_USER: int = 2000
+
+    # Milvus 调用线程池、并发上限与单次调用超时(秒)
+    MILVUS_MAX_WORKERS: int = 8
+    MILVUS_MAX_CONCURRENCY: int = 8
+    MILVUS_TIMEOUT: float = 5.0
+    # 文档批量写入的超时(秒)，大文档一次写入较多分块，不使用检索的超时
+    MILVUS_BULK_TIMEOUT: float = 120.0
+
     @property
     def MILVUS_HOST(self) -> str:
         return "localhost" if self.ENV == "dev" else "milvus-standalone"
@@ -1,31 +1,688 @@
-from fastapi import WebSocket
-from typing import Dict
+import asyncio
+import itertools
+import json
+import os
+import time
+import uuid as uuid_lib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Set,
+)
+
+from fastapi import WebSocket, WebSocketDisconnect
+from app.core.config import settings
 from app.core.logger import logger
+from app.core.pubsub import InMemoryPubSub, PubSubBackend, create_pubsub_backend
+from app.core.stream_relay import STATUS_STREAMING, FrameEncoder
+
+OverflowPolicy = Literal["coalesce", "drop", "disconnect"]
+# 其他 worker 发来的用户状态事件：handler(user_id, data)
+EventHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+_connection_ids = itertools.count(1)
+
+BROADCAST_CHANNEL = "ws:broadcast"
+# 心跳消息（可选协议）：客户端发送 ping 即启用心跳，服务端回复 pong；
+# 之后连接空闲时服务端发送 ping，客户端回复 pong（任何消息都视为连接仍然活跃）
+PING_MESSAGE = '{"type":"ping"}'
+PONG_MESSAGE = '{"type":"pong"}'
+# 空闲回收时使用的关闭码（going away）
+IDLE_CLOSE_CODE = 1001
+
+
+def user_channel(user_id: str) -> str:
+    return f"ws:user:{user_id}"
+
+
+class SlowConsumerError(ConnectionError):
+    """发送队列溢出（disconnect 策略）或连接已关闭"""
+
+
+@dataclass
+class _Outbound:
+    text: Optional[str] = None  # 原始消息，直接发送
+    uuid: str = ""
+    content: str = ""
+    status: str = ""
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    delivered: Optional[asyncio.Future] = None  # 需要确认写出时由 writer 设置结果
+
+    @property
+    def mergeable(self) -> bool:
+        return self.text is None and self.status == STATUS_STREAMING
+
+
+class ClientConnection:
+    """单个 WebSocket 连接及其发送队列
+
+    Note:
+        - 发送方只把消息放入有界队列，由独立的 writer 任务写入 socket，
+          慢客户端不会拖慢上游模型流的读取
+        - 队列满时按 policy 处理流式中间帧：coalesce 合并到队尾的同一回复帧，
+          drop 丢弃新的中间帧，disconnect 断开连接；start/done/error 等消息始终入队
+        - StreamMessage 帧在 writer 中编码，合并后的帧只编码一次
+        - close 后不再接收新消息，writer 发送完已入队的消息后退出
+        - receive_text 记录最近一次收到消息的时间；连接被关闭（回收、溢出断开、
+          发送失败）时正在等待的 receive_text 抛出 WebSocketDisconnect，消息循环随之结束
+    """
+
+    def __init__(
+        self,
+        user_id: str,
+        websocket: WebSocket,
+        maxsize: int = 256,
+        policy: OverflowPolicy = "coalesce",
+        send_timeout: float = 10.0,
+    ):
+        self.user_id = user_id
+        self.number = next(_connection_ids)
+        self.connection_id = f"{user_id}#{self.number}"
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self._queue: Deque[Optional[_Outbound]] = deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._closed_event = asyncio.Event()
+        self._encoder: Optional[FrameEncoder] = None
+        self._writer = asyncio.create_task(self._run(), name=f"ws-writer-{user_id}")
+
+        # 运行指标
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.send_seconds = 0.0
+        self.max_send_seconds = 0.0
+        self.last_lag = 0.0  # 最近一条消息从入队到发送完成的时间(秒)
+        self.last_seen = time.monotonic()  # 最近一次收到客户端消息的时间
+        self.last_reply = 0.0  # 最近一次发送回复帧的时间
+        self.heartbeat = False  # 客户端是否支持心跳协议
+
+    @property
+    def connected(self) -> bool:
+        return not self._closed
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def idle_seconds(self) -> float:
+        """距最近一次活动的时间：收到客户端消息或发送回复帧（正在输出回复不算空闲）"""
+        return time.monotonic() - max(self.last_seen, self.last_reply)
+
+    async def on_heartbeat(self, message_type: str) -> None:
+        """处理客户端的 ping / pong，并标记该连接支持心跳"""
+        self.heartbeat = True
+        if message_type == "ping":
+            await self.send_text(PONG_MESSAGE)
+
+    @property
+    def pending_bytes(self) -> int:
+        """发送队列中尚未写出的消息大小（字节，按 UTF-8 估算）"""
+        return sum(
+            len((item.text if item.text is not None else item.content).encode("utf-8"))
+            for item in self._queue
+            if item is not None
+        )
+
+    async def receive_text(self) -> str:
+        """接收一条客户端消息
+
+        Raises:
+            WebSocketDisconnect: 客户端断开，或连接已被服务端关闭
+        """
+        if self._closed:
+            raise WebSocketDisconnect(code=IDLE_CLOSE_CODE)
+        receive = asyncio.ensure_future(self.websocket.receive_text())
+        closed = asyncio.ensure_future(self._closed_event.wait())
+        try:
+            await asyncio.wait({receive, closed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closed.cancel()
+            if not receive.done():
+                receive.cancel()
+        if not receive.done() or receive.cancelled():
+            raise WebSocketDisconnect(code=IDLE_CLOSE_CODE)
+        text = receive.result()
+        self.last_seen = time.monotonic()
+        return text
+
+    def _put(self, item: _Outbound) -> None:
+        if self._closed:
+            raise SlowConsumerError(f"连接 {self.user_id} 已关闭")
+        if len(self._queue) >= self.maxsize:
+            if self.policy == "disconnect":
+                logger.warning(f"用户 {self.user_id} 发送队列溢出，断开连接")
+                self._discard_pending()
+                self.close(code=1013)
+                raise SlowConsumerError(f"连接 {self.user_id} 发送队列溢出")
+            if item.mergeable:
+                last = self._queue[-1] if self._queue else None
+                if (
+                    self.policy == "coalesce"
+                    and last is not None
+                    and last.mergeable
+                    and last.uuid == item.uuid
+                ):
+                    last.content += item.content
+                    self.coalesced += 1
+                    return
+                if self.policy == "drop":
+                    self.dropped += 1
+                    return
+        self._queue.append(item)
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._ready.set()
+
+    async def send_text(self, text: str, wait: bool = False) -> None:
+        """发送原始文本消息（不合并、不丢弃）
+
+        Args:
+            wait: 是否等待 writer 把消息写入 socket 后再返回
+        """
+        item = _Outbound(text=text)
+        if wait:
+            item.delivered = asyncio.get_running_loop().create_future()
+        self._put(item)
+        if item.delivered is not None:
+            await item.delivered
+
+    async def send_frame(self, uuid: str, content: str, status: str) -> None:
+        """发送一帧 StreamMessage"""
+        self._put(_Outbound(uuid=uuid, content=content, status=status))
+        self.last_reply = time.monotonic()
+
+    def _encode(self, item: _Outbound) -> str:
+        if item.text is not None:
+            return item.text
+        if self._encoder is None or self._encoder.uuid != item.uuid:
+            self._encoder = FrameEncoder(item.uuid)
+        return self._encoder.encode(item.content, item.status)
+
+    async def _run(self) -> None:
+        while True:
+            while not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+            item = self._queue.popleft()
+            if item is None:
+                return
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    self.websocket.send_text(self._encode(item)), self.send_timeout
+                )
+            except Exception as e:
+                logger.warning(f"发送到用户 {self.user_id} 失败，停止发送: {e!r}")
+                self._closed = True
+                self._closed_event.set()
+                if item.delivered is not None and not item.delivered.done():
+                    item.delivered.set_exception(SlowConsumerError(str(e)))
+                self._discard_pending()
+                return
+            if item.delivered is not None and not item.delivered.done():
+                item.delivered.set_result(None)
+            now = time.perf_counter()
+            elapsed = now - start
+            self.sent += 1
+            self.send_seconds += elapsed
+            self.max_send_seconds = max(self.max_send_seconds, elapsed)
+            self.last_lag = now - item.enqueued_at
+
+    def _discard_pending(self) -> None:
+        """清空发送队列，等待确认的发送方收到 SlowConsumerError"""
+        for item in self._queue:
+            if item is not None and item.delivered is not None:
+                if not item.delivered.done():
+                    item.delivered.set_exception(
+                        SlowConsumerError(f"连接 {self.user_id} 已关闭")
+                    )
+        self._queue.clear()
+
+    def close(self, code: Optional[int] = None) -> None:
+        """停止接收新消息；writer 发送完已入队的消息后退出
+
+        Args:
+            code: 指定时在发送完成后以该状态码关闭 socket（例如发送队列溢出）
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._closed_event.set()
+        self._queue.append(None)
+        self._ready.set()
+        if code is not None:
+            self._writer.add_done_callback(
+                lambda _: asyncio.create_task(self._close_socket(code))
+            )
+
+    def expire(self) -> int:
+        """回收连接：丢弃未发送的消息并以 1001 关闭 socket
+
+        Returns:
+            int: 丢弃的消息大小（字节）
+        """
+        discarded = self.pending_bytes
+        self._discard_pending()
+        self.close(code=IDLE_CLOSE_CODE)
+        return discarded
+
+    async def _close_socket(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception as e:
+            logger.warning(f"关闭用户 {self.user_id} 的连接失败: {e!r}")
+
+    async def wait_closed(self, timeout: Optional[float] = None) -> None:
+        """等待 writer 退出，超时后放弃未发送的消息"""
+        try:
+            await asyncio.wait_for(asyncio.shield(self._writer), timeout)
+        except asyncio.TimeoutError:
+            self._writer.cancel()
+            self._discard_pending()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "avg_send_ms": (
+                round(self.send_seconds / self.sent * 1000, 3) if self.sent else 0
+            ),
+            "max_send_ms": round(self.max_send_seconds * 1000, 3),
+            "last_lag_ms": round(self.last_lag * 1000, 3),
+            "idle_seconds": round(self.idle_seconds, 1),
+            "heartbeat": self.heartbeat,
+        }
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+    """在线连接注册表
 
-    async def connect(self, user_id: str, websocket: WebSocket):
-        # await websocket.accept()
-        self.active_connections[user_id] = websocket
-        logger.info(f"User {user_id} connected. Active: {len(self.active_connections)}")
+    Note:
+        - 同一用户可同时有多个设备（连接），按连接分别注册与移除，
+          一个设备断开不影响其他设备
+        - 一轮回复通过 user_sender 扇出到该用户的所有设备，只调用一次模型
+        - 入队不等待网络；broadcast_local 并发等待各连接写出，单个连接超时不影响其他连接
+        - 多 worker 部署时通过 backend 跨进程路由：每个进程只订阅本进程有连接的用户频道，
+          send_personal_message / broadcast 发布到频道，由持有连接的进程投递
+        - 进程内的用户状态（正在生成的回复、历史窗口、记忆缓存等）通过 publish_event
+          通知其他 worker，由 on_event 注册的处理函数更新各自的副本
+        - 心跳与回收（默认关闭）：每 heartbeat_interval 秒检查一次，发送已失败的连接被移出注册表；
+          只有启用了心跳协议的客户端会收到 ping，并在超过 idle_timeout 秒无活动时被关闭，
+          不支持心跳的旧客户端不会收到非 StreamMessage 的消息，也不会因空闲被断开
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 256,
+        policy: OverflowPolicy = "coalesce",
+        send_timeout: float = 10.0,
+        backend: Optional[PubSubBackend] = None,
+        heartbeat_interval: float = 0,
+        idle_timeout: float = 0,
+    ):
+        self.active_connections: Dict[str, Dict[str, ClientConnection]] = {}
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.backend = backend or InMemoryPubSub()
+        self.worker_id = uuid_lib.uuid4().hex[:12]
+        self._started = False
+        self._tasks: Set[asyncio.Task] = set()
+        self._event_handlers: Dict[str, EventHandler] = {}
+        # 心跳间隔与空闲超时(秒)，0 表示不启用
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self._reaper: Optional[asyncio.Task] = None
+
+        # 回收指标
+        self.pings = 0
+        self.reclaimed = {"idle": 0, "dead": 0}
+        self.reclaimed_bytes = 0
+        self.last_reap_ms = 0.0
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(c) for c in self.active_connections.values())
 
-    def disconnect(self, user_id: str):
-        self.active_connections.pop(user_id, None)
+    async def start(self) -> None:
+        """启动消息通道并订阅广播频道与已有连接的用户频道"""
+        if self._started:
+            return
+        self._started = True
+        await self.backend.start(self._on_message)
+        await self.backend.subscribe(BROADCAST_CHANNEL)
+        for user_id in list(self.active_connections):
+            await self.backend.subscribe(user_channel(user_id))
+        if self.heartbeat_interval > 0:
+            self._reaper = asyncio.create_task(self._reap_loop(), name="ws-reaper")
+
+    async def close(self) -> None:
+        """关闭所有连接与消息通道"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+        for user_id in list(self.active_connections):
+            self.disconnect(user_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.backend.close()
+        self._started = False
+
+    def _spawn(self, coro: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def connect(self, user_id: str, websocket: WebSocket) -> ClientConnection:
+        # await websocket.accept()
+        if not self._started:
+            await self.start()
+        connection = ClientConnection(
+            user_id,
+            websocket,
+            maxsize=self.queue_size,
+            policy=self.policy,
+            send_timeout=self.send_timeout,
+        )
+        devices = self.active_connections.setdefault(user_id, {})
+        devices[connection.connection_id] = connection
+        if len(devices) == 1:
+            # 本进程上该用户的第一个设备，开始接收发往该用户的消息
+            await self.backend.subscribe(user_channel(user_id))
         logger.info(
-            f"User {user_id} disconnected. Active: {len(self.active_connections)}"
+            f"User {user_id} connected ({len(devices)} devices). "
+            f"Active: {self.connection_count}"
         )
+        return connection
 
-    async def send_personal_message(self, message: str, user_id: str):
-        websocket = self.active_connections.get(user_id)
-        if websocket:
-            await websocket.send_text(message)
+    def disconnect(
+        self, user_id: str, connection: Optional[ClientConnection] = None
+    ) -> int:
+        """移除连接
 
-    async def broadcast(self, message: str):
-        for uid, connection in self.active_connections.items():
+        Args:
+            user_id: 用户ID
+            connection: 要移除的连接，不指定时移除该用户的全部连接
+
+        Returns:
+            int: 该用户剩余的连接数
+        """
+        devices = self.active_connections.get(user_id, {})
+        if connection is None:
+            removed = list(devices.values())
+            devices.clear()
+        else:
+            removed = [connection]
+            devices.pop(connection.connection_id, None)
+        for item in removed:
+            item.close()
+        if not devices and self.active_connections.pop(user_id, None) is not None:
+            self._spawn(self.backend.unsubscribe(user_channel(user_id)))
+        logger.info(
+            f"User {user_id} disconnected ({len(devices)} devices left). "
+            f"Active: {self.connection_count}"
+        )
+        return len(devices)
+
+    async def _reap_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
             try:
-                await connection.send_text(message)
+                await self.reap()
             except Exception as e:
-                logger.warning(f"Send to {uid} failed: {e}")
+                logger.warning(f"回收空闲连接失败: {e!r}")
+
+    async def reap(self) -> int:
+        """发送心跳并回收空闲或已失效的连接
+
+        Returns:
+            int: 本次回收的连接数
+
+        Note:
+            - 被回收连接的消息循环随之结束，由其关闭流程释放用户状态与数据库会话
+        """
+        start = time.perf_counter()
+        reclaimed = 0
+        for user_id, devices in list(self.active_connections.items()):
+            for connection in list(devices.values()):
+                idle = connection.idle_seconds
+                if not connection.connected:
+                    reason = "dead"
+                elif not connection.heartbeat:
+                    # 旧客户端不回复 ping，半开连接由 ASGI 服务器的协议层 ping 检测
+                    continue
+                elif self.idle_timeout > 0 and idle > self.idle_timeout:
+                    reason = "idle"
+                else:
+                    if self.heartbeat_interval > 0 and idle >= self.heartbeat_interval:
+                        try:
+                            await connection.send_text(PING_MESSAGE)
+                            self.pings += 1
+                        except SlowConsumerError:
+                            pass
+                    continue
+                self.reclaimed_bytes += connection.expire()
+                self.reclaimed[reason] += 1
+                reclaimed += 1
+                logger.info(
+                    f"Reclaim {reason} connection {connection.connection_id} "
+                    f"(idle {idle:.1f}s)"
+                )
+                self.disconnect(user_id, connection)
+        self.last_reap_ms = (time.perf_counter() - start) * 1000
+        return reclaimed
+
+    def connections(self, user_id: str) -> List[ClientConnection]:
+        return [
+            c for c in self.active_connections.get(user_id, {}).values() if c.connected
+        ]
+
+    def is_connected(self, user_id: str) -> bool:
+        return bool(self.connections(user_id))
+
+    async def _publish(self, channel: str, **envelope: Any) -> None:
+        envelope["o"] = self.worker_id
+        await self.backend.publish(channel, json.dumps(envelope, ensure_ascii=False))
+
+    def on_event(self, name: str, handler: EventHandler) -> None:
+        """注册其他 worker 发来的用户状态事件的处理函数"""
+        self._event_handlers[name] = handler
+
+    async def publish_event(
+        self, name: str, user_id: str = "", everywhere: bool = False, **data: Any
+    ) -> None:
+        """通知其他 worker 更新进程内状态（本进程不回调，单进程部署时不发送）
+
+        Args:
+            name: 事件名称，对应 on_event 注册的处理函数
+            user_id: 用户ID，不指定时为全局事件，发送给所有 worker
+            everywhere: 发送给所有 worker；默认只发送给持有该用户连接的 worker
+            **data: 事件数据（需可 JSON 序列化）
+
+        Note:
+            - 状态同步尽力而为，发送失败只记录日志，不影响本进程的处理
+        """
+        if not self.backend.remote:
+            return
+        channel = (
+            BROADCAST_CHANNEL if everywhere or not user_id else user_channel(user_id)
+        )
+        try:
+            await self._publish(channel, k="event", e=name, u=user_id, d=data)
+        except Exception as e:
+            logger.warning(f"发送用户 {user_id} 的 {name} 事件失败: {e!r}")
+
+    async def _on_message(self, channel: str, data: str) -> None:
+        """处理频道消息：按用户ID直接查找本进程的连接并入队
+
+        Note:
+            - 帧与文本消息只入队不等待写出；消息按到达顺序分发，入队前不让出事件循环，
+              同一回复的帧保持顺序
+            - 用户状态事件交给 on_event 注册的处理函数，发起事件的 worker 不处理
+        """
+        envelope = json.loads(data)
+        if envelope["k"] == "event":
+            handler = self._event_handlers.get(envelope["e"])
+            if envelope["o"] != self.worker_id and handler is not None:
+                await handler(envelope["u"], envelope["d"])
+            return
+        if channel == BROADCAST_CHANNEL:
+            connections = [
+                c
+                for devices in self.active_connections.values()
+                for c in devices.values()
+            ]
+        else:
+            connections = self.connections(envelope["u"])
+        if envelope["k"] == "frame":
+            # 发起进程已经直接投递给本地设备
+            if envelope["o"] == self.worker_id:
+                return
+            for connection in connections:
+                try:
+                    await connection.send_frame(
+                        envelope["id"], envelope["c"], envelope["s"]
+                    )
+                except SlowConsumerError:
+                    continue
+            return
+        for connection in connections:
+            try:
+                await connection.send_text(envelope["t"])
+            except SlowConsumerError as e:
+                logger.warning(f"Send to {connection.connection_id} failed: {e}")
+
+    def user_sender(self, user_id: str) -> Callable[[str, str, str], Awaitable[None]]:
+        """把 StreamMessage 帧扇出到用户所有设备的发送函数
+
+        Note:
+            - 单个设备入队失败（已断开、溢出断开）时跳过该设备，全部失败时抛出 SlowConsumerError
+            - 跨进程后端下同时发布到用户频道，投递给该用户在其他 worker 上的设备
+        """
+
+        async def send(uuid: str, content: str, status: str) -> None:
+            delivered = 0
+            for connection in self.connections(user_id):
+                try:
+                    await connection.send_frame(uuid, content, status)
+                    delivered += 1
+                except SlowConsumerError:
+                    continue
+            if self.backend.remote:
+                await self._publish(
+                    user_channel(user_id),
+                    k="frame",
+                    u=user_id,
+                    id=uuid,
+                    c=content,
+                    s=status,
+                )
+            elif not delivered:
+                raise SlowConsumerError(f"用户 {user_id} 没有可用的连接")
+
+        return send
+
+    async def send_personal_message(self, message: str, user_id: str):
+        """发送给用户的所有设备（包括其他 worker 上的连接）"""
+        await self._publish(user_channel(user_id), k="text", u=user_id, t=message)
+
+    async def broadcast(self, message: str) -> None:
+        """发送给所有 worker 上的在线连接（只入队，不等待写出）"""
+        await self._publish(BROADCAST_CHANNEL, k="text", t=message)
+
+    async def _deliver(
+        self, connection: ClientConnection, message: str, timeout: float
+    ) -> bool:
+        try:
+            await asyncio.wait_for(connection.send_text(message, wait=True), timeout)
+            return True
+        except (SlowConsumerError, asyncio.TimeoutError) as e:
+            logger.warning(f"Send to {connection.connection_id} failed: {e!r}")
+            return False
+
+    async def broadcast_local(
+        self, message: str, timeout: Optional[float] = None
+    ) -> int:
+        """并发发送给本进程的所有在线连接，等待写出完成
+
+        Args:
+            message: 消息文本
+            timeout: 单个连接的写出超时(秒)，默认使用 send_timeout
+
+        Returns:
+            int: 成功写出的连接数
+        """
+        timeout = self.send_timeout if timeout is None else timeout
+        connections = [
+            c for devices in self.active_connections.values() for c in devices.values()
+        ]
+        results = await asyncio.gather(
+            *(self._deliver(c, message, timeout) for c in connections if c.connected)
+        )
+        return sum(results)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "users": len(self.active_connections),
+            "active": self.connection_count,
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "pubsub": self.backend.stats(),
+            "heartbeat_interval": self.heartbeat_interval,
+            "idle_timeout": self.idle_timeout,
+            "pings": self.pings,
+            "reclaimed": dict(self.reclaimed),
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "last_reap_ms": round(self.last_reap_ms, 3),
+            "rss_bytes": _process_rss(),
+            # 只以连接序号标识，不暴露用户ID
+            "connections": {
+                f"#{connection.number}": connection.stats()
+                for devices in self.active_connections.values()
+                for connection in devices.values()
+            },
+        }
+
+
+def _process_rss() -> Optional[int]:
+    """当前进程的常驻内存（字节），仅 Linux 可用"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+_connection_manager: ConnectionManager | None = None
+
+
+def get_connection_manager() -> ConnectionManager:
+    global _connection_manager
+    if _connection_manager is None:
+        _connection_manager = ConnectionManager(
+            queue_size=settings.WS_SEND_QUEUE_SIZE,
+            policy=settings.WS_SEND_OVERFLOW_POLICY,
+            send_timeout=settings.WS_SEND_TIMEOUT,
+            backend=create_pubsub_backend(),
+            heartbeat_interval=settings.WS_HEARTBEAT_INTERVAL,
+            idle_timeout=settings.WS_IDLE_TIMEOUT,
+        )
+    return _connection_manager
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import settings
 
@@ -17,5 +18,39 @@ SessionLocal = sessionmaker(
     bind=engine,  # 绑定到创建的引擎
 )
 
+
+def _to_async_url(url: str) -> str:
+    """将同步驱动的连接URL转换为异步驱动URL"""
+    for prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix) :]
+    return url
+
+
+# 异步数据库URL（聊天记录等 WebSocket 热路径使用，避免阻塞事件循环）
+ASYNC_DATABASE_URL = _to_async_url(DATABASE_URL)
+
+# 创建异步数据库引擎，连接池大小可通过配置调整
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,  # 启用连接池健康检查
+    pool_size=settings.DB_POOL_SIZE,  # 常驻连接数
+    max_overflow=settings.DB_MAX_OVERFLOW,  # 高峰期允许额外创建的连接数
+    pool_timeout=settings.DB_POOL_TIMEOUT,  # 获取连接的最长等待时间(秒)
+    pool_recycle=settings.DB_POOL_RECYCLE,  # 连接最长存活时间(秒)，避免被服务端断开
+)
+
+# 创建异步数据库会话工厂
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,  # 禁用自动flush
+    expire_on_commit=False,  # 提交后不失效对象，避免再次访问属性时触发查询
+)
+
 # SQLAlchemy模型基类，所有模型类都应继承此类
 Base = declarative_base()
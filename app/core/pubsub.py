@@ -0,0 +1,179 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# 收到消息时的回调：handler(channel, data)
+MessageHandler = Callable[[str, str], Awaitable[None]]
+
+
+class PubSubBackend(ABC):
+    """ConnectionManager 的跨进程消息通道
+
+    Note:
+        - 每个进程订阅广播频道，以及本进程持有连接的用户频道；
+          发往用户的消息只投递到订阅了该用户频道的进程，进程内按用户ID字典查找连接
+        - remote 为 False 的后端只在本进程内投递（单 worker 部署）
+    """
+
+    remote = False
+
+    def __init__(self):
+        self.handler: Optional[MessageHandler] = None
+        self.published = 0
+        self.received = 0
+        self.failed = 0
+
+    async def start(self, handler: MessageHandler) -> None:
+        self.handler = handler
+
+    @abstractmethod
+    async def subscribe(self, channel: str) -> None:
+        """订阅频道"""
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str) -> None:
+        """退订频道"""
+
+    @abstractmethod
+    async def publish(self, channel: str, data: str) -> None:
+        """发布消息到频道，由订阅了该频道的进程回调 handler"""
+
+    async def close(self) -> None:
+        pass
+
+    async def _dispatch(self, channel: str, data: str) -> None:
+        self.received += 1
+        try:
+            await self.handler(channel, data)
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"处理频道 {channel} 的消息失败: {e!r}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "published": self.published,
+            "received": self.received,
+            "failed": self.failed,
+        }
+
+
+class InMemoryPubSub(PubSubBackend):
+    """进程内实现：发布即在本进程分发给已订阅的频道"""
+
+    def __init__(self):
+        super().__init__()
+        self._channels: Set[str] = set()
+
+    async def subscribe(self, channel: str) -> None:
+        self._channels.add(channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        self._channels.discard(channel)
+
+    async def publish(self, channel: str, data: str) -> None:
+        self.published += 1
+        if channel in self._channels and self.handler is not None:
+            await self._dispatch(channel, data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "channels": len(self._channels)}
+
+
+class RedisPubSub(PubSubBackend):
+    """基于 Redis PUBLISH/SUBSCRIBE 的实现，多个 worker 进程共享同一个 Redis
+
+    Args:
+        url: Redis 地址，例如 redis://localhost:6379/0
+        client: 已创建的 redis.asyncio 客户端（测试时可传入 fakeredis）
+
+    Note:
+        - redis 为可选依赖，仅在使用该后端时导入
+        - 后台任务持续读取订阅消息，每条消息交给独立任务回调 handler，
+          单个处理较慢的消息不阻塞后续消息的读取
+    """
+
+    remote = True
+
+    def __init__(self, url: str = "", client=None):
+        super().__init__()
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._reader: Optional[asyncio.Task] = None
+        self._handlers: Set[asyncio.Task] = set()
+        self._channels: Set[str] = set()
+
+    async def start(self, handler: MessageHandler) -> None:
+        await super().start(handler)
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read(), name="redis-pubsub")
+
+    async def subscribe(self, channel: str) -> None:
+        self._channels.add(channel)
+        await self.pubsub.subscribe(channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        self._channels.discard(channel)
+        await self.pubsub.unsubscribe(channel)
+
+    async def publish(self, channel: str, data: str) -> None:
+        self.published += 1
+        await self.client.publish(channel, data)
+
+    async def _read(self) -> None:
+        while True:
+            if not self._channels:
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                message = await self.pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"读取 Redis 订阅消息失败，稍后重试: {e!r}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is None:
+                continue
+            data = message["data"]
+            channel = message["channel"]
+            if isinstance(data, bytes):
+                data = data.decode("utf-8")
+            if isinstance(channel, bytes):
+                channel = channel.decode("utf-8")
+            task = asyncio.create_task(self._dispatch(channel, data))
+            self._handlers.add(task)
+            task.add_done_callback(self._handlers.discard)
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self._handlers:
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "channels": len(self._channels),
+            "handling": len(self._handlers),
+        }
+
+
+def create_pubsub_backend() -> PubSubBackend:
+    """按配置创建消息通道（PUBSUB_BACKEND: memory / redis）"""
+    if settings.PUBSUB_BACKEND == "redis":
+        return RedisPubSub(settings.REDIS_URL)
+    return InMemoryPubSub()
@@ -1,14 +1,17 @@
 import os
 import logging
-from app.rag.embedder import AliyunEmbedder
-from app.rag.milvus_handler import MilvusHandler
+from app.rag.embedder import get_aliyun_embedder
+from app.rag.milvus_handler import get_milvus_handler
 from app.rag.indexer import Indexer
+from app.core.config import settings
+from app.agents.response_cache import document_version, get_response_cache
+from app.core.connection_manager import get_connection_manager
 
 logging.basicConfig(level=logging.INFO)
 
 
 async def initialize_product_docs():
-    file_path = "docs/product.md"
+    file_path = settings.PRODUCT_DOC_PATH
     if not os.path.exists(file_path):
         logging.error(f"文件未找到: {file_path}")
         return
@@ -17,11 +20,15 @@ async def initialize_product_docs():
         content = file.read()
         logging.info("成功读取产品文档。")
 
-    embedder = AliyunEmbedder()
+    embedder = get_aliyun_embedder()
     embeddings = await embedder.embed_texts([content])
     logging.info("成功嵌入产品文档。")
 
-    milvus_handler = MilvusHandler()
+    milvus_handler = get_milvus_handler()
     indexer = Indexer(embedder, milvus_handler)
     await indexer.index_document(content, file_type="md")
     logging.info("成功索引产品文档。")
+    # 文档重新索引后，基于旧文档生成的缓存回答全部失效（包括其他 worker 上的缓存）
+    version = document_version(file_path)
+    get_response_cache().invalidate(version)
+    await get_connection_manager().publish_event("response_cache", doc_version=version)
@@ -0,0 +1,220 @@
+import asyncio
+import time
+from json.encoder import encode_basestring
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+
+# StreamMessage 的状态取值
+STATUS_START = "start"
+STATUS_STREAMING = "streaming"
+STATUS_DONE = "done"
+
+
+class FrameEncoder:
+    """StreamMessage 帧编码器
+
+    Note:
+        - 输出与 StreamMessage(uuid, content, status).model_dump_json() 逐字节一致
+        - uuid 与 status 部分在创建时编码好，每帧只需转义 content
+    """
+
+    def __init__(self, uuid: str):
+        self.uuid = uuid
+        self._head = '{"uuid":' + encode_basestring(uuid) + ',"content":'
+        self._tails = {
+            status: f',"status":"{status}"}}'
+            for status in (STATUS_START, STATUS_STREAMING, STATUS_DONE)
+        }
+
+    def encode(self, content: str, status: str) -> str:
+        tail = self._tails.get(status) or ',"status":' + encode_basestring(status) + "}"
+        return self._head + encode_basestring(content) + tail
+
+
+class StreamRelayStats:
+    """流式转发统计（所有连接共享）"""
+
+    def __init__(self):
+        self.responses = 0
+        self.chunks = 0  # 上游增量数
+        self.frames = 0  # 实际发送的帧数
+        self.stopped = 0  # 被用户停止或连接断开而中止的回复数
+        self.bytes = 0  # 发送的 content 字节数
+        self.send_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "responses": self.responses,
+            "chunks": self.chunks,
+            "frames": self.frames,
+            "stopped": self.stopped,
+            "bytes": self.bytes,
+            "chunks_per_frame": (
+                round(self.chunks / self.frames, 2) if self.frames else 0
+            ),
+            "avg_send_ms": (
+                round(self.send_seconds / self.frames * 1000, 3) if self.frames else 0
+            ),
+        }
+
+
+class StreamRelay:
+    """把上游增量合并成帧后交给发送方
+
+    Args:
+        send: 发送一帧的协程函数 send(uuid, content, status)，
+            通常为连接发送队列的 ClientConnection.send_frame
+
+    Note:
+        - 缓冲区达到 max_bytes，或第一段缓冲内容等待超过 flush_interval 秒时发送一帧
+        - 协议保持 start → streaming... → done：首个增量到达前发送 start，
+          finish 时把剩余内容放在 done 帧中发送
+        - 完整回复用列表累积，结束时一次拼接
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, str, str], Awaitable[Any]],
+        uuid: str,
+        flush_interval: float = 0.02,
+        max_bytes: int = 256,
+        stats: Optional[StreamRelayStats] = None,
+    ):
+        self.send = send
+        self.uuid = uuid
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.stats = stats or get_stream_relay_stats()
+        self._parts: List[str] = []
+        self._buffer: List[str] = []
+        self._buffer_bytes = 0
+        self._started = False
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    async def _send(self, content: str, status: str, size: int = 0) -> None:
+        start = time.perf_counter()
+        await self.send(self.uuid, content, status)
+        self.stats.send_seconds += time.perf_counter() - start
+        self.stats.frames += 1
+        self.stats.bytes += size
+
+    async def _ensure_started(self) -> None:
+        if not self._started:
+            self._started = True
+            await self._send("", STATUS_START)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._timer_task = asyncio.create_task(self._flush(STATUS_STREAMING))
+
+    async def _flush(self, status: str) -> None:
+        async with self._lock:
+            self._cancel_timer()
+            if not self._buffer and status == STATUS_STREAMING:
+                return
+            content = "".join(self._buffer)
+            size = self._buffer_bytes
+            self._buffer = []
+            self._buffer_bytes = 0
+            await self._ensure_started()
+            await self._send(content, status, size)
+
+    async def push(self, piece: str) -> None:
+        """写入一段上游增量"""
+        self.stats.chunks += 1
+        if not self._started:
+            async with self._lock:
+                await self._ensure_started()
+        if not piece:
+            return
+        self._parts.append(piece)
+        self._buffer.append(piece)
+        self._buffer_bytes += len(piece.encode("utf-8"))
+        if self._buffer_bytes >= self.max_bytes:
+            await self._flush(STATUS_STREAMING)
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.flush_interval, self._on_timer
+            )
+
+    async def finish(self) -> str:
+        """发送剩余内容与 done 帧，返回完整回复"""
+        self._cancel_timer()
+        if self._timer_task is not None:
+            await self._timer_task
+        await self._flush(STATUS_DONE)
+        self.stats.responses += 1
+        return self.text
+
+    async def stop(self, notify: bool = True) -> str:
+        """中止本轮回复，返回已生成的部分内容
+
+        Args:
+            notify: 连接仍可用时把已缓冲的内容放在 done 帧中发出，客户端据此结束本轮显示
+        """
+        self.close()
+        self.stats.stopped += 1
+        if notify:
+            try:
+                await self._flush(STATUS_DONE)
+            except Exception:
+                # 连接已断开，发送失败不影响保存部分回复
+                pass
+        return self.text
+
+    def close(self) -> None:
+        """放弃未发送的内容（连接已断开或本轮异常结束）"""
+        self._cancel_timer()
+        if self._timer_task is not None and not self._timer_task.done():
+            self._timer_task.cancel()
+
+
+_stream_relay_stats: StreamRelayStats | None = None
+
+
+def get_stream_relay_stats() -> StreamRelayStats:
+    global _stream_relay_stats
+    if _stream_relay_stats is None:
+        _stream_relay_stats = StreamRelayStats()
+    return _stream_relay_stats
+
+
+def websocket_sender(
+    websocket: WebSocket,
+) -> Callable[[str, str, str], Awaitable[None]]:
+    """直接写入 WebSocket 的发送函数（不经过连接发送队列）"""
+    encoders: Dict[str, FrameEncoder] = {}
+
+    async def send(uuid: str, content: str, status: str) -> None:
+        encoder = encoders.get(uuid)
+        if encoder is None:
+            encoder = encoders[uuid] = FrameEncoder(uuid)
+        await websocket.send_text(encoder.encode(content, status))
+
+    return send
+
+
+def create_stream_relay(
+    send: Callable[[str, str, str], Awaitable[Any]], uuid: str
+) -> StreamRelay:
+    """按配置创建一轮回复的转发器"""
+    return StreamRelay(
+        send,
+        uuid,
+        flush_interval=settings.STREAM_FLUSH_INTERVAL,
+        max_bytes=settings.STREAM_FLUSH_BYTES,
+    )
@@ -0,0 +1,184 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+@dataclass
+class _Job:
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    args: tuple
+    kwargs: dict
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class BackgroundTaskQueue:
+    """进程内异步任务队列
+
+    Note:
+        - 固定数量的 worker 并发消费，限制后台任务对上游服务的并发压力
+        - 队列有上限，队列满时 submit 会等待（背压），超过等待时间则丢弃任务
+        - 关闭时会先等待队列中的任务执行完毕（drain），超时后取消剩余任务
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int = 4,
+        maxsize: int = 1000,
+        put_timeout: float = 1.0,
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.put_timeout = put_timeout
+        self._queue: asyncio.Queue[_Job] = asyncio.Queue(maxsize=maxsize)
+        self._workers: List[asyncio.Task] = []
+        self._closing = False
+
+        # 运行指标
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.running = 0
+        self.last_lag = 0.0  # 最近一个任务从入队到开始执行的等待时间(秒)
+        self.max_lag = 0.0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        """启动 worker，可重复调用"""
+        if self._workers:
+            return
+        self._closing = False
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        logger.info(f"后台队列 {self.name} 已启动，并发数: {self.concurrency}")
+
+    async def submit(
+        self, name: str, func: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> bool:
+        """提交后台任务
+
+        Args:
+            name: 任务名称，用于日志
+            func: 异步可调用对象
+            *args, **kwargs: 调用参数
+
+        Returns:
+            bool: 是否成功入队（队列关闭或持续满载时返回 False）
+        """
+        if self._closing:
+            logger.warning(f"后台队列 {self.name} 正在关闭，丢弃任务 {name}")
+            self.dropped += 1
+            return False
+        if not self._workers:
+            self.start()
+
+        job = _Job(name=name, func=func, args=args, kwargs=kwargs)
+        try:
+            await asyncio.wait_for(self._queue.put(job), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            logger.warning(
+                f"后台队列 {self.name} 已满({self._queue.qsize()})，丢弃任务 {name}"
+            )
+            return False
+        self.submitted += 1
+        return True
+
+    def submit_nowait(
+        self, name: str, func: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> bool:
+        """提交后台任务，队列满时立即丢弃而不等待（用于请求路径）
+
+        Returns:
+            bool: 是否成功入队
+        """
+        if self._closing:
+            self.dropped += 1
+            return False
+        if not self._workers:
+            self.start()
+        try:
+            self._queue.put_nowait(_Job(name=name, func=func, args=args, kwargs=kwargs))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"后台队列 {self.name} 已满，丢弃任务 {name}")
+            return False
+        self.submitted += 1
+        return True
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            lag = time.monotonic() - job.enqueued_at
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.running += 1
+            try:
+                await job.func(*job.args, **job.kwargs)
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"后台任务 {job.name} 执行失败: {e}")
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = 10.0):
+        """停止接收新任务，等待已入队任务执行完毕后关闭 worker"""
+        self._closing = True
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"后台队列 {self.name} 关闭超时，剩余 {self._queue.qsize()} 个任务被取消"
+            )
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info(f"后台队列 {self.name} 已关闭")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "depth": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+        }
+
+
+_background_queue: BackgroundTaskQueue | None = None
+
+
+def get_background_queue() -> BackgroundTaskQueue:
+    global _background_queue
+    if _background_queue is None:
+        _background_queue = BackgroundTaskQueue(
+            name="background",
+            concurrency=settings.BACKGROUND_QUEUE_CONCURRENCY,
+            maxsize=settings.BACKGROUND_QUEUE_MAXSIZE,
+            put_timeout=settings.BACKGROUND_QUEUE_PUT_TIMEOUT,
+        )
+    return _background_queue
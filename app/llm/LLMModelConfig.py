@@ -9,6 +9,8 @@ class ModelConfig:
     base_url: str
     temperature: float
     api_key: str = settings.ALI_LLM_KEY
+    # 单次请求的输入 token 预算（系统提示词 + 历史 + 本轮输入），超出时按优先级裁剪
+    context_budget: int = 8192
 
 
 class LLMModelConfig(Enum):
@@ -23,6 +25,7 @@ class LLMModelConfig(Enum):
         base_url=settings.ALI_LLM_BASE_URL,
         api_key=settings.ALI_LLM_KEY,
         temperature=0.7,
+        context_budget=16384,  # 图片按固定 token 计入，预算放宽
     )
     QWEN_PLUS_LATEST = ModelConfig(
         model="qwen-plus-latest",
@@ -41,4 +44,5 @@ class LLMModelConfig(Enum):
         base_url=settings.HUOSHAN_LLM_BASE_URL,
         api_key=settings.HUOSHAN_LLM_KEY,
         temperature=1.0,
+        context_budget=12288,  # 32k 上下文，输入控制在 12k 以内保证首字延迟与成本
     )
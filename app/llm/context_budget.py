@@ -0,0 +1,297 @@
+import asyncio
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from app.core.logger import logger
+
+# 每条消息的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+# 图片按固定 token 数计入
+IMAGE_PART_TOKENS = 1024
+
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+class TokenCounter:
+    """本地 token 计数
+
+    Note:
+        - 优先使用 tiktoken 的 cl100k_base 编码；未安装或编码文件无法加载时按字符估算
+          （中文每字约 1 token，其余约 4 字符 1 token），估算值偏保守
+        - 导入模块不访问网络；应用启动时在线程中预加载编码（见 preload_token_counter），
+          编码文件不在本地缓存时 tiktoken 会下载，离线部署可预先下载并通过 TIKTOKEN_CACHE_DIR 指定缓存目录
+        - 未预加载时在首次计数时加载；预加载仍在进行时计数不等待，先按字符估算
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base", use_tiktoken: bool = True):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._pending = use_tiktoken  # 尚未尝试加载编码
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """加载 tiktoken 编码，只尝试一次，失败后按字符数估算
+
+        Returns:
+            bool: 是否使用精确计数
+        """
+        with self._lock:
+            if self._pending:
+                self._pending = False
+                try:
+                    import tiktoken
+
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+                except Exception as e:
+                    logger.warning(f"tiktoken 不可用，按字符数估算 token: {e}")
+        return self._encoding is not None
+
+    @property
+    def encoding(self):
+        if self._pending:
+            self.load()
+        return self._encoding
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    def count(self, text: Optional[str]) -> int:
+        if not text:
+            return 0
+        encoding = self.encoding
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        cjk = len(_CJK.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截断文本使其不超过 max_tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        encoding = self.encoding
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            return encoding.decode(tokens[:max_tokens])
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count(text[:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low]
+
+    def count_content(self, content: Any) -> int:
+        if content is None:
+            return 0
+        if isinstance(content, str):
+            return self.count(content)
+        total = 0
+        for part in content:
+            if part.get("type") == "text":
+                total += self.count(part.get("text"))
+            elif part.get("type") == "image_url":
+                total += IMAGE_PART_TOKENS
+        return total
+
+    def count_message(self, message: ChatCompletionMessageParam) -> int:
+        return MESSAGE_OVERHEAD_TOKENS + self.count_content(message.get("content"))
+
+    def count_messages(self, messages: Iterable[ChatCompletionMessageParam]) -> int:
+        return sum(self.count_message(m) for m in messages)
+
+
+def strip_images(message: ChatCompletionMessageParam) -> ChatCompletionMessageParam:
+    """去掉消息中的图片部分，只保留文本"""
+    content = message.get("content")
+    if isinstance(content, str) or not content:
+        return message
+    text_parts = [p for p in content if p.get("type") != "image_url"]
+    if len(text_parts) == len(content):
+        return message
+    return {**message, "content": text_parts}
+
+
+class ContextBudgetStats:
+    """上下文裁剪指标：按区块统计裁剪掉的 token 数"""
+
+    def __init__(self):
+        self.requests = 0
+        self.trimmed_requests = 0
+        self.input_tokens = 0
+        self.max_input_tokens = 0
+        self.trimmed_tokens: Dict[str, int] = {}
+
+    def record_trim(self, section: str, tokens: int) -> None:
+        if tokens > 0:
+            self.trimmed_tokens[section] = self.trimmed_tokens.get(section, 0) + tokens
+
+    def record_request(self, input_tokens: int, trimmed: bool) -> None:
+        self.requests += 1
+        self.trimmed_requests += int(trimmed)
+        self.input_tokens += input_tokens
+        self.max_input_tokens = max(self.max_input_tokens, input_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "trimmed_requests": self.trimmed_requests,
+            "avg_input_tokens": (
+                round(self.input_tokens / self.requests, 1) if self.requests else 0
+            ),
+            "max_input_tokens": self.max_input_tokens,
+            "trimmed_tokens": dict(self.trimmed_tokens),
+        }
+
+
+class ContextAssembler:
+    """按模型的 token 预算组装上下文
+
+    优先级（从高到低）：
+        1. 系统提示词静态部分与本轮用户输入，不裁剪
+        2. 工具结果：最多占预算的 tool_share，按返回顺序保留
+        3. 用户记忆：最多占预算的 memory_share，按相关度顺序保留
+        4. 历史对话：使用剩余预算，从最近一轮往前保留；只有最近 keep_images 条消息保留图片
+
+    Note:
+        - 工具结果和用户记忆写入系统提示词，需在构建提示词前裁剪（fit_tool_results / fit_memories）
+        - 历史对话在发送前按剩余预算裁剪（fit_history）
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        counter: Optional[TokenCounter] = None,
+        stats: Optional[ContextBudgetStats] = None,
+        memory_share: float = 0.15,
+        tool_share: float = 0.4,
+        keep_images: int = 2,
+    ):
+        self.budget = budget
+        self.counter = counter or get_token_counter()
+        self.stats = stats or get_context_budget_stats()
+        self.memory_share = memory_share
+        self.tool_share = tool_share
+        self.keep_images = keep_images
+
+    def _fit_items(self, items: List[str], max_tokens: int, section: str) -> List[str]:
+        kept: List[str] = []
+        used = 0
+        for index, item in enumerate(items):
+            tokens = self.counter.count(item) + 1  # 换行
+            if used + tokens <= max_tokens:
+                kept.append(item)
+                used += tokens
+                continue
+            # 第一条就超出预算时截断保留，其余整体丢弃
+            if not kept:
+                truncated = self.counter.truncate(item, max_tokens - 1)
+                if truncated:
+                    kept.append(truncated)
+                self.stats.record_trim(section, tokens - self.counter.count(truncated))
+                rest = items[index + 1 :]
+            else:
+                rest = items[index:]
+            self.stats.record_trim(
+                section, sum(self.counter.count(i) + 1 for i in rest)
+            )
+            break
+        return kept
+
+    def fit_memories(self, memories: List[str]) -> str:
+        """按相关度顺序保留用户记忆，返回拼接后的文本"""
+        max_tokens = int(self.budget * self.memory_share)
+        return "\n".join(self._fit_items(memories, max_tokens, "memory"))
+
+    def fit_tool_results(self, results: List[str]) -> str:
+        """按返回顺序保留工具结果，返回拼接后的文本"""
+        max_tokens = int(self.budget * self.tool_share)
+        return "\n".join(self._fit_items(results, max_tokens, "tool_result"))
+
+    def fit_history(
+        self,
+        system: ChatCompletionMessageParam,
+        prompt: ChatCompletionMessageParam,
+        history: List[ChatCompletionMessageParam],
+    ) -> List[ChatCompletionMessageParam]:
+        """在剩余预算内从最近一轮往前保留历史消息"""
+        fixed = self.counter.count_message(system) + self.counter.count_message(prompt)
+        remaining = self.budget - fixed
+
+        kept: List[ChatCompletionMessageParam] = []
+        used = 0
+        trimmed = 0
+        for index, message in enumerate(reversed(history)):
+            if index >= self.keep_images:
+                stripped = strip_images(message)
+                trimmed += self.counter.count_message(
+                    message
+                ) - self.counter.count_message(stripped)
+                message = stripped
+            tokens = self.counter.count_message(message)
+            if used + tokens > remaining:
+                older = history[: len(history) - index - 1]
+                trimmed += tokens + self.counter.count_messages(older)
+                break
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+
+        # 保证历史以用户消息开头，避免孤立的助手回复
+        while kept and kept[0].get("role") == "assistant":
+            dropped = kept.pop(0)
+            tokens = self.counter.count_message(dropped)
+            trimmed += tokens
+            used -= tokens
+
+        self.stats.record_trim("history", trimmed)
+        self.stats.record_request(fixed + used, trimmed > 0)
+        if fixed > self.budget:
+            logger.warning(
+                f"系统提示词与本轮输入共 {fixed} tokens，超出预算 {self.budget}"
+            )
+        return kept
+
+
+_token_counter: TokenCounter | None = None
+_context_budget_stats: ContextBudgetStats | None = None
+
+
+def get_token_counter() -> TokenCounter:
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = TokenCounter()
+    return _token_counter
+
+
+async def preload_token_counter(
+    counter: Optional[TokenCounter] = None, timeout: float = 10.0
+) -> bool:
+    """在线程中加载 tiktoken 编码，不阻塞事件循环
+
+    Args:
+        counter: 计数器，默认使用全局实例
+        timeout: 等待时间(秒)，超时后不再等待，加载在后台继续，完成前按字符估算
+
+    Returns:
+        bool: 是否已可以精确计数
+    """
+    counter = counter or get_token_counter()
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(counter.load), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"tiktoken 编码 {timeout}s 内未加载完成，暂按字符数估算 token")
+        return False
+
+
+def get_context_budget_stats() -> ContextBudgetStats:
+    global _context_budget_stats
+    if _context_budget_stats is None:
+        _context_budget_stats = ContextBudgetStats()
+    return _context_budget_stats
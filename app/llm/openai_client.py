@@ -1,6 +1,7 @@
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, NOT_GIVEN
 import asyncio
-from typing import AsyncGenerator, Iterable
+from typing import Any, AsyncGenerator, Dict, Iterable, Optional
+from openai.types import CompletionUsage
 from app.llm.base import BaseLLM
 from app.llm import LLMModelConfig
 from openai.types.chat import (
@@ -13,6 +14,53 @@ from openai.types.chat import (
 from app.llm.LLMModelConfig import LLMModelConfig
 from langsmith.wrappers import wrap_openai
 from langsmith import traceable
+from app.core.config import settings
+from app.llm.context_budget import ContextAssembler
+
+
+class UsageStats:
+    """按模型累计 token 用量，cached_tokens 为命中模型服务前缀缓存的输入 token 数"""
+
+    def __init__(self):
+        self._models: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, usage: Optional[CompletionUsage]) -> None:
+        if usage is None:
+            return
+        counters = self._models.setdefault(
+            model,
+            {
+                "requests": 0,
+                "prompt_tokens": 0,
+                "cached_tokens": 0,
+                "completion_tokens": 0,
+            },
+        )
+        details = usage.prompt_tokens_details
+        counters["requests"] += 1
+        counters["prompt_tokens"] += usage.prompt_tokens or 0
+        counters["cached_tokens"] += (details.cached_tokens or 0) if details else 0
+        counters["completion_tokens"] += usage.completion_tokens or 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            model: {
+                **counters,
+                "cache_hit_rate": (
+                    round(counters["cached_tokens"] / counters["prompt_tokens"], 4)
+                    if counters["prompt_tokens"]
+                    else 0
+                ),
+            }
+            for model, counters in self._models.items()
+        }
+
+
+_usage_stats = UsageStats()
+
+
+def get_llm_usage_stats() -> UsageStats:
+    return _usage_stats
 
 
 class OpenAILLMClient(BaseLLM):
@@ -31,6 +79,17 @@ class OpenAILLMClient(BaseLLM):
         )
         self.model = config.model  # 设置模型名称
         self.temperature = config.temperature  # 设置生成温度参数
+        self.context = ContextAssembler(budget=config.context_budget)  # 输入 token 预算
+        # 流式响应末尾附带 usage（choices 为空的最后一个 chunk），用于统计缓存命中
+        self.stream_options = (
+            {"include_usage": True} if settings.LLM_STREAM_INCLUDE_USAGE else NOT_GIVEN
+        )
+
+    def _usage_chunk(self, chunk: ChatCompletionChunk) -> bool:
+        """记录 usage chunk 的用量，返回该 chunk 是否只携带 usage（不向下游转发）"""
+        if chunk.usage is not None:
+            _usage_stats.record(self.model, chunk.usage)
+        return not chunk.choices
 
     @traceable
     async def chat(
@@ -40,7 +99,7 @@ class OpenAILLMClient(BaseLLM):
         history: list[ChatCompletionMessageParam],
     ) -> ChatCompletion:
         messages: list[ChatCompletionMessageParam] = [system]
-        messages.extend(history)
+        messages.extend(self.context.fit_history(system, prompt, history))
         messages.append(prompt)
         response = await self.client.chat.completions.create(
             model=self.model,
@@ -48,9 +107,11 @@ class OpenAILLMClient(BaseLLM):
             stream=False,
             temperature=self.temperature,
         )
+        _usage_stats.record(self.model, response.usage)
         return response
 
-    @traceable
+    # 不加 @traceable：其包装生成器被关闭时不会关闭内层生成器，上游流无法及时释放；
+    # 模型调用本身已由 wrap_openai 记录
     async def stream_chat(
         self,
         system: ChatCompletionSystemMessageParam,
@@ -58,7 +119,7 @@ class OpenAILLMClient(BaseLLM):
         history: list[ChatCompletionMessageParam],
     ) -> AsyncGenerator[ChatCompletionChunk, None]:
         messages: list[ChatCompletionMessageParam] = [system]
-        messages.extend(history)
+        messages.extend(self.context.fit_history(system, prompt, history))
         messages.append(prompt)
 
         stream = await self.client.chat.completions.create(
@@ -66,10 +127,15 @@ class OpenAILLMClient(BaseLLM):
             messages=messages,
             stream=True,
             temperature=self.temperature,
+            stream_options=self.stream_options,
         )
-        async for chunk in stream:
-            yield chunk
-            await asyncio.sleep(0)
+        # 调用方提前关闭生成器（用户停止生成、连接断开）时立即关闭上游连接
+        async with stream:
+            async for chunk in stream:
+                if self._usage_chunk(chunk):
+                    continue
+                yield chunk
+                await asyncio.sleep(0)
 
     async def stream_chat_with_tools(
         self,
@@ -80,7 +146,7 @@ class OpenAILLMClient(BaseLLM):
         tool_choice: str = "auto",
     ) -> AsyncGenerator[ChatCompletionChunk, None]:
         messages: list[ChatCompletionMessageParam] = [system]
-        messages.extend(history)
+        messages.extend(self.context.fit_history(system, prompt, history))
         messages.append(prompt)
 
         stream = await self.client.chat.completions.create(
@@ -91,35 +157,45 @@ class OpenAILLMClient(BaseLLM):
             tools=tools,
             tool_choice=tool_choice,
             parallel_tool_calls=True,
+            stream_options=self.stream_options,
         )
 
         tool_calls_complete = False
         tool_call_accumulator = {}
 
-        async for chunk in stream:
-            choice = chunk.choices[0]
+        async with stream:
+            async for chunk in stream:
+                if self._usage_chunk(chunk):
+                    if tool_calls_complete:
+                        break
+                    continue
+                if tool_calls_complete:
+                    # 工具调用已结束，继续读取直到 usage chunk，记录这一段请求的用量
+                    continue
+                choice = chunk.choices[0]
 
-            # 收集普通响应内容
-            if not choice.delta.tool_calls and choice.finish_reason != "tool_calls":
-                yield chunk
-                continue
-
-            # 收集工具调用片段
-            if choice.delta.tool_calls:
-                for tool_call in choice.delta.tool_calls:
-                    idx = tool_call.index
-                    func = tool_call.function
-                    if idx not in tool_call_accumulator:
-                        tool_call_accumulator[idx] = {"name": "", "arguments": ""}
-
-                    if func.name:
-                        tool_call_accumulator[idx]["name"] = func.name
-                    if func.arguments:
-                        tool_call_accumulator[idx]["arguments"] += func.arguments
-
-            if choice.finish_reason == "tool_calls":
-                tool_calls_complete = True
-                break
+                # 收集普通响应内容
+                if not choice.delta.tool_calls and choice.finish_reason != "tool_calls":
+                    yield chunk
+                    continue
+
+                # 收集工具调用片段
+                if choice.delta.tool_calls:
+                    for tool_call in choice.delta.tool_calls:
+                        idx = tool_call.index
+                        func = tool_call.function
+                        if idx not in tool_call_accumulator:
+                            tool_call_accumulator[idx] = {"name": "", "arguments": ""}
+
+                        if func.name:
+                            tool_call_accumulator[idx]["name"] = func.name
+                        if func.arguments:
+                            tool_call_accumulator[idx]["arguments"] += func.arguments
+
+                if choice.finish_reason == "tool_calls":
+                    tool_calls_complete = True
+                    if self.stream_options is NOT_GIVEN:
+                        break
 
         if tool_calls_complete:
             from openai.types.chat import ChatCompletionChunk
@@ -12,10 +12,19 @@ from app.core.logger import logger
 from app.core.config import settings
 from fastapi.responses import HTMLResponse
 
-# from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager
 from app.routers import rag_test
 from app.routers import agent_test
 from app.routers import eval
+from app.routers import metrics
+from app.core.task_queue import get_background_queue
+from app.core.connection_manager import get_connection_manager
+from app.services.chat_record_writer import get_chat_record_writer
+from app.services.rag_service import get_rag_service, is_rag_service_ready
+from app.rag.milvus_executor import get_milvus_executor
+from app.memory.memory_extractor import get_memory_extractor
+from app.llm.context_budget import preload_token_counter
+import asyncio
 
 from dotenv import load_dotenv
 
@@ -25,31 +34,48 @@ load_dotenv()
 logger.info("🚀 应用启动成功")
 
 
-# @asynccontextmanager  # 异步上下文管理器装饰器
-# async def lifespan(app: FastAPI):
-#     """应用生命周期管理器
+@asynccontextmanager  # 异步上下文管理器装饰器
+async def lifespan(app: FastAPI):
+    """应用生命周期管理器
 
-#     参数:
-#         app: FastAPI 实例
+    参数:
+        app: FastAPI 实例
 
-#     说明:
-#         - 启动时按配置决定是否自动向量化产品文档
-#         - yield 前执行启动逻辑，yield 后可扩展关闭逻辑
-#     """
-#     if settings.AUTO_INITIALIZE_DOCS is True:  # 检查是否启用自动初始化配置
-#         print(
-#             "AUTO_INITIALIZE_DOCS =",
-#             settings.AUTO_INITIALIZE_DOCS,
-#             type(settings.AUTO_INITIALIZE_DOCS),
-#         )
-#         logger.info("📦 自动向量化产品说明文档启动中...")
-#         await initialize_product_docs()  # 异步初始化产品文档
-#     else:
-#         logger.info("🚫 已关闭启动时向量化产品说明文档")
-#     yield  # 分隔启动和关闭逻辑
-
-
-app = FastAPI()
+    说明:
+        - 启动时拉起后台任务队列（记忆提取等）和聊天记录写缓冲，连接跨 worker 消息通道，
+          并注册跨 worker 的用户状态同步
+        - 启动时预热 RAG 检索服务（HTTP / gRPC 连接、集合加载），结果见 /ready
+        - 启动时在线程中预加载 tiktoken 编码（可能需要下载），超时后不再等待
+        - 关闭时提交累积的记忆提取，等待后台队列中的任务执行完毕，并写入剩余聊天记录
+        - yield 前执行启动逻辑，yield 后执行关闭逻辑
+    """
+    # if settings.AUTO_INITIALIZE_DOCS is True:  # 检查是否启用自动初始化配置
+    #     logger.info("📦 自动向量化产品说明文档启动中...")
+    #     await initialize_product_docs()  # 异步初始化产品文档
+    # else:
+    #     logger.info("🚫 已关闭启动时向量化产品说明文档")
+    background_queue = get_background_queue()
+    background_queue.start()
+    chat_record_writer = get_chat_record_writer()
+    chat_record_writer.start()
+    connection_manager = get_connection_manager()
+    chat.register_worker_events()  # 跨 worker 同步停止生成、历史窗口与记忆缓存
+    await connection_manager.start()
+    await preload_token_counter(timeout=settings.TOKENIZER_LOAD_TIMEOUT)
+    try:
+        rag_service = await asyncio.to_thread(get_rag_service)  # 连接 Milvus
+        await rag_service.warm_up()
+    except Exception as e:
+        logger.error(f"RAG 检索服务初始化失败: {e}")
+    yield  # 分隔启动和关闭逻辑
+    await get_memory_extractor().flush_all()  # 提交尚未提取的累积对话
+    await background_queue.drain(timeout=settings.BACKGROUND_QUEUE_DRAIN_TIMEOUT)
+    await chat_record_writer.close()
+    get_milvus_executor().shutdown()
+    await connection_manager.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.exception_handler(StarletteHTTPException)
@@ -123,6 +149,7 @@ app.include_router(chat.router)
 app.include_router(rag_test.router, prefix="/test")
 app.include_router(agent_test.router)
 app.include_router(eval.router)
+app.include_router(metrics.router)
 
 
 @app.get("/")
@@ -140,6 +167,24 @@ def health_check():
     return {"status": "ok"}  # 返回标准健康状态响应
 
 
+@app.get("/ready")
+def readiness_check():
+    """就绪检查端点
+
+    Returns:
+        dict: 检索服务已预热时返回200，否则返回503
+
+    Note:
+        - 用于负载均衡/容器编排判断实例是否可以接收流量
+    """
+    if not is_rag_service_ready():
+        return JSONResponse(
+            status_code=503,
+            content=error(message="检索服务未就绪", code=503),
+        )
+    return {"status": "ready"}
+
+
 @app.get("/ws-docs", response_class=HTMLResponse)
 async def websocket_docs():
     return """
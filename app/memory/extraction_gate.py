@@ -0,0 +1,222 @@
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.memory.memory_cache import UserMemoryCache, get_user_memory_cache
+from app.rag.embedding_cache import EmbeddingCache, get_embedding_cache
+
+# 不含用户信息的常见应答词，整句只由这些词组成时跳过提取
+FILLER_WORDS = sorted(
+    {
+        "嗯",
+        "嗯嗯",
+        "哦",
+        "噢",
+        "啊",
+        "好",
+        "好的",
+        "好吧",
+        "行",
+        "可以",
+        "谢谢",
+        "谢谢你",
+        "多谢",
+        "感谢",
+        "哈",
+        "哈哈",
+        "呵呵",
+        "收到",
+        "知道了",
+        "明白",
+        "明白了",
+        "懂了",
+        "是的",
+        "是",
+        "对",
+        "对的",
+        "没事",
+        "没关系",
+        "再见",
+        "拜拜",
+        "晚安",
+        "早安",
+        "你好",
+        "在吗",
+        "继续",
+        "然后呢",
+        "ok",
+        "okay",
+        "hi",
+        "hello",
+        "thanks",
+    },
+    key=len,
+    reverse=True,
+)
+_FILLER_PATTERN = re.compile("|".join(re.escape(w) for w in FILLER_WORDS))
+
+# 短句中出现这些词时可能包含用户画像信息，不按长度跳过
+PROFILE_HINTS = (
+    "我",
+    "喜欢",
+    "讨厌",
+    "爱",
+    "习惯",
+    "经常",
+    "每天",
+    "工作",
+    "上班",
+    "住",
+    "岁",
+    "生日",
+    "名字",
+    "叫",
+    "家",
+    "孩子",
+    "老婆",
+    "老公",
+    "朋友",
+    "爸",
+    "妈",
+    "学校",
+    "专业",
+)
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_message(text: str) -> str:
+    """去掉标点、空白和表情，英文转小写"""
+    return _NON_WORD.sub("", text or "").lower()
+
+
+def heuristic_skip_reason(text: str, min_chars: int = 6) -> Optional[str]:
+    """基于长度与关键词判断是否跳过记忆提取
+
+    Returns:
+        跳过原因（empty / filler / too_short），需要提取时返回 None
+    """
+    normalized = normalize_message(text)
+    if not normalized:
+        return "empty"
+    if not _FILLER_PATTERN.sub("", normalized):
+        return "filler"
+    if len(normalized) < min_chars and not any(h in normalized for h in PROFILE_HINTS):
+        return "too_short"
+    return None
+
+
+class ExtractionGate:
+    """记忆提取前的本地过滤
+
+    Note:
+        - 只做 CPU 计算，不发起网络请求：长度/应答词规则 + 与已有记忆的相似度
+        - 相似度检查只使用已缓存的向量（对话检索时已向量化）和本地用户记忆缓存，
+          任一缺失时不做该项检查
+    """
+
+    def __init__(
+        self,
+        min_chars: int = 6,
+        novelty_threshold: float = 0.95,
+        embedding_cache: EmbeddingCache | None = None,
+        memory_cache: UserMemoryCache | None = None,
+        enabled: bool = True,
+    ):
+        self.min_chars = min_chars
+        self.novelty_threshold = novelty_threshold
+        self.embedding_cache = embedding_cache or get_embedding_cache()
+        self.memory_cache = memory_cache or get_user_memory_cache()
+        self.enabled = enabled
+
+        # 运行指标
+        self.checked = 0
+        self.passed = 0
+        self.skipped: Dict[str, int] = {}
+
+    async def _max_similarity(self, text: str, user_id: str) -> Optional[float]:
+        entry = self.memory_cache.peek(user_id)
+        if entry is None or entry.size == 0:
+            return None
+        key = self.embedding_cache.make_key(
+            settings.EMBEDDING_MODEL_NAME, settings.EMBEDDING_DIMENSIONS, text
+        )
+        # 只读内存缓存，不影响向量缓存的命中率统计
+        vector = self.embedding_cache.peek(key)
+        if vector is None:
+            return None
+        return entry.max_similarity(vector)
+
+    async def skip_reason(self, text: str, user_id: str) -> Optional[str]:
+        reason = heuristic_skip_reason(text, self.min_chars)
+        if reason is not None:
+            return reason
+        similarity = await self._max_similarity(text, user_id)
+        if similarity is not None and similarity >= self.novelty_threshold:
+            return "duplicate"
+        return None
+
+    async def should_extract(self, text: str, user_id: str) -> bool:
+        """判断本轮对话是否需要送入 LLM 提取记忆"""
+        if not self.enabled:
+            return True
+        self.checked += 1
+        reason = await self.skip_reason(text, user_id)
+        if reason is None:
+            self.passed += 1
+            return True
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        skipped = sum(self.skipped.values())
+        return {
+            "enabled": self.enabled,
+            "checked": self.checked,
+            "passed": self.passed,
+            "skipped": dict(self.skipped),
+            "skip_rate": round(skipped / self.checked, 4) if self.checked else 0,
+        }
+
+
+def evaluate_gate(
+    messages: List[str], extracted: List[bool], min_chars: int = 6
+) -> Dict[str, Any]:
+    """离线评估：对比规则过滤结果与 LLM 实际提取结果
+
+    Args:
+        messages: 用户消息列表
+        extracted: 每条消息 LLM 是否提取出了记忆点
+        min_chars: 最短长度阈值
+
+    Returns:
+        跳过率、漏提取数（被跳过但 LLM 有提取结果）及漏提取的消息
+    """
+    skipped = [heuristic_skip_reason(m, min_chars) is not None for m in messages]
+    missed = [m for m, s, e in zip(messages, skipped, extracted) if s and e]
+    total_extracted = sum(extracted)
+    return {
+        "total": len(messages),
+        "skipped": sum(skipped),
+        "skip_rate": round(sum(skipped) / len(messages), 4) if messages else 0,
+        "extracted": total_extracted,
+        "missed": len(missed),
+        "miss_rate": round(len(missed) / total_extracted, 4) if total_extracted else 0,
+        "missed_messages": missed,
+    }
+
+
+_extraction_gate: ExtractionGate | None = None
+
+
+def get_extraction_gate() -> ExtractionGate:
+    global _extraction_gate
+    if _extraction_gate is None:
+        _extraction_gate = ExtractionGate(
+            min_chars=settings.MEMORY_GATE_MIN_CHARS,
+            novelty_threshold=settings.MEMORY_GATE_NOVELTY_THRESHOLD,
+            enabled=settings.MEMORY_GATE_ENABLED,
+        )
+    return _extraction_gate
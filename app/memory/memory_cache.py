@@ -0,0 +1,203 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class UserMemoryEntry:
+    """单个用户的记忆矩阵（已归一化的 float32 向量 + 元数据）"""
+
+    def __init__(self, rows: List[Dict[str, Any]], dim: Optional[int] = None):
+        dim = dim or settings.EMBEDDING_DIMENSIONS
+        self.vectors = _normalize(
+            np.asarray([r["embedding"] for r in rows], dtype=np.float32).reshape(
+                -1, dim
+            )
+        )
+        self.contents: List[str] = [r["content"] for r in rows]
+        self.categories: List[str] = [r["category"] for r in rows]
+        self.sources: List[str] = [r.get("source", "") for r in rows]
+        self.timestamps = np.asarray([r["timestamp"] for r in rows], dtype=np.int64)
+
+    @property
+    def size(self) -> int:
+        return len(self.contents)
+
+    @property
+    def nbytes(self) -> int:
+        text_bytes = sum(len(c.encode("utf-8")) for c in self.contents)
+        return self.vectors.nbytes + self.timestamps.nbytes + text_bytes
+
+    def append(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        new_vectors = _normalize(
+            np.asarray([r["embedding"] for r in rows], dtype=np.float32).reshape(
+                -1, self.vectors.shape[1]
+            )
+        )
+        self.vectors = np.vstack([self.vectors, new_vectors])
+        self.contents.extend(r["content"] for r in rows)
+        self.categories.extend(r["category"] for r in rows)
+        self.sources.extend(r.get("source", "") for r in rows)
+        self.timestamps = np.concatenate(
+            [self.timestamps, np.asarray([r["timestamp"] for r in rows], np.int64)]
+        )
+
+    def max_similarity(self, embedding: List[float]) -> float:
+        """与已有记忆的最大余弦相似度"""
+        if self.size == 0:
+            return 0.0
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        return float(np.max(self.vectors @ query))
+
+    def search(
+        self,
+        embedding: List[float],
+        top_k: int = 5,
+        categories: Optional[List[str]] = None,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """本地余弦相似度 top-k，返回结构与 Milvus 检索结果一致"""
+        if self.size == 0:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        scores = self.vectors @ query
+
+        mask = np.ones(self.size, dtype=bool)
+        if categories:
+            mask &= np.isin(np.asarray(self.categories, dtype=object), categories)
+        if start_time is not None:
+            mask &= self.timestamps >= start_time
+        if end_time is not None:
+            mask &= self.timestamps <= end_time
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return []
+
+        k = min(top_k, candidates.size)
+        candidate_scores = scores[candidates]
+        top = np.argpartition(-candidate_scores, k - 1)[:k]
+        top = top[np.argsort(-candidate_scores[top])]
+        return [
+            {
+                "distance": float(candidate_scores[i]),
+                "entity": {
+                    "content": self.contents[idx],
+                    "category": self.categories[idx],
+                    "source": self.sources[idx],
+                    "timestamp": int(self.timestamps[idx]),
+                },
+            }
+            for i, idx in ((i, candidates[i]) for i in top)
+        ]
+
+
+class UserMemoryCache:
+    """按用户缓存记忆矩阵，总内存超过上限时按 LRU 淘汰
+
+    Note:
+        - 命中时记忆检索在本地完成，不再访问 Milvus
+        - 新增记忆时追加到已缓存的矩阵，清除记忆时淘汰对应用户
+        - 追加后超过单用户条数上限时淘汰该用户，与加载时一致改走 Milvus 检索
+    """
+
+    def __init__(
+        self, max_bytes: int = 256 * 1024 * 1024, max_rows_per_user: int = 2000
+    ):
+        self.max_bytes = max_bytes
+        self.max_rows_per_user = max_rows_per_user
+        self._entries: "OrderedDict[str, UserMemoryEntry]" = OrderedDict()
+        self._bytes = 0
+
+        # 运行指标
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    def get(self, user_id: str) -> Optional[UserMemoryEntry]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry
+
+    def peek(self, user_id: str) -> Optional[UserMemoryEntry]:
+        """读取缓存但不计入命中率、不调整 LRU 顺序"""
+        return self._entries.get(user_id)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def put(self, user_id: str, entry: UserMemoryEntry, load_seconds: float = 0.0):
+        self.evict(user_id)
+        self._entries[user_id] = entry
+        self._bytes += entry.nbytes
+        self.loads += 1
+        self.load_seconds += load_seconds
+        self._shrink()
+
+    def append(self, user_id: str, rows: List[Dict[str, Any]]) -> None:
+        """向已缓存用户追加新记忆，未缓存的用户忽略（下次加载时从 Milvus 读取）"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        if entry.size + len(rows) > self.max_rows_per_user:
+            # 超过单用户上限，不再缓存该用户
+            self.evict(user_id)
+            self.evictions += 1
+            return
+        self._bytes -= entry.nbytes
+        entry.append(rows)
+        self._bytes += entry.nbytes
+        self._shrink()
+
+    def evict(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def _shrink(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.nbytes
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "avg_load_ms": (
+                round(self.load_seconds / self.loads * 1000, 2) if self.loads else 0
+            ),
+        }
+
+
+_user_memory_cache: UserMemoryCache | None = None
+
+
+def get_user_memory_cache() -> UserMemoryCache:
+    global _user_memory_cache
+    if _user_memory_cache is None:
+        _user_memory_cache = UserMemoryCache(
+            max_bytes=settings.MEMORY_CACHE_MAX_BYTES,
+            max_rows_per_user=settings.MEMORY_CACHE_MAX_ROWS_PER_USER,
+        )
+    return _user_memory_cache
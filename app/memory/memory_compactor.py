@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.rag.milvus_executor import get_milvus_executor
+from app.rag.rate_limiter import RateLimiter
+
+
+def find_duplicate_indices(
+    vectors: np.ndarray, timestamps: np.ndarray, threshold: float = 0.95
+) -> List[int]:
+    """按余弦相似度聚类，每个簇保留最新的一条，返回需要删除的下标
+
+    Args:
+        vectors: (n, dim) 向量矩阵
+        timestamps: (n,) 写入时间戳
+        threshold: 相似度不低于该值视为重复
+
+    Note:
+        - 按时间从新到旧遍历，未归簇的记忆作为新簇代表，
+          与其相似度达到阈值且未归簇的较旧记忆归入该簇并删除
+    """
+    n = len(vectors)
+    if n < 2:
+        return []
+    order = np.argsort(-np.asarray(timestamps), kind="stable")
+    matrix = np.asarray(vectors, dtype=np.float32)[order]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+
+    assigned = np.zeros(n, dtype=bool)
+    duplicates: List[int] = []
+    for i in range(n):
+        if assigned[i]:
+            continue
+        assigned[i] = True
+        if i + 1 == n:
+            break
+        similar = (matrix[i + 1 :] @ matrix[i]) >= threshold
+        similar &= ~assigned[i + 1 :]
+        if similar.any():
+            members = np.flatnonzero(similar) + i + 1
+            assigned[members] = True
+            duplicates.extend(int(order[m]) for m in members)
+    return duplicates
+
+
+def estimate_row_bytes(row: Dict[str, Any], dim: int) -> int:
+    """估算一条记忆占用的存储（向量 + 主键/时间戳 + 文本）"""
+    return dim * 4 + 16 + len(str(row.get("content", "")).encode("utf-8"))
+
+
+class MemoryCompactor:
+    """用户记忆离线整理：合并近似重复的记忆点
+
+    Note:
+        - 逐个用户分页读取向量，聚类后按 id 批量删除重复项，全部完成后触发 Milvus compaction
+        - 每处理完一个用户写入检查点，中断后重新运行会跳过已处理的用户
+        - 按用户数限流，避免影响线上检索
+        - API 进程中的用户记忆缓存不受影响，被删除的重复项在用户下次加载缓存后消失
+    """
+
+    def __init__(
+        self,
+        handler=None,
+        threshold: float = 0.95,
+        page_size: int = 1000,
+        users_per_minute: int = 60,
+        delete_batch_size: int = 1000,
+        checkpoint_path: Optional[str] = None,
+        latency_sample_users: int = 20,
+        scan_timeout: float = 60.0,
+        compact_timeout: float = 600.0,
+        dry_run: bool = False,
+    ):
+        if handler is None:
+            from app.memory.milvus_memory_handler import get_milvus_memory_handler
+
+            handler = get_milvus_memory_handler()
+        self.handler = handler
+        self.threshold = threshold
+        self.page_size = page_size
+        self.delete_batch_size = delete_batch_size
+        self.checkpoint_path = checkpoint_path
+        self.latency_sample_users = latency_sample_users
+        self.scan_timeout = scan_timeout
+        self.compact_timeout = compact_timeout
+        self.dry_run = dry_run
+        self.rate_limiter = RateLimiter(requests_per_minute=users_per_minute)
+        self.executor = get_milvus_executor()
+        self.dim = settings.EMBEDDING_DIMENSIONS
+        self._latency_samples: List[Tuple[str, List[float]]] = []
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        state = {"done": [], "scanned_rows": 0, "deleted_rows": 0, "freed_bytes": 0}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                state.update(json.load(f))
+            logger.info(f"从检查点恢复，已处理 {len(state['done'])} 个用户")
+        return state
+
+    def _save_checkpoint(self, state: Dict[str, Any]) -> None:
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    async def _measure_search_latency(self) -> Optional[float]:
+        """用抽样用户自己的记忆向量检索，返回平均耗时(毫秒)"""
+        if not self._latency_samples:
+            return None
+        elapsed = []
+        for user_id, embedding in self._latency_samples:
+            start = time.perf_counter()
+            await self.executor.run(
+                self.handler.search_memory, user_id=user_id, embedding=embedding
+            )
+            elapsed.append(time.perf_counter() - start)
+        return round(sum(elapsed) / len(elapsed) * 1000, 2)
+
+    async def compact_user(self, user_id: str) -> Tuple[int, int, int]:
+        """整理单个用户的记忆
+
+        Returns:
+            (扫描条数, 删除条数, 估算释放字节数)
+        """
+        rows = await self.executor.run(
+            self.handler.query_user_vectors,
+            user_id=user_id,
+            batch_size=self.page_size,
+            timeout=self.scan_timeout,
+        )
+        if not rows:
+            return 0, 0, 0
+
+        duplicates = find_duplicate_indices(
+            np.asarray([r["embedding"] for r in rows], dtype=np.float32),
+            np.asarray([r["timestamp"] for r in rows], dtype=np.int64),
+            self.threshold,
+        )
+        freed = sum(estimate_row_bytes(rows[i], self.dim) for i in duplicates)
+        if duplicates and not self.dry_run:
+            ids = [rows[i]["id"] for i in duplicates]
+            for start in range(0, len(ids), self.delete_batch_size):
+                await self.executor.run(
+                    self.handler.delete_by_ids,
+                    ids=ids[start : start + self.delete_batch_size],
+                )
+        return len(rows), len(duplicates), freed
+
+    async def run(self) -> Dict[str, Any]:
+        """整理全部用户的记忆并返回统计报告"""
+        started = time.perf_counter()
+        state = self._load_checkpoint()
+        done = set(state["done"])
+
+        user_ids = await self.executor.run(
+            self.handler.list_user_ids,
+            batch_size=self.page_size,
+            timeout=self.scan_timeout,
+        )
+        pending = [u for u in user_ids if u not in done]
+        logger.info(f"共 {len(user_ids)} 个用户，待整理 {len(pending)} 个")
+
+        # 先抽样测量整理前的检索耗时
+        for user_id in pending[: self.latency_sample_users]:
+            rows = await self.executor.run(
+                self.handler.query_user_memories, user_id=user_id, limit=1
+            )
+            if rows:
+                self._latency_samples.append((user_id, rows[0]["embedding"]))
+        latency_before = await self._measure_search_latency()
+
+        for user_id in pending:
+            await self.rate_limiter.acquire()
+            scanned, deleted, freed = await self.compact_user(user_id)
+            state["scanned_rows"] += scanned
+            state["deleted_rows"] += deleted
+            state["freed_bytes"] += freed
+            state["done"].append(user_id)
+            self._save_checkpoint(state)
+            if deleted:
+                logger.info(f"用户 {user_id}: {scanned} 条记忆，删除重复 {deleted} 条")
+
+        if state["deleted_rows"] and not self.dry_run:
+            await self.executor.run(self.handler.compact, timeout=self.compact_timeout)
+        latency_after = await self._measure_search_latency()
+
+        # 全部完成后清理检查点，下次运行重新整理
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        return {
+            "users": len(user_ids),
+            "scanned_rows": state["scanned_rows"],
+            "deleted_rows": state["deleted_rows"],
+            "freed_bytes": state["freed_bytes"],
+            "search_latency_before_ms": latency_before,
+            "search_latency_after_ms": latency_after,
+            "elapsed_seconds": round(time.perf_counter() - started, 2),
+            "dry_run": self.dry_run,
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="用户记忆离线整理（合并近似重复记忆）")
+    parser.add_argument("--threshold", type=float, default=0.95, help="相似度阈值")
+    parser.add_argument("--page-size", type=int, default=1000, help="分页读取条数")
+    parser.add_argument(
+        "--users-per-minute", type=int, default=60, help="每分钟最多处理的用户数"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default="memory_compaction.checkpoint.json",
+        help="检查点文件路径",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="只统计重复数量，不删除")
+    args = parser.parse_args()
+
+    compactor = MemoryCompactor(
+        threshold=args.threshold,
+        page_size=args.page_size,
+        users_per_minute=args.users_per_minute,
+        checkpoint_path=args.checkpoint,
+        dry_run=args.dry_run,
+    )
+    report = await compactor.run()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    get_milvus_executor().shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
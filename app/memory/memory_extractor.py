@@ -1,4 +1,5 @@
-from typing import Literal
+from typing import Any, Dict, List, Literal, Tuple
+import asyncio
 import logging
 import json
 
@@ -23,13 +24,41 @@ from openai.types.chat import (
     ChatCompletionMessageParam,
     ChatCompletionUserMessageParam,
 )
+from app.core.config import settings
 from app.memory.memory_service import get_memory_service
+from app.memory.extraction_gate import ExtractionGate, get_extraction_gate
+from app.core.task_queue import get_background_queue
 
 
 class MemoryExtractor:
-    def __init__(self):
+    """记忆提取器
+
+    Note:
+        - 按用户累积对话轮次，每满 batch_turns 轮、空闲 idle_seconds 秒或断开连接时
+          把多轮对话合并为一次 LLM 调用，提取结果一次向量化、一次写入 Milvus
+        - 累积前先经过本地过滤（ExtractionGate），不含用户信息的轮次不进入提取
+    """
+
+    def __init__(
+        self,
+        batch_turns: int = settings.MEMORY_EXTRACTION_BATCH_TURNS,
+        idle_seconds: float = settings.MEMORY_EXTRACTION_IDLE_SECONDS,
+        gate: ExtractionGate | None = None,
+    ):
         self.llm = get_llm_text_client()
         self.service = get_memory_service()
+        self.queue = get_background_queue()
+        self.gate = gate or get_extraction_gate()
+        self.batch_turns = batch_turns
+        self.idle_seconds = idle_seconds
+        self._pending: Dict[str, List[Tuple[str, str]]] = {}
+        self._idle_timers: Dict[str, asyncio.Task] = {}
+
+        # 运行指标
+        self.turns_added = 0
+        self.turns_flushed = 0
+        self.batches = 0
+        self.llm_calls = 0
 
     @staticmethod
     def parse_memory_response(text: str):
@@ -55,25 +84,52 @@ class MemoryExtractor:
                     contents.append(content)
         return contents, categories
 
-    async def extract_memory_points(
-        self, message: str, reply: str, user_id: str
-    ) -> None:
-        """提取用户画像相关的记忆点，并保存到向量数据库"""
+    @staticmethod
+    def build_transcript(turns: List[Tuple[str, str]]) -> str:
+        lines = []
+        for message, reply in turns:
+            lines.append(f"用户：{message}")
+            lines.append(f"助手：{reply}")
+        return "\n".join(lines)
+
+    @classmethod
+    def build_extraction_prompt(
+        cls, turns: List[Tuple[str, str]]
+    ) -> Tuple[ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam]:
         system_prompt = ChatCompletionSystemMessageParam(
             role="system",
             content=SYSTEM_PROMPT,
         )
         user_message = ChatCompletionUserMessageParam(
             role="user",
-            content=f"以下是用户与助手的对话，请提取用户画像相关的记忆点：\n助手：{reply}\n用户：{message}",
+            content=f"以下是用户与助手的多轮对话，请提取用户画像相关的记忆点：\n{cls.build_transcript(turns)}",
         )
-
+        return system_prompt, user_message
+
+    async def extract_points(
+        self, turns: List[Tuple[str, str]]
+    ) -> Tuple[List[str], List[str]]:
+        """调用 LLM 从多轮对话中提取记忆点，只返回结果不保存"""
+        system_prompt, user_message = self.build_extraction_prompt(turns)
+        self.llm_calls += 1
         response = await self.llm.chat(
             system=system_prompt, prompt=user_message, history=[]
         )
         text = response.choices[0].message.content.strip()
+        return self.parse_memory_response(text)
 
-        contents, categories = self.parse_memory_response(text)
+    async def extract_memory_points_batch(
+        self, turns: List[Tuple[str, str]], user_id: str
+    ) -> None:
+        """从多轮对话中一次性提取记忆点，并批量保存到向量数据库
+
+        Args:
+            turns: (用户消息, 助手回复) 列表，按时间顺序
+            user_id: 用户ID
+        """
+        if not turns:
+            return
+        contents, categories = await self.extract_points(turns)
         if not contents:
             return
 
@@ -81,6 +137,79 @@ class MemoryExtractor:
             user_id=user_id, contents=contents, categories=categories
         )
 
+    async def extract_memory_points(
+        self, message: str, reply: str, user_id: str
+    ) -> None:
+        """提取单轮对话的记忆点，并保存到向量数据库"""
+        await self.extract_memory_points_batch([(message, reply)], user_id)
+
+    async def add_turn(self, message: str, reply: str, user_id: str) -> None:
+        """累积一轮对话，满 batch_turns 轮时提交提取，否则重置空闲计时"""
+        if not await self.gate.should_extract(message, user_id):
+            return
+        turns = self._pending.setdefault(user_id, [])
+        turns.append((message, reply))
+        self.turns_added += 1
+        if len(turns) >= self.batch_turns:
+            await self.flush_user(user_id)
+            return
+
+        timer = self._idle_timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._idle_timers[user_id] = asyncio.create_task(self._flush_when_idle(user_id))
+
+    async def _flush_when_idle(self, user_id: str) -> None:
+        await asyncio.sleep(self.idle_seconds)
+        self._idle_timers.pop(user_id, None)
+        await self.flush_user(user_id)
+
+    async def flush_user(self, user_id: str) -> bool:
+        """把用户累积的对话提交到后台队列提取（断开连接时调用）"""
+        timer = self._idle_timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+        turns = self._pending.pop(user_id, None)
+        if not turns:
+            return False
+        self.batches += 1
+        self.turns_flushed += len(turns)
+        return await self.queue.submit(
+            f"extract_memory:{user_id}",
+            self.extract_memory_points_batch,
+            turns=turns,
+            user_id=user_id,
+        )
+
+    async def flush_all(self) -> None:
+        """提交所有用户累积的对话（服务关闭时调用）"""
+        for user_id in list(self._pending):
+            await self.flush_user(user_id)
+
+    async def submit_memory_extraction(
+        self, message: str, reply: str, user_id: str
+    ) -> bool:
+        """将单轮记忆提取提交到后台队列，不阻塞当前对话"""
+        return await self.queue.submit(
+            f"extract_memory:{user_id}",
+            self.extract_memory_points,
+            message=message,
+            reply=reply,
+            user_id=user_id,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_users": len(self._pending),
+            "pending_turns": sum(len(t) for t in self._pending.values()),
+            "turns_added": self.turns_added,
+            "batches": self.batches,
+            "llm_calls": self.llm_calls,
+            "avg_turns_per_batch": (
+                round(self.turns_flushed / self.batches, 2) if self.batches else 0
+            ),
+        }
+
 
 _memory_extractor: MemoryExtractor | None = None
 
@@ -1,4 +1,10 @@
-from typing import List
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.task_queue import get_background_queue
+from app.memory.memory_cache import UserMemoryEntry, get_user_memory_cache
 from app.memory.milvus_memory_handler import get_milvus_memory_handler
 from app.rag.embedder import get_aliyun_embedder
 
@@ -7,6 +13,15 @@ class MemoryService:
     def __init__(self):
         self.milvus_handler = get_milvus_memory_handler()
         self.embedder = get_aliyun_embedder()
+        self.cache = get_user_memory_cache()
+        self.max_cached_rows = settings.MEMORY_CACHE_MAX_ROWS_PER_USER
+        self._loading: Dict[str, asyncio.Task] = {}
+        # 已提交到后台队列、尚未开始执行的缓存加载
+        self._queued: Set[str] = set()
+        # 每个用户的记忆版本，写入或清除后递增，加载期间版本变化则丢弃加载结果
+        self._generations: Dict[str, int] = {}
+        # 用户记忆被写入或清除后的回调（用于通知其他 worker 淘汰本地缓存）
+        self.on_change: Optional[Callable[[str], Awaitable[None]]] = None
 
     async def _embed(self, texts: List[str]) -> List[List[float]]:
         return await self.embedder.embed_texts(texts)
@@ -22,28 +37,130 @@ class MemoryService:
             for r in raw_results
         ]
 
+    def _bump_generation(self, user_id: str) -> None:
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def invalidate_user_cache(self, user_id: str) -> None:
+        """淘汰用户的本地缓存并丢弃进行中的加载，下次检索时重新加载"""
+        self._bump_generation(user_id)
+        self.cache.evict(user_id)
+
+    async def _notify_change(self, user_id: str) -> None:
+        if self.on_change is not None:
+            await self.on_change(user_id)
+
+    async def _load_user_cache(self, user_id: str) -> None:
+        start = time.perf_counter()
+        generation = self._generations.get(user_id, 0)
+        rows = await self.milvus_handler.aquery_user_memories(
+            user_id=user_id, limit=self.max_cached_rows + 1
+        )
+        if self._generations.get(user_id, 0) != generation:
+            # 加载期间用户记忆被写入或清除，快照已过期，下次检索时重新加载
+            logger.info(f"用户 {user_id} 的记忆在加载期间发生变化，丢弃本次加载")
+            return
+        if len(rows) > self.max_cached_rows:
+            # 记忆过多的用户不缓存，继续使用 Milvus 检索
+            logger.info(f"用户 {user_id} 记忆数超过缓存上限，跳过本地缓存")
+            return
+        self.cache.put(
+            user_id, UserMemoryEntry(rows), load_seconds=time.perf_counter() - start
+        )
+
+    async def warm_user_cache(self, user_id: str) -> None:
+        """把用户记忆加载到本地缓存，并发调用只加载一次"""
+        self._queued.discard(user_id)
+        if user_id in self.cache:
+            return
+        task = self._loading.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._load_user_cache(user_id))
+            self._loading[user_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        await task
+
+    async def _search(
+        self,
+        user_id: str,
+        embedding: List[float],
+        top_k: int,
+        categories: Optional[List[str]] = None,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+    ) -> List[dict]:
+        entry = self.cache.get(user_id)
+        if entry is not None:
+            return entry.search(embedding, top_k, categories, start_time, end_time)
+
+        if user_id not in self._loading and user_id not in self._queued:
+            # 首次使用时后台加载缓存，本次仍走 Milvus 检索；
+            # 提交前先登记，任务开始执行前的检索不再重复提交，队列满时不等待
+            self._queued.add(user_id)
+            if not get_background_queue().submit_nowait(
+                f"warm_memory_cache:{user_id}", self.warm_user_cache, user_id
+            ):
+                self._queued.discard(user_id)
+        return await self.milvus_handler.asearch_memory(
+            user_id=user_id,
+            embedding=embedding,
+            top_k=top_k,
+            categories=categories,
+            start_time=start_time,
+            end_time=end_time,
+        )
+
     async def search_user_memory(
         self, query: str, user_id: str, top_k: int = 5
     ) -> List[dict]:
         embedding = await self._embed([query])
-        return self.milvus_handler.search_memory(
-            user_id=user_id, embedding=embedding[0], top_k=top_k
-        )
+        return await self._search(user_id=user_id, embedding=embedding[0], top_k=top_k)
 
     async def search_user_memory_parsed(
-        self, query: str, user_id: str, top_k: int = 5
+        self,
+        query: str,
+        user_id: str,
+        top_k: int = 5,
+        embedding: Optional[List[float]] = None,
+        categories: Optional[List[str]] = None,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
     ) -> List[dict]:
-        embedding = await self._embed([query])
-        raw_results = self.milvus_handler.search_memory(
-            user_id=user_id, embedding=embedding[0], top_k=top_k
+        """检索用户记忆并解析结果
+
+        Args:
+            query: 查询文本
+            user_id: 用户ID，检索范围限定在该用户的分区内
+            top_k: 返回条数
+            embedding: 已有查询向量时直接传入，跳过向量化
+            categories: 只检索这些分类的记忆
+            start_time: 只检索该时间戳(秒)之后的记忆
+            end_time: 只检索该时间戳(秒)之前的记忆
+
+        Note:
+            - 用户记忆已缓存时在本地计算相似度，否则检索 Milvus 并在后台加载缓存
+        """
+        if embedding is None:
+            embedding = (await self._embed([query]))[0]
+        raw_results = await self._search(
+            user_id=user_id,
+            embedding=embedding,
+            top_k=top_k,
+            categories=categories,
+            start_time=start_time,
+            end_time=end_time,
         )
         return self.parse_memory_response(raw_results)
 
-    def clear_user_memory(self, user_id: str) -> bool:
+    async def clear_user_memory(self, user_id: str) -> bool:
         """
         清除指定用户的所有记忆
         """
-        return self.milvus_handler.delete_user_memory(user_id=user_id)
+        self.cache.evict(user_id)
+        result = await self.milvus_handler.adelete_user_memory(user_id=user_id)
+        # 删除期间完成的加载可能已写入旧记忆
+        self.invalidate_user_cache(user_id)
+        await self._notify_change(user_id)
+        return result
 
     async def add_user_memories(
         self,
@@ -56,13 +173,34 @@ class MemoryService:
         向用户的长期记忆中批量添加记录
         """
         embeddings = await self._embed(contents)
-        return self.milvus_handler.insert_memory_bulk(
+        result = await self.milvus_handler.ainsert_memory_bulk(
             user_id=user_id,
             embeddings=embeddings,
             contents=contents,
             categories=categories,
             source=source,
         )
+        # 正在进行的加载可能不包含本次写入，丢弃其结果
+        self._bump_generation(user_id)
+        # 同步追加到本地缓存（未缓存的用户不受影响）
+        timestamp = int(time.time())
+        self.cache.append(
+            user_id,
+            [
+                {
+                    "embedding": embedding,
+                    "content": content,
+                    "category": category,
+                    "source": source,
+                    "timestamp": timestamp,
+                }
+                for embedding, content, category in zip(
+                    embeddings, contents, categories
+                )
+            ],
+        )
+        await self._notify_change(user_id)
+        return result
 
 
 _memory_service_instance: MemoryService = None
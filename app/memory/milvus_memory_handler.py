@@ -7,12 +7,44 @@ from pymilvus import (
     connections,
     utility,
 )
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional
 from app.core.config import settings
+from app.rag.milvus_executor import get_milvus_executor
+from app.rag.milvus_handler import CollectionReloadMixin
 import time
 
 
-class MilvusMemoryHandler:
+def _quote(value: str) -> str:
+    """转义字符串字面量，用于 Milvus 过滤表达式"""
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def build_memory_filter(
+    user_id: str,
+    categories: Optional[List[str]] = None,
+    start_time: Optional[int] = None,
+    end_time: Optional[int] = None,
+) -> str:
+    """构建用户记忆过滤表达式
+
+    Args:
+        user_id: 用户ID（分区键，检索只在该用户所在分区内进行）
+        categories: 只返回这些分类的记忆
+        start_time: 只返回该时间戳(秒)之后写入的记忆（含）
+        end_time: 只返回该时间戳(秒)之前写入的记忆（含）
+    """
+    conditions = [f"user_id == {_quote(user_id)}"]
+    if categories:
+        conditions.append(f"category in [{', '.join(_quote(c) for c in categories)}]")
+    if start_time is not None:
+        conditions.append(f"timestamp >= {int(start_time)}")
+    if end_time is not None:
+        conditions.append(f"timestamp <= {int(end_time)}")
+    return " and ".join(conditions)
+
+
+class MilvusMemoryHandler(CollectionReloadMixin):
     def __init__(self, collection_name="user_memory"):
         connections.connect("default", host=settings.MILVUS_HOST, port="19530")
         self.collection_name = collection_name
@@ -63,6 +95,7 @@ class MilvusMemoryHandler:
         contents: List[str],
         categories: List[str],
         source: str = "chat",
+        timeout: Optional[float] = None,
     ) -> None:
         count = len(embeddings)
         timestamps = [int(time.time())] * count
@@ -77,36 +110,196 @@ class MilvusMemoryHandler:
             sources,
             timestamps,
         ]
-        self.collection.insert(
-            data=data,
-            fields=[
-                "user_id",
-                "embedding",
-                "content",
-                "category",
-                "source",
-                "timestamp",
-            ],
+        self._with_reload(
+            lambda: self.collection.insert(
+                data=data,
+                fields=[
+                    "user_id",
+                    "embedding",
+                    "content",
+                    "category",
+                    "source",
+                    "timestamp",
+                ],
+                timeout=timeout,
+            )
         )
 
     @traceable(run_type="retriever")
     def search_memory(
-        self, user_id: str, embedding: List[float], top_k=5
+        self,
+        user_id: str,
+        embedding: List[float],
+        top_k=5,
+        categories: Optional[List[str]] = None,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        timeout: Optional[float] = None,
     ) -> List[Dict]:
         search_params = {"metric_type": "COSINE", "params": {"ef": 64}}
-        results = self.collection.search(
-            data=[embedding],
-            anns_field="embedding",
-            param=search_params,
-            limit=top_k,
-            output_fields=["content", "category", "source", "timestamp"],
+        # user_id 为分区键，带上过滤条件后只检索该用户所在分区
+        expr = build_memory_filter(user_id, categories, start_time, end_time)
+        results = self._with_reload(
+            lambda: self.collection.search(
+                data=[embedding],
+                anns_field="embedding",
+                param=search_params,
+                limit=top_k,
+                expr=expr,
+                output_fields=["content", "category", "source", "timestamp"],
+                timeout=timeout,
+            )
         )
         hits = results[0] if results else []
         return [hit.entity.to_dict() for hit in hits]
 
-    def delete_user_memory(self, user_id: str):
-        expr = f'user_id == "{user_id}"'
-        self.collection.delete(expr)
+    def query_user_memories(
+        self, user_id: str, limit: int = 2000, timeout: Optional[float] = None
+    ) -> List[Dict]:
+        """按分区键读取用户的全部记忆（含向量），用于本地缓存"""
+        return self._with_reload(
+            lambda: self.collection.query(
+                expr=build_memory_filter(user_id),
+                output_fields=[
+                    "embedding",
+                    "content",
+                    "category",
+                    "source",
+                    "timestamp",
+                ],
+                limit=limit,
+                timeout=timeout,
+            )
+        )
+
+    def _query_pages(
+        self,
+        expr: str,
+        output_fields: List[str],
+        batch_size: int,
+        timeout: Optional[float] = None,
+    ) -> Iterator[List[Dict]]:
+        iterator = self.collection.query_iterator(
+            batch_size=batch_size,
+            expr=expr,
+            output_fields=output_fields,
+            timeout=timeout,
+        )
+        try:
+            while True:
+                page = iterator.next()
+                if not page:
+                    break
+                yield page
+        finally:
+            iterator.close()
+
+    def list_user_ids(
+        self, batch_size: int = 1000, timeout: Optional[float] = None
+    ) -> List[str]:
+        """分页扫描集合，返回所有有记忆的用户ID（按首次出现顺序）"""
+
+        def scan():
+            user_ids: Dict[str, None] = {}
+            for page in self._query_pages(
+                'user_id != ""', ["user_id"], batch_size, timeout
+            ):
+                for row in page:
+                    user_ids.setdefault(row["user_id"], None)
+            return list(user_ids)
+
+        return self._with_reload(scan)
+
+    def query_user_vectors(
+        self, user_id: str, batch_size: int = 1000, timeout: Optional[float] = None
+    ) -> List[Dict]:
+        """分页读取用户的全部记忆（id、向量、内容、时间戳），用于离线整理"""
+
+        def scan():
+            rows: List[Dict] = []
+            for page in self._query_pages(
+                build_memory_filter(user_id),
+                ["id", "embedding", "content", "timestamp"],
+                batch_size,
+                timeout,
+            ):
+                rows.extend(page)
+            return rows
+
+        return self._with_reload(scan)
+
+    def delete_by_ids(self, ids: List[int], timeout: Optional[float] = None) -> int:
+        if not ids:
+            return 0
+        self.collection.delete(
+            f"id in [{', '.join(str(int(i)) for i in ids)}]", timeout=timeout
+        )
+        return len(ids)
+
+    def compact(self, timeout: Optional[float] = None) -> None:
+        """触发 Milvus compaction 并等待完成，物理清理已删除的数据"""
+        self.collection.compact(timeout=timeout)
+        self.collection.wait_for_compaction_completed(timeout=timeout)
+
+    def delete_user_memory(self, user_id: str, timeout: Optional[float] = None):
+        expr = build_memory_filter(user_id)
+        self.collection.delete(expr, timeout=timeout)
+
+    async def ainsert_memory_bulk(
+        self,
+        user_id: str,
+        embeddings: List[List[float]],
+        contents: List[str],
+        categories: List[str],
+        source: str = "chat",
+        timeout: Optional[float] = None,
+    ) -> None:
+        """insert_memory_bulk 的异步版本，在 Milvus 专用线程池中执行"""
+        return await get_milvus_executor().run(
+            self.insert_memory_bulk,
+            user_id=user_id,
+            embeddings=embeddings,
+            contents=contents,
+            categories=categories,
+            source=source,
+            timeout=timeout,
+        )
+
+    async def asearch_memory(
+        self,
+        user_id: str,
+        embedding: List[float],
+        top_k=5,
+        categories: Optional[List[str]] = None,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict]:
+        """search_memory 的异步版本，在 Milvus 专用线程池中执行"""
+        return await get_milvus_executor().run(
+            self.search_memory,
+            user_id=user_id,
+            embedding=embedding,
+            top_k=top_k,
+            categories=categories,
+            start_time=start_time,
+            end_time=end_time,
+            timeout=timeout,
+        )
+
+    async def aquery_user_memories(
+        self, user_id: str, limit: int = 2000, timeout: Optional[float] = None
+    ) -> List[Dict]:
+        """query_user_memories 的异步版本，在 Milvus 专用线程池中执行"""
+        return await get_milvus_executor().run(
+            self.query_user_memories, user_id=user_id, limit=limit, timeout=timeout
+        )
+
+    async def adelete_user_memory(self, user_id: str, timeout: Optional[float] = None):
+        """delete_user_memory 的异步版本，在 Milvus 专用线程池中执行"""
+        return await get_milvus_executor().run(
+            self.delete_user_memory, user_id=user_id, timeout=timeout
+        )
 
 
 _milvus_memory_handler: MilvusMemoryHandler | None = None
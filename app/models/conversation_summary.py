@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from app.core.database import Base
+
+
+class ConversationSummary(Base):
+    """用户对话滚动摘要
+
+    Note:
+        - 每个用户一条，超出历史窗口的对话增量合并进摘要
+        - turn_count 为已合并进摘要的消息条数
+    """
+
+    __tablename__ = "conversation_summary"
+
+    id = Column(Integer, primary_key=True, index=True, comment="主键 ID")
+
+    user_id = Column(
+        String(64),
+        ForeignKey("users.userid"),
+        unique=True,
+        index=True,
+        nullable=False,
+        comment="关联的用户唯一标识（UUID）",
+    )
+
+    summary = Column(String, nullable=False, default="", comment="对话摘要")
+
+    turn_count = Column(
+        Integer, nullable=False, default=0, comment="已合并进摘要的消息条数"
+    )
+
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        comment="最近更新时间",
+    )
@@ -1,7 +1,13 @@
-from openai import AsyncOpenAI
+import asyncio
+import random
+from openai import AsyncOpenAI, RateLimitError, InternalServerError
 from app.core.config import settings
+from app.core.logger import logger
+from app.rag.embedding_cache import EmbeddingCache, get_embedding_cache
+from app.rag.rate_limiter import RateLimiter
 
 _embedder_instance = None
+_embedding_rate_limiter = None
 
 
 def get_aliyun_embedder():
@@ -11,25 +17,89 @@ def get_aliyun_embedder():
     return _embedder_instance
 
 
+def get_embedding_rate_limiter() -> RateLimiter:
+    global _embedding_rate_limiter
+    if _embedding_rate_limiter is None:
+        _embedding_rate_limiter = RateLimiter(
+            requests_per_minute=settings.EMBEDDING_RPM,
+            tokens_per_minute=settings.EMBEDDING_TPM,
+        )
+    return _embedding_rate_limiter
+
+
 class AliyunEmbedder:
-    def __init__(self):
+    def __init__(
+        self,
+        cache: EmbeddingCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+    ):
         self.client = AsyncOpenAI(
             base_url=settings.ALI_LLM_BASE_URL,
             api_key=settings.ALI_LLM_KEY,
         )
+        self.model = settings.EMBEDDING_MODEL_NAME
+        self.dimensions = settings.EMBEDDING_DIMENSIONS
+        self.batch_size = settings.EMBEDDING_BATCH_SIZE
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES
+        self.retry_base_delay = settings.EMBEDDING_RETRY_BASE_DELAY
+        self.cache = cache or get_embedding_cache()
+        self.rate_limiter = rate_limiter or get_embedding_rate_limiter()
+        self._semaphore = asyncio.Semaphore(settings.EMBEDDING_CONCURRENCY)
 
     async def embed_texts(self, texts):
-        batch_size = 10
-        all_embeddings = []
-
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i : i + batch_size]
-            response = await self.client.embeddings.create(
-                model=settings.EMBEDDING_MODEL_NAME,
-                input=batch,
-                dimensions=1024,
-                encoding_format="float",
-            )
-            all_embeddings.extend([item.embedding for item in response.data])
-
-        return all_embeddings
+        keys = [
+            self.cache.make_key(self.model, self.dimensions, text) for text in texts
+        ]
+        cached = await self.cache.get_many(keys)
+
+        # 只请求未命中的文本，同一批次内的重复文本只请求一次
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        if missing:
+            fetched = await self._fetch_embeddings(list(missing.values()))
+            new_items = dict(zip(missing.keys(), fetched))
+            await self.cache.put_many(new_items)
+            cached.update(new_items)
+
+        return [cached[key] for key in keys]
+
+    async def warm_up(self):
+        """绕过缓存发送一次向量化请求，提前建立 HTTP 连接"""
+        await self._fetch_embeddings(["warm up"])
+
+    async def _fetch_embeddings(self, texts):
+        batches = [
+            texts[i : i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        # 各批次并发请求，gather 按提交顺序返回结果
+        results = await asyncio.gather(*(self._embed_batch(b) for b in batches))
+        return [embedding for batch in results for embedding in batch]
+
+    async def _embed_batch(self, batch):
+        # 中文文本按每字符约 1 个 token 估算
+        tokens = sum(len(text) for text in batch)
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire(tokens)
+                try:
+                    response = await self.client.embeddings.create(
+                        model=self.model,
+                        input=batch,
+                        dimensions=self.dimensions,
+                        encoding_format="float",
+                    )
+                    return [item.embedding for item in response.data]
+                except (RateLimitError, InternalServerError) as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    # 指数退避 + 随机抖动，避免并发请求同时重试
+                    delay = random.uniform(0, self.retry_base_delay * 2**attempt)
+                    logger.warning(
+                        f"向量化请求被限流或失败，{delay:.2f}s 后重试"
+                        f"({attempt + 1}/{self.max_retries}): {e}"
+                    )
+                    await asyncio.sleep(delay)
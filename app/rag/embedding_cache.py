@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+
+class SqliteEmbeddingStore:
+    """基于 SQLite 的向量持久化缓存，向量以 float32 二进制存储，进程重启后仍可命中"""
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if not keys:
+            return {}
+        expire_before = time.time() - self.ttl
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings "
+                f"WHERE key IN ({placeholders}) AND created_at >= ?",
+                [*keys, expire_before],
+            ).fetchall()
+        return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows}
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """两级向量缓存：进程内 LRU（带 TTL） + 可选的 SQLite 磁盘缓存
+
+    Note:
+        - 缓存键为 (模型, 维度, 文本内容哈希)
+        - 内存未命中时查询磁盘，磁盘命中的结果回填到内存
+        - 内存中以 float32 数组存储（1024 维约 4KB/条），返回时转换为新的列表，
+          调用方修改返回值不影响缓存
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl: float = 3600,
+        disk_store: Optional[SqliteEmbeddingStore] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk_store = disk_store
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+
+        # 运行指标
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, dimensions: int, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{dimensions}:{digest}"
+
+    def _get_memory(self, key: str) -> Optional[np.ndarray]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, vector = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return vector
+
+    def peek(self, key: str) -> Optional[List[float]]:
+        """读取内存缓存但不计入命中率、不调整 LRU 顺序（不查询磁盘）"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1].tolist()
+
+    def _put_memory(self, key: str, vector) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        self._entries[key] = (time.monotonic() + self.ttl, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """批量查询缓存，返回命中的键与向量"""
+        found: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        for key in dict.fromkeys(keys):
+            vector = self._get_memory(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                found[key] = vector.tolist()
+        self.memory_hits += len(found)
+
+        if missing and self.disk_store is not None:
+            disk_found = await asyncio.to_thread(self.disk_store.get_many, missing)
+            for key, vector in disk_found.items():
+                self._put_memory(key, vector)
+                found[key] = vector.tolist()
+            self.disk_hits += len(disk_found)
+            missing = [key for key in missing if key not in disk_found]
+
+        self.misses += len(missing)
+        return found
+
+    async def put_many(self, items: Dict[str, List[float]]) -> None:
+        """批量写入缓存（内存与磁盘）"""
+        for key, vector in items.items():
+            self._put_memory(key, vector)
+        if items and self.disk_store is not None:
+            await asyncio.to_thread(self.disk_store.put_many, items)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "memory_bytes": sum(v.nbytes for _, v in self._entries.values()),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (
+                round((self.memory_hits + self.disk_hits) / lookups, 4)
+                if lookups
+                else 0
+            ),
+            "disk_enabled": self.disk_store is not None,
+        }
+
+
+_embedding_cache: EmbeddingCache | None = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        disk_store = None
+        if settings.EMBEDDING_DISK_CACHE_PATH:
+            disk_store = SqliteEmbeddingStore(
+                settings.EMBEDDING_DISK_CACHE_PATH,
+                ttl=settings.EMBEDDING_DISK_CACHE_TTL,
+            )
+        _embedding_cache = EmbeddingCache(
+            max_size=settings.EMBEDDING_CACHE_SIZE,
+            ttl=settings.EMBEDDING_CACHE_TTL,
+            disk_store=disk_store,
+        )
+    return _embedding_cache
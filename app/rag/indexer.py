@@ -37,4 +37,4 @@ class Indexer:
         vectors = await self.embedder.embed_texts(chunks)
         texts = [chunk for chunk in chunks if chunk.strip()]  # 检查块是否不为空
 
-        self.milvus_handler.insert_batch(vectors, texts)
+        await self.milvus_handler.ainsert_batch(vectors, texts)
@@ -0,0 +1,99 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+
+class MilvusExecutor:
+    """在专用线程池中执行同步 pymilvus 调用，避免阻塞事件循环
+
+    Note:
+        - 线程池大小固定，信号量限制同时进行的调用数，超出的调用在事件循环中排队等待
+        - 每次调用带超时；同时把 timeout 传给 pymilvus，使底层 gRPC 请求也能及时终止
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        max_concurrency: int = 8,
+        timeout: float = 5.0,
+    ):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="milvus"
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+
+        # 运行指标
+        self.calls = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    async def run(
+        self,
+        func: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """在线程池中执行 func(*args, timeout=timeout, **kwargs)
+
+        Args:
+            func: 同步调用，需接受 timeout 关键字参数
+            timeout: 本次调用超时(秒)，默认使用全局配置
+
+        Raises:
+            asyncio.TimeoutError: 调用超时
+        """
+        timeout = self.timeout if timeout is None else timeout
+        self.waiting += 1
+        async with self._semaphore:
+            self.waiting -= 1
+            self.in_flight += 1
+            self.calls += 1
+            try:
+                loop = asyncio.get_running_loop()
+                call = functools.partial(func, *args, timeout=timeout, **kwargs)
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, call), timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+
+_milvus_executor: MilvusExecutor | None = None
+
+
+def get_milvus_executor() -> MilvusExecutor:
+    global _milvus_executor
+    if _milvus_executor is None:
+        _milvus_executor = MilvusExecutor(
+            max_workers=settings.MILVUS_MAX_WORKERS,
+            max_concurrency=settings.MILVUS_MAX_CONCURRENCY,
+            timeout=settings.MILVUS_TIMEOUT,
+        )
+    return _milvus_executor
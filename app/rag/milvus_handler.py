@@ -1,12 +1,50 @@
 from langsmith import traceable
 from pymilvus import Collection, CollectionSchema, FieldSchema, DataType, connections
 from pymilvus import utility
-from typing import List
+from pymilvus.exceptions import MilvusException
+from typing import Callable, List, Optional, TypeVar
 
 from app.core.config import settings
+from app.core.logger import logger
+from app.rag.milvus_executor import get_milvus_executor
 
+T = TypeVar("T")
 
-class MilvusHandler:
+# Milvus 服务端 "collection not loaded" 错误码
+COLLECTION_NOT_LOADED_CODE = 101
+
+
+def is_collection_not_loaded_error(e: Exception) -> bool:
+    """判断异常是否由集合未加载导致"""
+    if not isinstance(e, MilvusException):
+        return False
+    return e.code == COLLECTION_NOT_LOADED_CODE or "not loaded" in str(e).lower()
+
+
+class CollectionReloadMixin:
+    """调用前不查询集合加载状态，仅在服务端返回集合未加载错误时重新加载"""
+
+    collection: Collection
+    collection_name: str
+
+    def reload(self):
+        """重新加载集合（集合被释放后或由管理接口手动触发）"""
+        self.collection.load()
+        logger.info(f"Milvus 集合 {self.collection_name} 已重新加载")
+
+    def _with_reload(self, operation: Callable[[], T]) -> T:
+        """执行操作，遇到集合未加载错误时重新加载并重试一次"""
+        try:
+            return operation()
+        except MilvusException as e:
+            if not is_collection_not_loaded_error(e):
+                raise
+            logger.warning(f"Milvus 集合 {self.collection_name} 未加载，重新加载: {e}")
+            self.reload()
+            return operation()
+
+
+class MilvusHandler(CollectionReloadMixin):
     def __init__(self, collection_name: str = "rag_documents"):
         connections.connect("default", host=settings.MILVUS_HOST, port="19530")
         self.collection_name = collection_name
@@ -41,35 +79,93 @@ class MilvusHandler:
 
         self.collection.load()
 
-    def insert(self, vector: List[float], text: str):
-        if utility.load_state(self.collection_name) != "Loaded":
-            self.collection.load()
+    def insert(self, vector: List[float], text: str, timeout: Optional[float] = None):
         data = [[vector], [text]]
-        self.collection.insert(data=data, fields=["embedding", "text"])
+        self._with_reload(
+            lambda: self.collection.insert(
+                data=data, fields=["embedding", "text"], timeout=timeout
+            )
+        )
 
-    def insert_batch(self, vectors: List[List[float]], texts: List[str]):
-        if utility.load_state(self.collection_name) != "Loaded":
-            self.collection.load()
+    def insert_batch(
+        self,
+        vectors: List[List[float]],
+        texts: List[str],
+        timeout: Optional[float] = None,
+    ):
         assert len(vectors) == len(texts), "❌ 向量与文本数量不一致"
         for vec in vectors:
             assert len(vec) == 1024, f"❌ 向量维度错误，应为 1024，实际为: {len(vec)}"
         data = [vectors, texts]
-        self.collection.insert(data=data, fields=["embedding", "text"])
+        self._with_reload(
+            lambda: self.collection.insert(
+                data=data, fields=["embedding", "text"], timeout=timeout
+            )
+        )
 
     @traceable(run_type="retriever")
-    def search(self, vector: List[float], top_k: int) -> List[str]:
-        if utility.load_state(self.collection_name) != "Loaded":
-            self.collection.load()
+    def search(
+        self, vector: List[float], top_k: int, timeout: Optional[float] = None
+    ) -> List[str]:
         search_params = {"metric_type": "COSINE", "params": {"ef": 64}}
-        results = self.collection.search(
-            [vector], "embedding", search_params, limit=top_k, output_fields=["text"]
+        results = self._with_reload(
+            lambda: self.collection.search(
+                [vector],
+                "embedding",
+                search_params,
+                limit=top_k,
+                output_fields=["text"],
+                timeout=timeout,
+            )
         )
         return [result.entity.get("text") for result in results[0]]
 
+    async def ainsert_batch(
+        self,
+        vectors: List[List[float]],
+        texts: List[str],
+        timeout: Optional[float] = None,
+    ):
+        """insert_batch 的异步版本，在 Milvus 专用线程池中执行
+
+        Note:
+            - 默认使用 MILVUS_BULK_TIMEOUT，大文档写入不受检索超时限制
+        """
+        return await get_milvus_executor().run(
+            self.insert_batch,
+            vectors,
+            texts,
+            timeout=settings.MILVUS_BULK_TIMEOUT if timeout is None else timeout,
+        )
+
+    async def asearch(
+        self, vector: List[float], top_k: int, timeout: Optional[float] = None
+    ) -> List[str]:
+        """search 的异步版本，在 Milvus 专用线程池中执行"""
+        return await get_milvus_executor().run(
+            self.search, vector, top_k, timeout=timeout
+        )
+
     def delete_collection(self, collection_name: str = None):
         """
         删除指定的 Collection。如果未指定，默认删除当前 handler 使用的 collection。
+
+        Note:
+            - 删除的是当前 handler 使用的集合时立即重建空集合并加载，
+              共享的 handler 实例（检索服务、文档索引）无需重启即可继续使用
         """
         name = collection_name or self.collection_name
         if utility.has_collection(name):
             utility.drop_collection(name)
+        if name == self.collection_name:
+            self._create_collection()
+
+
+_milvus_handler: MilvusHandler | None = None
+
+
+def get_milvus_handler() -> MilvusHandler:
+    global _milvus_handler
+    if _milvus_handler is None:
+        _milvus_handler = MilvusHandler()
+    return _milvus_handler
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Tuple
+
+
+class RateLimiter:
+    """按分钟计的请求数(RPM)与 token 数(TPM)滑动窗口限流
+
+    Note:
+        - 参数为 0 表示不限制对应维度
+        - 单次请求的 token 数超过 TPM 时，在窗口清空后放行，避免永久阻塞
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        window: float = 60.0,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._events: Deque[Tuple[float, int]] = deque()
+        self._tokens_in_window = 0
+        self._lock = asyncio.Lock()
+
+        # 运行指标
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def _expire(self, now: float):
+        while self._events and self._events[0][0] <= now - self.window:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def _has_capacity(self, tokens: int) -> bool:
+        if not self._events:
+            return True
+        if self.requests_per_minute and len(self._events) >= self.requests_per_minute:
+            return False
+        if (
+            self.tokens_per_minute
+            and self._tokens_in_window + tokens > self.tokens_per_minute
+        ):
+            return False
+        return True
+
+    async def acquire(self, tokens: int = 0):
+        """等待直到本次请求可在预算内发出"""
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return
+        async with self._lock:
+            waited = False
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                if self._has_capacity(tokens):
+                    break
+                waited = True
+                delay = self._events[0][0] + self.window - now
+                self.wait_seconds += delay
+                await asyncio.sleep(delay)
+            if waited:
+                self.throttled += 1
+            self._events.append((time.monotonic(), tokens))
+            self._tokens_in_window += tokens
+
+    def stats(self):
+        return {
+            "requests_in_window": len(self._events),
+            "tokens_in_window": self._tokens_in_window,
+            "throttled": self.throttled,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
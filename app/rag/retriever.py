@@ -5,5 +5,5 @@ class Retriever:
 
     async def search(self, query: str, top_k: int = 5):
         vectorized_query = (await self.embedder.embed_texts([query]))[0]
-        matched_chunks = self.milvus_handler.search(vectorized_query, top_k)
+        matched_chunks = await self.milvus_handler.asearch(vectorized_query, top_k)
         return matched_chunks
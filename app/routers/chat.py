@@ -2,9 +2,14 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from fastapi.security import HTTPAuthorizationCredentials
 from langsmith import traceable
 from app.agents.text_agent import NormalAgent
-from app.core.connection_manager import ConnectionManager
+from app.agents.retrieval_context import RetrievalContext
+from app.core.connection_manager import ClientConnection, get_connection_manager
+from app.core.config import settings
 from app.core.logger import logger
 import json
+import asyncio
+from contextlib import aclosing
+from typing import Dict, Optional, Tuple
 from app.core.deps import get_current_user
 from sqlalchemy.orm import Session
 from app.core.deps import get_db
@@ -15,13 +20,19 @@ from openai.types.chat import (
     ChatCompletionContentPartImageParam,
 )
 from app.models.ws_message import StreamMessage
-from app.services.chat_record_service import save_chat_record
+from app.core.stream_relay import StreamRelay, create_stream_relay
+from app.services.chat_record_writer import get_chat_record_writer
 from datetime import datetime, timezone
-from app.services.chat_record_service import get_recent_chat_history
+from app.services.chat_history_cache import get_chat_history_cache
+from app.services.conversation_summary_service import get_conversation_summarizer
 from app.llm.openai_client import get_llm_text_client, get_llm_vl_client
 from app.memory.memory_extractor import get_memory_extractor
+from app.memory.memory_service import get_memory_service
+from app.core.task_queue import get_background_queue
+from app.agents.response_cache import get_response_cache
 from app.services.user_service import get_user_by_uuid
 from fastapi import WebSocketException, status
+import time
 
 
 async def get_user_from_websocket(websocket: WebSocket, db: Session = Depends(get_db)):
@@ -40,9 +51,47 @@ async def get_user_from_websocket(websocket: WebSocket, db: Session = Depends(ge
 
 router = APIRouter()
 
-manager = ConnectionManager()
+manager = get_connection_manager()
 agent = NormalAgent()
 memory_extractor = get_memory_extractor()
+chat_record_writer = get_chat_record_writer()
+chat_history_cache = get_chat_history_cache()
+memory_service = get_memory_service()
+conversation_summarizer = get_conversation_summarizer()
+response_cache = get_response_cache()
+
+# 回放缓存回答时每条流式消息的字数
+REPLAY_CHUNK_CHARS = 20
+# 每个用户正在生成的回复：(消息uuid, 任务)
+generations: Dict[str, Tuple[str, asyncio.Task]] = {}
+
+
+async def warm_user_state(user_uuid: str):
+    """连接建立时预加载历史对话窗口与对话摘要，并在后台加载用户记忆缓存"""
+    await chat_history_cache.load(user_uuid)
+    await conversation_summarizer.load(user_uuid)
+    await get_background_queue().submit(
+        f"warm_memory_cache:{user_uuid}", memory_service.warm_user_cache, user_uuid
+    )
+
+
+async def release_user_state(user_uuid: str):
+    """连接断开时释放用户状态，并提交尚未处理的记忆提取与摘要更新"""
+    chat_history_cache.evict(user_uuid)
+    await memory_extractor.flush_user(user_uuid)
+    await conversation_summarizer.flush_user(user_uuid)
+    conversation_summarizer.evict(user_uuid)
+    await chat_record_writer.flush()
+
+
+async def close_connection(user_uuid: str, connection: Optional[ClientConnection]):
+    """移除连接并等待其发送队列写完；用户的最后一个设备断开时释放用户状态"""
+    if connection is None:
+        return
+    remaining = manager.disconnect(user_uuid, connection)
+    await connection.wait_closed(timeout=settings.WS_SEND_TIMEOUT)
+    if not remaining:
+        await release_user_state(user_uuid)
 
 
 @router.websocket("/ws-auth")
@@ -58,138 +107,31 @@ async def websocket_endpoint_auth(
         message = StreamMessage(
             uuid=uuid, content="服务异常，请稍后再试。", status="error"
         )
-        await websocket.send_text(message.model_dump_json())
-        manager.disconnect(user_uuid)
+        await (connection or websocket).send_text(message.model_dump_json())
 
+    user_uuid = current_user.userid
+    connection = None
     try:
-        user_uuid = current_user.userid
+        # 数据库会话只用于鉴权，立即归还连接，不随 WebSocket 长期占用
+        db.close()
 
-        # 连接管理
-        await manager.connect(user_uuid, websocket)
+        # 连接管理：发送经由连接的发送队列，由独立任务写入 socket
+        connection = await manager.connect(user_uuid, websocket)
+        # 预加载历史对话窗口与记忆缓存，后续每轮直接从内存读取
+        await warm_user_state(user_uuid)
 
-        # 主消息循环
-        while True:
-            try:
-                # 接收原始消息数据
-                data_raw = await websocket.receive_text()
-                # 获取最近聊天历史
-                history = get_recent_chat_history(user_id=user_uuid, db=db)
-
-                # 解析JSON消息
-                payload = json.loads(data_raw)
-                uuid = payload.get("uuid", "")  # 消息唯一ID
-                text = payload.get("text", "")  # 文本内容
-                image = payload.get("image", [])  # 图片URL列表
-                video = payload.get("video", "")  # 视频URL
-            except json.JSONDecodeError:
-                await handle_exception(Exception("JSON解析失败"), uuid)
-                continue
-
-            # 记录接收日志
-            logger.info(
-                f"Received from {uuid}: text={text}, image={image}, video={video}"
-            )
-
-            # 根据是否有图片选择不同的客户端(VL支持多模态)
-            client = get_llm_vl_client() if image else get_llm_text_client()
-
-            # 构建消息内容(支持文本+图片)
-            content = (
-                [ChatCompletionContentPartTextParam(type="text", text=text)]
-                + [
-                    ChatCompletionContentPartImageParam(
-                        type="image_url", image_url={"url": url, "detail": "auto"}
-                    )
-                    for url in image
-                ]
-                if image
-                else [ChatCompletionContentPartTextParam(type="text", text=text)]
-            )
-
-            # 系统提示词
-            system = ChatCompletionSystemMessageParam(
-                role="system", content="You are a helpful assistant."
-            )
-            # 用户消息
-            user_msg = ChatCompletionUserMessageParam(role="user", content=content)
-
-            # 保存用户消息记录
-            response_start_time = datetime.now(timezone.utc)
-            await save_chat_record(
-                db=db,
-                user_id=user_uuid,
-                uuid=uuid,
-                role="user",
-                model=None,
-                text=text,
-                image=image,
-                video=video,
-                response_start_time=response_start_time,
-                response_end_time=None,
-            )
-
-            # 流式响应处理
-            first_chunk = True
-            response_start_time = datetime.now(timezone.utc)
-            full_response = ""
-            if image:
-                # 流式获取AI响应
-                async for chunk in client.stream_chat(system, user_msg, history):
-                    delta = chunk.choices[0].delta
-                    finish_reason = chunk.choices[0].finish_reason
-                    content_piece = delta.content or ""
-                    full_response += content_piece
-
-                    # 构建流式消息
-                    message = StreamMessage(
-                        uuid=uuid,
-                        content=content_piece,
-                        status="streaming" if finish_reason is None else "done",
-                    )
-                    # 发送开始标记(仅第一次)
-                    if first_chunk:
-                        start_msg = StreamMessage(uuid=uuid, content="", status="start")
-                        await websocket.send_text(start_msg.model_dump_json())
-                        first_chunk = False
-                    await websocket.send_text(message.model_dump_json())
-            else:
-                async for chunk in agent.run(text, user_uuid, []):
-                    delta = chunk.choices[0].delta
-                    finish_reason = chunk.choices[0].finish_reason
-                    content_piece = delta.content or ""
-                    full_response += content_piece
-                    message = StreamMessage(
-                        uuid=uuid,
-                        content=content_piece,
-                        status="streaming" if finish_reason is None else "done",
-                    )
-                    if first_chunk:
-                        start_msg = StreamMessage(uuid=uuid, content="", status="start")
-                        await websocket.send_text(start_msg.model_dump_json())
-                        first_chunk = False
-                    await websocket.send_text(message.model_dump_json())
-            # 保存AI响应记录
-            response_end_time = datetime.now(timezone.utc)
-            await save_chat_record(
-                db=db,
-                user_id=user_uuid,
-                uuid=uuid,
-                role="assistant",
-                model=chunk.model,
-                text=full_response,
-                image=image,
-                video=video,
-                response_start_time=response_start_time,
-                response_end_time=response_end_time,
-            )
-            if history and len(history) >= 3:
-                await memory_extractor.extract_memory_points(
-                    user_id=user_uuid, message=text, reply=history[-3]["content"]
-                )
+        # 主消息循环：接收与回复生成并发进行
+        await chat_session(connection, user_uuid, handle_exception)
     except WebSocketDisconnect:
-        manager.disconnect(user_uuid)
+        pass
     except Exception as e:
-        await handle_exception(e)
+        try:
+            await handle_exception(e)
+        except Exception as send_error:
+            # 连接已关闭或发送队列溢出，无法通知客户端
+            logger.warning(f"Failed to report error to {user_uuid}: {send_error!r}")
+    finally:
+        await close_connection(user_uuid, connection)
 
 
 @router.websocket("/ws-auth-late")
@@ -208,6 +150,7 @@ async def websocket_endpoint_auth_late(
         credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
         user = get_current_user(credentials=credentials, db=db)
         user_uuid = user.userid
+        db.close()  # 鉴权完成后归还数据库连接
 
     except WebSocketDisconnect:
         logger.warning("❌ 客户端在身份验证前断开连接")
@@ -227,40 +170,240 @@ async def websocket_endpoint_auth_late(
         message = StreamMessage(
             uuid=uuid, content="服务异常，请稍后再试。", status="error"
         )
-        await websocket.send_text(message.model_dump_json())
-        manager.disconnect(user_uuid)
+        await (connection or websocket).send_text(message.model_dump_json())
 
+    connection = None
     try:
-        await manager.connect(user_uuid, websocket)
+        connection = await manager.connect(user_uuid, websocket)
+        await warm_user_state(user_uuid)
 
-        while True:
+        await chat_session(connection, user_uuid, handle_exception)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        try:
+            await handle_exception(e)
+        except Exception as send_error:
+            # 连接已关闭或发送队列溢出，无法通知客户端
+            logger.warning(f"Failed to report error to {user_uuid}: {send_error!r}")
+    finally:
+        await close_connection(user_uuid, connection)
+
+
+def forget_generation(user_uuid: str, entry: Tuple[str, asyncio.Task]):
+    """回复结束后移除登记（仅当它仍是该用户当前的回复）"""
+    if generations.get(user_uuid) is entry:
+        generations.pop(user_uuid, None)
+
+
+async def stop_generation(user_uuid: str, uuid: str = ""):
+    """取消用户正在生成的回复，并等待其保存部分内容
+
+    Args:
+        user_uuid: 用户ID
+        uuid: 指定时只停止该消息的回复
+    """
+    current = generations.get(user_uuid)
+    if current is None or (uuid and uuid != current[0]):
+        return
+    task = current[1]
+    if not task.done():
+        task.cancel()
+        # 等待被取消的一轮保存部分回复，不向上传播其结果
+        await asyncio.wait([task])
+    forget_generation(user_uuid, current)
+
+
+async def request_stop(user_uuid: str, uuid: str = ""):
+    """停止用户正在生成的回复，包括该用户在其他 worker 上的设备发起的回复"""
+    await manager.publish_event("stop", user_uuid, uuid=uuid)
+    await stop_generation(user_uuid, uuid)
+
+
+async def append_history(
+    user_uuid: str, role: str, text: str, image: Optional[list] = None
+):
+    """追加到本进程的历史窗口，并同步到该用户连接所在的其他 worker"""
+    chat_history_cache.append(user_uuid, role, text, image)
+    await manager.publish_event(
+        "history", user_uuid, role=role, text=text, image=image or []
+    )
+
+
+def register_worker_events():
+    """注册跨 worker 的用户状态同步（PUBSUB_BACKEND=redis 时生效）
+
+    Note:
+        - stop：任一设备的停止或新消息结束其他 worker 上正在生成的回复
+        - history：每条消息同步到持有该用户连接的 worker 的历史窗口
+        - summary：滚动摘要更新后同步其他 worker 的内存副本
+        - memory：用户记忆写入或清除后，所有 worker 淘汰该用户的本地记忆缓存
+        - response_cache：产品文档重新索引后，所有 worker 清空语义回答缓存
+    """
+
+    async def on_stop(user_uuid: str, data: dict):
+        await stop_generation(user_uuid, data.get("uuid", ""))
+
+    async def on_history(user_uuid: str, data: dict):
+        # 淘汰的消息由发起的 worker 合并进摘要
+        chat_history_cache.append(
+            user_uuid, data["role"], data["text"], data["image"], notify_evict=False
+        )
+
+    async def on_summary(user_uuid: str, data: dict):
+        conversation_summarizer.set_summary(
+            user_uuid, data["summary"], data["turn_count"]
+        )
+
+    async def on_memory(user_uuid: str, data: dict):
+        memory_service.invalidate_user_cache(user_uuid)
+
+    async def on_response_cache(_: str, data: dict):
+        response_cache.invalidate(data["doc_version"])
+
+    async def publish_summary(user_uuid: str, summary: str, turn_count: int):
+        await manager.publish_event(
+            "summary", user_uuid, summary=summary, turn_count=turn_count
+        )
+
+    async def publish_memory_change(user_uuid: str):
+        await manager.publish_event("memory", user_uuid, everywhere=True)
+
+    manager.on_event("stop", on_stop)
+    manager.on_event("history", on_history)
+    manager.on_event("summary", on_summary)
+    manager.on_event("memory", on_memory)
+    manager.on_event("response_cache", on_response_cache)
+    conversation_summarizer.on_update = publish_summary
+    memory_service.on_change = publish_memory_change
+
+
+async def chat_session(connection: ClientConnection, user_uuid: str, handle_exception):
+    """单个连接的消息循环
+
+    Note:
+        - 接收循环常驻，每轮回复在独立任务中生成，生成期间仍能收到客户端消息
+        - 回复按用户登记：同一用户的多个设备共享对话，任一设备发送新消息或
+          {"type": "stop"}（可带 uuid 指定要停止的回复）都会结束当前回复，
+          多 worker 部署时也会结束该用户在其他 worker 上的回复
+        - 回复扇出到用户所有在线设备；最后一个设备断开时才取消未完成的回复
+        - 客户端可发送 {"type": "ping"} 启用心跳并用 {"type": "pong"} 回复服务端 ping；
+          连接被空闲回收时接收抛出 WebSocketDisconnect
+    """
+
+    async def run_turn(text, image, video, uuid, history):
+        try:
+            await handle_streaming_chat(text, image, video, uuid, user_uuid, history)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
             try:
-                data_raw = await websocket.receive_text()
-                history = get_recent_chat_history(user_id=user_uuid, db=db)
+                await handle_exception(e, uuid)
+            except Exception as send_error:
+                # 连接已断开，无法通知客户端
+                logger.warning(f"Reply {uuid} failed and client is gone: {send_error}")
 
+    try:
+        while True:
+            # 接收原始消息数据
+            data_raw = await connection.receive_text()
+            try:
+                # 解析JSON消息
                 payload = json.loads(data_raw)
-                uuid = payload.get("uuid", "")
-                text = payload.get("text", "")
-                image = payload.get("image", [])
-                video = payload.get("video", "")
             except json.JSONDecodeError:
-                await handle_exception(Exception("JSON解析失败"), uuid)
+                await handle_exception(Exception("JSON解析失败"))
                 continue
 
-            await handle_streaming_chat(
-                text, image, video, uuid, user_uuid, db, websocket, history
+            uuid = payload.get("uuid", "")  # 消息唯一ID
+            if payload.get("type") in ("ping", "pong"):
+                await connection.on_heartbeat(payload["type"])
+                continue
+            if payload.get("type") == "stop":
+                await request_stop(user_uuid, uuid)
+                continue
+
+            # 新消息到达时结束上一轮回复，保证历史与记录的顺序
+            await request_stop(user_uuid)
+            # 获取最近聊天历史
+            history = await chat_history_cache.get(user_uuid)
+            task = asyncio.create_task(
+                run_turn(
+                    payload.get("text", ""),  # 文本内容
+                    payload.get("image", []),  # 图片URL列表
+                    payload.get("video", ""),  # 视频URL
+                    uuid,
+                    history,
+                )
             )
-    except WebSocketDisconnect:
-        manager.disconnect(user_uuid)
-    except Exception as e:
-        await handle_exception(e)
+            entry = generations[user_uuid] = (uuid, task)
+            task.add_done_callback(
+                lambda _, entry=entry: forget_generation(user_uuid, entry)
+            )
+    finally:
+        if not any(c is not connection for c in manager.connections(user_uuid)):
+            await stop_generation(user_uuid)
 
 
-@traceable
-async def handle_streaming_chat(
-    text, image, video, uuid, user_uuid, db, websocket, history
+async def replay_cached_response(answer: str, relay: StreamRelay) -> str:
+    """按正常流式协议（start → streaming → done）回放缓存的回答"""
+    for i in range(0, len(answer), REPLAY_CHUNK_CHARS):
+        await relay.push(answer[i : i + REPLAY_CHUNK_CHARS])
+    return await relay.finish()
+
+
+async def relay_llm_stream(stream, relay: StreamRelay) -> Optional[str]:
+    """把模型的流式增量写入转发器，返回模型名称
+
+    Note:
+        - 本轮被取消时 aclosing 立即关闭生成器链，上游 HTTP 流随之关闭，不再消耗 token
+    """
+    model = None
+    async with aclosing(stream):
+        async for chunk in stream:
+            model = chunk.model
+            await relay.push(chunk.choices[0].delta.content or "")
+    await relay.finish()
+    return model
+
+
+async def store_shared_answer(
+    retrieval_context: RetrievalContext, answer: str, model: str, latency: float
 ):
+    """写入语义回答缓存，以模型传给 query_manual 的查询为键（已确认与用户原话一致）"""
+    cache_query = retrieval_context.tool_queries[0]
+    response_cache.store(
+        query=cache_query,
+        embedding=await retrieval_context.embed(cache_query),
+        answer=answer,
+        model=model,
+        latency=latency,
+    )
+
+
+async def cache_shared_answer(text: str, retrieval_context: RetrievalContext):
+    """基于本轮的工具结果生成不带用户个人信息的回答并写入缓存（后台任务）"""
+    start = time.perf_counter()
+    answer, model = await agent.shared_answer(text, retrieval_context)
+    await store_shared_answer(
+        retrieval_context, answer, model, time.perf_counter() - start
+    )
+
+
+async def after_reply(user_uuid: str, text: str, reply: str):
+    # 超出历史窗口的消息累积到一定数量后在后台合并进对话摘要
+    await conversation_summarizer.maybe_refresh(user_uuid)
+    # 累积本轮对话，由提取器按批次提交记忆提取
+    await memory_extractor.add_turn(user_id=user_uuid, message=text, reply=reply)
+
+
+@traceable
+async def handle_streaming_chat(text, image, video, uuid, user_uuid, history):
     logger.info(f"Received from {uuid}: text={text}, image={image}, video={video}")
+    retrieval_context = None
+    if not image:
+        # 尽早启动用户记忆检索，与记录保存等准备工作并行
+        retrieval_context = RetrievalContext(query=text, user_id=user_uuid)
+        retrieval_context.start_memory_search()
     client = get_llm_vl_client() if image else get_llm_text_client()
     content = (
         [ChatCompletionContentPartTextParam(type="text", text=text)]
@@ -279,8 +422,7 @@ async def handle_streaming_chat(
     user_msg = ChatCompletionUserMessageParam(role="user", content=content)
 
     response_start_time = datetime.now(timezone.utc)
-    await save_chat_record(
-        db=db,
+    chat_record_writer.add(
         user_id=user_uuid,
         uuid=uuid,
         role="user",
@@ -291,58 +433,79 @@ async def handle_streaming_chat(
         response_start_time=response_start_time,
         response_end_time=None,
     )
+    await append_history(user_uuid, "user", text, image)
 
-    first_chunk = True
     response_start_time = datetime.now(timezone.utc)
-    full_response = ""
-    if image:
-        async for chunk in client.stream_chat(system, user_msg, history):
-            delta = chunk.choices[0].delta
-            finish_reason = chunk.choices[0].finish_reason
-            content_piece = delta.content or ""
-            full_response += content_piece
-            message = StreamMessage(
-                uuid=uuid,
-                content=content_piece,
-                status="streaming" if finish_reason is None else "done",
+    # 增量按时间/大小窗口合并成帧，扇出到用户的所有设备
+    relay = create_stream_relay(manager.user_sender(user_uuid), uuid)
+    model = client.model if image else agent.client.model
+    stopped = False
+    try:
+        cached = None
+        if not image and response_cache.enabled:
+            # 产品说明类问题命中语义缓存时直接回放，不再调用工具与模型
+            cached = response_cache.lookup(await retrieval_context.embed())
+        if cached is not None:
+            # 命中缓存时不再需要本轮的记忆检索
+            retrieval_context.cancel()
+            replay_start = time.perf_counter()
+            await replay_cached_response(cached.answer, relay)
+            response_cache.record_saved(
+                cached.latency - (time.perf_counter() - replay_start)
             )
-            if first_chunk:
-                start_msg = StreamMessage(uuid=uuid, content="", status="start")
-                await websocket.send_text(start_msg.model_dump_json())
-                first_chunk = False
-            await websocket.send_text(message.model_dump_json())
-    else:
-        async for chunk in agent.run(text, user_uuid, []):
-            delta = chunk.choices[0].delta
-            finish_reason = chunk.choices[0].finish_reason
-            content_piece = delta.content or ""
-            full_response += content_piece
-            message = StreamMessage(
-                uuid=uuid,
-                content=content_piece,
-                status="streaming" if finish_reason is None else "done",
+            model = cached.model
+        elif image:
+            model = await relay_llm_stream(
+                client.stream_chat(system, user_msg, history), relay
+            )
+        else:
+            generation_start = time.perf_counter()
+            model = await relay_llm_stream(
+                agent.run(text, user_uuid, history, retrieval_context), relay
             )
-            if first_chunk:
-                start_msg = StreamMessage(uuid=uuid, content="", status="start")
-                await websocket.send_text(start_msg.model_dump_json())
-                first_chunk = False
-            await websocket.send_text(message.model_dump_json())
+            if retrieval_context.shareable and retrieval_context.personalized:
+                # 回复带了用户个人信息，在后台生成不带个人信息的副本写入缓存
+                await get_background_queue().submit(
+                    f"response_cache:{uuid}",
+                    cache_shared_answer,
+                    text,
+                    retrieval_context,
+                )
+            elif retrieval_context.shareable:
+                await store_shared_answer(
+                    retrieval_context,
+                    relay.text,
+                    model,
+                    time.perf_counter() - generation_start,
+                )
+    except asyncio.CancelledError:
+        # 用户停止生成、发送新消息或连接断开：上游流已关闭，保存已生成的部分回复
+        stopped = True
+        if retrieval_context is not None:
+            retrieval_context.cancel()
+        await relay.stop(notify=manager.is_connected(user_uuid))
+        logger.info(f"Reply {uuid} stopped after {len(relay.text)} chars")
+    finally:
+        relay.close()
+    full_response = relay.text
+    if stopped and not full_response:
+        raise asyncio.CancelledError
 
     response_end_time = datetime.now(timezone.utc)
-    await save_chat_record(
-        db=db,
+    chat_record_writer.add(
         user_id=user_uuid,
         uuid=uuid,
         role="assistant",
-        model=chunk.model,
+        model=model,
         text=full_response,
         image=image,
         video=video,
         response_start_time=response_start_time,
         response_end_time=response_end_time,
     )
-    if history and len(history) >= 3:
-        await memory_extractor.extract_memory_points(
-            user_id=user_uuid, message=text, reply=history[-3]["content"]
-        )
+    await append_history(user_uuid, "assistant", full_response, image)
+    # 回复已保存，后续的摘要与记忆提取不受本轮取消影响
+    await asyncio.shield(after_reply(user_uuid, text, full_response))
+    if stopped:
+        raise asyncio.CancelledError
     return full_response
@@ -0,0 +1,51 @@
+from fastapi import APIRouter
+from app.core.task_queue import get_background_queue
+from app.services.chat_record_writer import get_chat_record_writer
+from app.services.chat_history_cache import get_chat_history_cache
+from app.services.conversation_summary_service import get_conversation_summarizer
+from app.rag.embedding_cache import get_embedding_cache
+from app.rag.embedder import get_embedding_rate_limiter
+from app.rag.milvus_executor import get_milvus_executor
+from app.memory.memory_cache import get_user_memory_cache
+from app.memory.memory_extractor import get_memory_extractor
+from app.memory.extraction_gate import get_extraction_gate
+from app.llm.openai_client import get_llm_usage_stats
+from app.llm.context_budget import get_context_budget_stats
+from app.agents.response_cache import get_response_cache
+from app.core.stream_relay import get_stream_relay_stats
+from app.core.connection_manager import get_connection_manager
+from app.utils.response import success
+
+router = APIRouter(prefix="/metrics", tags=["运行指标"])
+
+
+@router.get("")
+async def get_metrics():
+    """运行指标接口
+
+    Returns:
+        各组件的运行指标（队列深度、等待时间等）
+
+    Note:
+        - 在事件循环中执行：各组件的状态由事件循环修改，不能在线程池中遍历
+        - 只返回计数类指标，不包含用户ID
+    """
+    return success(
+        {
+            "background_queue": get_background_queue().stats(),
+            "chat_record_writer": get_chat_record_writer().stats(),
+            "chat_history_cache": get_chat_history_cache().stats(),
+            "conversation_summary": get_conversation_summarizer().stats(),
+            "embedding_cache": get_embedding_cache().stats(),
+            "embedding_rate_limiter": get_embedding_rate_limiter().stats(),
+            "milvus_executor": get_milvus_executor().stats(),
+            "user_memory_cache": get_user_memory_cache().stats(),
+            "memory_extractor": get_memory_extractor().stats(),
+            "memory_extraction_gate": get_extraction_gate().stats(),
+            "llm_usage": get_llm_usage_stats().stats(),
+            "context_budget": get_context_budget_stats().stats(),
+            "response_cache": get_response_cache().stats(),
+            "stream_relay": get_stream_relay_stats().stats(),
+            "websocket_connections": get_connection_manager().stats(),
+        }
+    )
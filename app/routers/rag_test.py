@@ -1,10 +1,10 @@
+import asyncio
 from fastapi import APIRouter, Query
 from typing import Optional
 from pydantic import BaseModel
-from app.rag.milvus_handler import MilvusHandler
-from app.rag.retriever import Retriever
+from app.rag.milvus_handler import get_milvus_handler
 from app.core.startup import initialize_product_docs
-from app.rag.embedder import get_aliyun_embedder
+from app.services.rag_service import get_rag_service
 
 router = APIRouter(tags=["RAG 测试"])
 
@@ -14,12 +14,9 @@ class QueryRequest(BaseModel):
     top_k: int = 5
 
 
-handler = MilvusHandler()
-
-
 @router.post("/rag/test")
 async def rag_query(request: QueryRequest):
-    retriever = Retriever(get_aliyun_embedder(), handler)
+    retriever = get_rag_service().retriever
 
     chunks = await retriever.search(request.query, request.top_k)
     return {"query": request.query, "results": chunks}
@@ -29,12 +26,23 @@ async def rag_query(request: QueryRequest):
 async def delete_collection(
     collection_name: Optional[str] = Query(default=None, description="要删除的集合名")
 ):
+    handler = get_milvus_handler()
     handler.delete_collection(collection_name)
     return {
         "message": f"Collection '{collection_name or handler.collection_name}' deleted successfully."
     }
 
 
+@router.post("/rag/collection/reload")
+async def reload_collections():
+    """手动重新加载 RAG 文档集合与用户记忆集合（例如在 Milvus 中手动 release 之后）"""
+    from app.memory.milvus_memory_handler import get_milvus_memory_handler
+
+    await asyncio.to_thread(get_milvus_handler().reload)
+    await asyncio.to_thread(get_milvus_memory_handler().reload)
+    return {"message": "集合已重新加载"}
+
+
 @router.post("/rag/initialize")
 async def initialize_docs():
     """手动触发产品说明文档的向量化处理"""
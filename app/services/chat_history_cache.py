@@ -0,0 +1,133 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.chat_record_service import (
+    build_history_message,
+    get_recent_chat_history,
+)
+from app.services.chat_record_writer import get_chat_record_writer
+
+
+async def load_recent_chat_history(
+    user_id: str, limit: int
+) -> List[ChatCompletionMessageParam]:
+    """从数据库读取最近聊天历史（仅用于冷启动）"""
+    chat_record_writer = get_chat_record_writer()
+    if chat_record_writer.has_pending(user_id):
+        # 写缓冲中还有该用户未落库的记录，先写入保证历史完整
+        await chat_record_writer.flush()
+    async with AsyncSessionLocal() as db:
+        return await get_recent_chat_history(user_id=user_id, db=db, limit=limit)
+
+
+class ChatHistoryCache:
+    """按用户维护的滚动对话历史窗口
+
+    Note:
+        - 连接建立时从数据库加载一次（同一用户的并发加载共用一次查询），之后每轮对话原地追加
+        - 每个用户最多保留 max_turns 轮（user + assistant 各一条）
+        - 连接断开时释放，下次连接重新从数据库加载
+        - 被窗口淘汰的消息交给 on_evict 回调（用于滚动摘要）
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 7,
+        loader: Optional[
+            Callable[[str, int], Awaitable[List[ChatCompletionMessageParam]]]
+        ] = None,
+        on_evict: Optional[Callable[[str, ChatCompletionMessageParam], None]] = None,
+    ):
+        self.max_turns = max_turns
+        self.loader = loader or load_recent_chat_history
+        self.on_evict = on_evict
+        self._histories: Dict[str, Deque[ChatCompletionMessageParam]] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+
+        # 运行指标
+        self.hits = 0
+        self.loads = 0
+
+    async def load(self, user_id: str) -> Deque[ChatCompletionMessageParam]:
+        """确保用户的历史窗口已加载，未加载时从数据库冷启动"""
+        history = self._histories.get(user_id)
+        if history is not None:
+            self.hits += 1
+            return history
+        pending = self._loading.get(user_id)
+        if pending is None:
+            pending = self._loading[user_id] = asyncio.ensure_future(
+                self.loader(user_id, self.max_turns)
+            )
+            pending.add_done_callback(lambda _: self._loading.pop(user_id, None))
+            self.loads += 1
+        records = await asyncio.shield(pending)
+        # 加载期间可能已有并发写入，以先完成的为准
+        history = self._histories.setdefault(
+            user_id, deque(records, maxlen=self.max_turns * 2)
+        )
+        return history
+
+    async def get(self, user_id: str) -> List[ChatCompletionMessageParam]:
+        """获取用户历史消息快照（按时间正序）"""
+        return list(await self.load(user_id))
+
+    def append(
+        self,
+        user_id: str,
+        role: str,
+        text: Optional[str],
+        image: Optional[List[str]] = None,
+        notify_evict: bool = True,
+    ) -> None:
+        """追加一条已完成的消息，超出窗口的最旧消息自动淘汰
+
+        Args:
+            notify_evict: 是否把淘汰的消息交给 on_evict；从其他 worker 同步来的消息
+                由发起的 worker 负责合并摘要，同步时传 False
+        """
+        history = self._histories.get(user_id)
+        if history is None:
+            # 尚未加载的用户不追加，下次访问时从数据库加载
+            return
+        if (
+            len(history) == history.maxlen
+            and notify_evict
+            and self.on_evict is not None
+        ):
+            self.on_evict(user_id, history[0])
+        history.append(build_history_message(role, text, image))
+
+    def evict(self, user_id: str) -> None:
+        self._histories.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._histories),
+            "hits": self.hits,
+            "loads": self.loads,
+        }
+
+
+_chat_history_cache: ChatHistoryCache | None = None
+
+
+def get_chat_history_cache() -> ChatHistoryCache:
+    global _chat_history_cache
+    if _chat_history_cache is None:
+        on_evict = None
+        if settings.CONVERSATION_SUMMARY_ENABLED:
+            from app.services.conversation_summary_service import (
+                get_conversation_summarizer,
+            )
+
+            on_evict = get_conversation_summarizer().add_aged_out
+        _chat_history_cache = ChatHistoryCache(
+            max_turns=settings.CHAT_HISTORY_TURNS, on_evict=on_evict
+        )
+    return _chat_history_cache
@@ -1,8 +1,8 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.chat_record import ChatRecord  # 确保导入路径正确
-from datetime import datetime
-from typing import List, Optional
-from sqlalchemy import desc
+from datetime import datetime, timezone
+from typing import List, Optional, Union
+from sqlalchemy import desc, insert, select
 from openai.types.chat import (
     ChatCompletionUserMessageParam,
     ChatCompletionAssistantMessageParam,
@@ -10,9 +10,23 @@ from openai.types.chat import (
     ChatCompletionContentPartImageParam,
 )
 
+# chat_record 的时间列为 timestamp without time zone
+TIME_FIELDS = ("response_start_time", "response_end_time")
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """把带时区的时间转换为不带时区的 UTC 时间
+
+    Note:
+        - asyncpg 不接受把带时区的 datetime 写入不带时区的列（psycopg2 会隐式接受）
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
 
 async def save_chat_record(
-    db: Session,  # SQLAlchemy数据库会话
+    db: AsyncSession,  # SQLAlchemy异步数据库会话
     user_id: str,  # 用户ID
     uuid: str,  # 消息唯一标识符
     role: str,  # 消息角色(user/assistant)
@@ -26,7 +40,7 @@ async def save_chat_record(
     """保存聊天记录到数据库
 
     Args:
-        db: 数据库会话
+        db: 异步数据库会话
         user_id: 用户ID
         uuid: 消息唯一ID
         role: 消息发送者角色
@@ -49,24 +63,48 @@ async def save_chat_record(
         text=text,
         image=image,
         video=video,
-        response_start_time=response_start_time,
-        response_end_time=response_end_time,
+        response_start_time=to_naive_utc(response_start_time),
+        response_end_time=to_naive_utc(response_end_time),
     )
 
     # 数据库操作
     db.add(record)  # 添加到会话
-    db.commit()  # 提交事务
-    db.refresh(record)  # 刷新获取最新状态
+    await db.commit()  # 提交事务
+    await db.refresh(record)  # 刷新获取最新状态
 
     return record  # 返回保存后的记录
 
 
-def get_recent_chat_history(user_id: str, db: Session, limit: int = 7):
+async def save_chat_records_bulk(db: AsyncSession, records: List[dict]) -> int:
+    """批量保存聊天记录（单条多行 INSERT + 一次提交）
+
+    Args:
+        db: 异步数据库会话
+        records: 聊天记录字段字典列表，字段与 save_chat_record 参数一致
+
+    Returns:
+        int: 写入的记录条数
+
+    Note:
+        - 不回读写入的记录，适用于只写不读的聊天记录持久化
+        - 时间字段转换为不带时区的 UTC 时间
+    """
+    if not records:
+        return 0
+    records = [
+        {**r, **{f: to_naive_utc(r[f]) for f in TIME_FIELDS if f in r}} for r in records
+    ]
+    await db.execute(insert(ChatRecord), records)  # 多行插入
+    await db.commit()  # 一次提交
+    return len(records)
+
+
+async def get_recent_chat_history(user_id: str, db: AsyncSession, limit: int = 7):
     """获取用户最近的聊天历史记录
 
     Args:
         user_id: 用户ID
-        db: 数据库会话
+        db: 异步数据库会话
         limit: 获取的对话轮次数(默认7轮)
 
     Returns:
@@ -74,45 +112,56 @@ def get_recent_chat_history(user_id: str, db: Session, limit: int = 7):
             格式化后的聊天历史记录列表
     """
     # 从数据库查询最近的聊天记录(limit*2是因为每轮对话包含user和assistant两条记录)
-    records = (
-        db.query(ChatRecord)
+    result = await db.execute(
+        select(ChatRecord)
         .filter(ChatRecord.user_id == user_id)  # 按用户ID过滤
         .filter(ChatRecord.role.in_(["user", "assistant"]))  # 只包含用户和AI助手的消息
         .order_by(desc(ChatRecord.id))  # 按ID降序(最新的在前面)
         .limit(limit * 2)  # 限制查询数量
-        .all()
     )
+    records = result.scalars().all()
 
     # 按ID升序排序(恢复时间顺序)
     records = sorted(records, key=lambda r: r.id)
 
-    history = []
-    for record in records:
-        # 构建文本消息部分
-        text_part = ChatCompletionContentPartTextParam(
-            type="text", text=record.text or ""
-        )
-
-        # 构建图片消息部分(如果有)
-        image_parts = []
-        if isinstance(record.image, list):
-            image_parts = [
-                ChatCompletionContentPartImageParam(
-                    type="image_url", image_url={"url": url, "detail": "auto"}
-                )
-                for url in record.image
-                if isinstance(url, str)  # 确保URL是字符串类型
-            ]
-
-        # 合并文本和图片内容
-        content = [text_part] + image_parts
-
-        # 根据角色类型添加到历史记录
-        if record.role == "user":
-            history.append(ChatCompletionUserMessageParam(role="user", content=content))
-        else:
-            history.append(
-                ChatCompletionAssistantMessageParam(role="assistant", content=content)
+    return [
+        build_history_message(record.role, record.text, record.image)
+        for record in records
+    ]
+
+
+def build_history_message(
+    role: str, text: Optional[str], image: Optional[List[str]] = None
+) -> Union[ChatCompletionUserMessageParam, ChatCompletionAssistantMessageParam]:
+    """把一条聊天记录转换为模型可用的历史消息
+
+    Args:
+        role: 消息角色(user/assistant)
+        text: 文本内容
+        image: 图片URL列表
+
+    Returns:
+        Union[ChatCompletionUserMessageParam, ChatCompletionAssistantMessageParam]:
+            包含文本和图片内容的历史消息
+    """
+    # 构建文本消息部分
+    text_part = ChatCompletionContentPartTextParam(type="text", text=text or "")
+
+    # 构建图片消息部分(如果有)
+    image_parts = []
+    if isinstance(image, list):
+        image_parts = [
+            ChatCompletionContentPartImageParam(
+                type="image_url", image_url={"url": url, "detail": "auto"}
             )
+            for url in image
+            if isinstance(url, str)  # 确保URL是字符串类型
+        ]
+
+    # 合并文本和图片内容
+    content = [text_part] + image_parts
 
-    return history
+    # 根据角色类型构建消息
+    if role == "user":
+        return ChatCompletionUserMessageParam(role="user", content=content)
+    return ChatCompletionAssistantMessageParam(role="assistant", content=content)
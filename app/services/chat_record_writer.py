@@ -0,0 +1,145 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logger import logger
+from app.services.chat_record_service import save_chat_records_bulk
+
+
+class ChatRecordWriter:
+    """聊天记录写缓冲（write-behind）
+
+    Note:
+        - add 只把记录放入内存缓冲，不等待数据库
+        - 后台任务按时间窗口或批量大小把所有连接的记录合并为一次多行 INSERT
+        - 连接断开和应用关闭时调用 flush 保证缓冲落库
+        - 写入失败的记录放回缓冲等待下次重试
+        - 缓冲最多保留 max_pending 条（数据库不可用时），超过后丢弃最早的记录并计数
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        flush_interval: float = 0.05,
+        max_batch: int = 200,
+        max_pending: int = 10000,
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # 运行指标
+        self.rows_written = 0
+        self.commits = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="chat-record-writer")
+
+    def add(self, **record) -> None:
+        """添加一条聊天记录到写缓冲，字段与 save_chat_record 参数一致"""
+        if self._task is None or self._task.done():
+            self.start()
+        if len(self._pending) >= self.max_pending:
+            # 数据库长时间不可用时缓冲不无限增长，丢弃最早的记录
+            del self._pending[0]
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.error(f"聊天记录写缓冲已满，已丢弃 {self.dropped} 条记录")
+        self._pending.append(record)
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+
+    def has_pending(self, user_id: str) -> bool:
+        return any(r.get("user_id") == user_id for r in self._pending)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if len(self._pending) < self.max_batch:
+                # 等待时间窗口结束或批量写满，合并更多记录
+                try:
+                    await asyncio.wait_for(
+                        self._full.wait(), timeout=self.flush_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """立即把缓冲中的记录写入数据库
+
+        Returns:
+            int: 本次写入的记录条数
+        """
+        async with self._lock:
+            written = 0
+            while self._pending:
+                batch = self._pending[: self.max_batch]
+                del self._pending[: len(batch)]
+                try:
+                    async with self.session_factory() as db:
+                        written += await save_chat_records_bulk(db, batch)
+                except Exception as e:
+                    self.failures += 1
+                    logger.error(f"聊天记录批量写入失败({len(batch)} 条): {e}")
+                    self._requeue(batch)
+                    break
+                self.commits += 1
+                self.rows_written += len(batch)
+            return written
+
+    def _requeue(self, batch: List[Dict[str, Any]]):
+        room = self.max_pending - len(self._pending)
+        if room < len(batch):
+            dropped = len(batch) - max(room, 0)
+            self.dropped += dropped
+            logger.error(f"聊天记录写缓冲已满，丢弃 {dropped} 条记录")
+            batch = batch[dropped:]
+        self._pending[:0] = batch
+
+    async def close(self):
+        """停止后台任务并写入剩余记录"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "rows_written": self.rows_written,
+            "commits": self.commits,
+            "rows_per_commit": (
+                round(self.rows_written / self.commits, 2) if self.commits else 0
+            ),
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+
+_chat_record_writer: ChatRecordWriter | None = None
+
+
+def get_chat_record_writer() -> ChatRecordWriter:
+    global _chat_record_writer
+    if _chat_record_writer is None:
+        _chat_record_writer = ChatRecordWriter(
+            flush_interval=settings.CHAT_RECORD_FLUSH_INTERVAL,
+            max_batch=settings.CHAT_RECORD_FLUSH_BATCH,
+            max_pending=settings.CHAT_RECORD_MAX_PENDING,
+        )
+    return _chat_record_writer
@@ -0,0 +1,239 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from openai.types.chat import (
+    ChatCompletionMessageParam,
+    ChatCompletionSystemMessageParam,
+    ChatCompletionUserMessageParam,
+)
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logger import logger
+from app.core.task_queue import get_background_queue
+from app.models.conversation_summary import ConversationSummary
+
+SUMMARY_SYSTEM_PROMPT = (
+    "你是对话摘要助手。请把已有摘要与新的对话内容合并成一段新的摘要，"
+    "保留用户提到的事件、情绪变化、未解决的问题和双方约定，删除寒暄和重复内容。\n"
+    "【要求】\n"
+    "- 使用第三人称（“用户”“助手”）客观描述，不编造内容。\n"
+    "- 只输出摘要正文，不超过 {max_chars} 字。"
+)
+
+
+async def get_conversation_summary(
+    db: AsyncSession, user_id: str
+) -> Optional[ConversationSummary]:
+    """读取用户的对话摘要"""
+    result = await db.execute(
+        select(ConversationSummary).filter(ConversationSummary.user_id == user_id)
+    )
+    return result.scalars().first()
+
+
+async def save_conversation_summary(
+    db: AsyncSession, user_id: str, summary: str, turn_count: int
+) -> None:
+    """写入（或更新）用户的对话摘要"""
+    record = await get_conversation_summary(db, user_id)
+    if record is None:
+        db.add(
+            ConversationSummary(user_id=user_id, summary=summary, turn_count=turn_count)
+        )
+    else:
+        record.summary = summary
+        record.turn_count = turn_count
+    await db.commit()
+
+
+def message_text(message: ChatCompletionMessageParam) -> str:
+    """提取历史消息中的文本部分"""
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part.get("text") or "" for part in content or [] if part.get("type") == "text"
+    )
+
+
+class ConversationSummarizer:
+    """滚动对话摘要
+
+    Note:
+        - 历史窗口淘汰的消息先缓存在内存中，累积 batch_messages 条后提交到后台队列，
+          由一次 LLM 调用把新消息合并进已有摘要并写入数据库，不占用对话的响应时间
+        - 摘要在用户连接时从数据库加载，对话中直接读取内存中的副本
+        - 同一用户的摘要更新串行执行，避免并发覆盖
+        - 摘要更新后回调 on_update（用于通知其他 worker 更新内存副本）
+    """
+
+    def __init__(
+        self,
+        llm=None,
+        batch_messages: int = 4,
+        max_chars: int = 300,
+        loader=None,
+        saver=None,
+        on_update: Optional[Callable[[str, str, int], Awaitable[None]]] = None,
+    ):
+        if llm is None:
+            from app.llm.openai_client import get_llm_text_client
+
+            llm = get_llm_text_client()
+        self.llm = llm
+        self.batch_messages = batch_messages
+        self.max_chars = max_chars
+        self.loader = loader or self._load_from_db
+        self.saver = saver or self._save_to_db
+        self.on_update = on_update
+        self.queue = get_background_queue()
+        self._summaries: Dict[str, str] = {}
+        self._turn_counts: Dict[str, int] = {}
+        self._aged_out: Dict[str, List[ChatCompletionMessageParam]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+        # 运行指标（摘要生成成本）
+        self.refreshes = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_seconds = 0.0
+
+    @staticmethod
+    async def _load_from_db(user_id: str) -> Optional[ConversationSummary]:
+        async with AsyncSessionLocal() as db:
+            return await get_conversation_summary(db, user_id)
+
+    @staticmethod
+    async def _save_to_db(user_id: str, summary: str, turn_count: int) -> None:
+        async with AsyncSessionLocal() as db:
+            await save_conversation_summary(db, user_id, summary, turn_count)
+
+    async def load(self, user_id: str) -> str:
+        """连接建立时加载用户摘要"""
+        if user_id not in self._summaries:
+            record = await self.loader(user_id)
+            self._summaries[user_id] = record.summary if record else ""
+            self._turn_counts[user_id] = record.turn_count if record else 0
+        return self._summaries[user_id]
+
+    def get(self, user_id: str) -> str:
+        return self._summaries.get(user_id, "")
+
+    def add_aged_out(self, user_id: str, message: ChatCompletionMessageParam) -> None:
+        """记录被历史窗口淘汰的消息（ChatHistoryCache 的淘汰回调）"""
+        self._aged_out.setdefault(user_id, []).append(message)
+
+    async def maybe_refresh(self, user_id: str) -> bool:
+        """淘汰的消息达到批量大小时提交摘要更新"""
+        if len(self._aged_out.get(user_id, [])) < self.batch_messages:
+            return False
+        return await self.flush_user(user_id)
+
+    async def flush_user(self, user_id: str) -> bool:
+        """提交用户所有待合并的消息（断开连接时调用）"""
+        messages = self._aged_out.pop(user_id, None)
+        if not messages:
+            return False
+        return await self.queue.submit(
+            f"conversation_summary:{user_id}", self.refresh, user_id, messages
+        )
+
+    def _build_prompt(self, summary: str, messages: List[ChatCompletionMessageParam]):
+        lines = []
+        for message in messages:
+            speaker = "用户" if message.get("role") == "user" else "助手"
+            lines.append(f"{speaker}：{message_text(message)}")
+        system = ChatCompletionSystemMessageParam(
+            role="system",
+            content=SUMMARY_SYSTEM_PROMPT.format(max_chars=self.max_chars),
+        )
+        prompt = ChatCompletionUserMessageParam(
+            role="user",
+            content=f"已有摘要：\n{summary or '无'}\n\n新的对话：\n" + "\n".join(lines),
+        )
+        return system, prompt
+
+    async def refresh(
+        self, user_id: str, messages: List[ChatCompletionMessageParam]
+    ) -> None:
+        """把新淘汰的消息合并进摘要并持久化"""
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            if user_id in self._summaries:
+                summary = self._summaries[user_id]
+                turn_count = self._turn_counts.get(user_id, 0)
+            else:
+                record = await self.loader(user_id)
+                summary = record.summary if record else ""
+                turn_count = record.turn_count if record else 0
+
+            system, prompt = self._build_prompt(summary, messages)
+            start = time.perf_counter()
+            try:
+                response = await self.llm.chat(system=system, prompt=prompt, history=[])
+            except Exception:
+                self.failures += 1
+                raise
+            finally:
+                self.llm_seconds += time.perf_counter() - start
+            self.refreshes += 1
+            if response.usage is not None:
+                self.prompt_tokens += response.usage.prompt_tokens or 0
+                self.completion_tokens += response.usage.completion_tokens or 0
+
+            new_summary = (response.choices[0].message.content or "").strip()
+            if not new_summary:
+                logger.warning(f"用户 {user_id} 的对话摘要为空，保留原摘要")
+                return
+            turn_count += len(messages)
+            await self.saver(user_id, new_summary, turn_count)
+            # 用户仍在线时更新内存副本
+            self.set_summary(user_id, new_summary, turn_count)
+            if self.on_update is not None:
+                await self.on_update(user_id, new_summary, turn_count)
+
+    def set_summary(self, user_id: str, summary: str, turn_count: int) -> None:
+        """更新已加载用户的内存副本（未加载的用户下次连接时从数据库读取）"""
+        if user_id in self._summaries:
+            self._summaries[user_id] = summary
+            self._turn_counts[user_id] = turn_count
+
+    def evict(self, user_id: str) -> None:
+        self._summaries.pop(user_id, None)
+        self._turn_counts.pop(user_id, None)
+        lock = self._locks.get(user_id)
+        if lock is not None and not lock.locked():
+            self._locks.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._summaries),
+            "pending_messages": sum(len(m) for m in self._aged_out.values()),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_llm_ms": (
+                round(self.llm_seconds / self.refreshes * 1000, 2)
+                if self.refreshes
+                else 0
+            ),
+        }
+
+
+_conversation_summarizer: ConversationSummarizer | None = None
+
+
+def get_conversation_summarizer() -> ConversationSummarizer:
+    global _conversation_summarizer
+    if _conversation_summarizer is None:
+        _conversation_summarizer = ConversationSummarizer(
+            batch_messages=settings.CONVERSATION_SUMMARY_BATCH_MESSAGES,
+            max_chars=settings.CONVERSATION_SUMMARY_MAX_CHARS,
+        )
+    return _conversation_summarizer
@@ -1,23 +1,60 @@
-from typing import List
+import asyncio
+from typing import List, Optional
 
 # 引入所需的类
-from app.rag.embedder import AliyunEmbedder
-from app.rag.milvus_handler import MilvusHandler
+from app.core.logger import logger
+from app.rag.embedder import get_aliyun_embedder
+from app.rag.milvus_handler import get_milvus_handler
 from app.rag.retriever import Retriever
 
 
 class RAGService:
     def __init__(self):
-        # 初始化嵌入器、Milvus处理器和检索器
-        self.embedder = AliyunEmbedder()  # 创建嵌入器实例
-        self.milvus_handler = MilvusHandler()  # 创建Milvus处理器实例
+        # 复用全局嵌入器（HTTP 连接池）与 Milvus 处理器（gRPC 连接）
+        self.embedder = get_aliyun_embedder()  # 获取嵌入器实例
+        self.milvus_handler = get_milvus_handler()  # 获取Milvus处理器实例
         self.retriever = Retriever(self.embedder, self.milvus_handler)  # 创建检索器实例
+        self.ready = False  # 是否已完成预热
 
-    async def query(self, question: str, top_k: int = 2) -> List[str]:
-        # 将问题转化为嵌入向量
-        embedding = await self.embedder.embed_texts([question])  # 异步获取嵌入向量
+    async def warm_up(self) -> bool:
+        """预热检索链路：建立向量化 HTTP 连接并确认 Milvus 集合已加载
+
+        Returns:
+            bool: 预热是否成功
+        """
+        try:
+            await self.embedder.warm_up()
+            await asyncio.to_thread(self.milvus_handler.collection.load)
+            self.ready = True
+            logger.info("✅ RAG 检索服务预热完成")
+        except Exception as e:
+            self.ready = False
+            logger.error(f"RAG 检索服务预热失败: {e}")
+        return self.ready
+
+    async def query(
+        self, question: str, top_k: int = 2, embedding: Optional[List[float]] = None
+    ) -> List[str]:
+        # 将问题转化为嵌入向量（调用方已计算过向量时直接复用）
+        if embedding is None:
+            embedding = (await self.embedder.embed_texts([question]))[0]
         # 从Milvus中检索最匹配的文档
-        matched_chunks = self.milvus_handler.search(
-            embedding[0], top_k
-        )  # 同步检索匹配的文档
+        matched_chunks = await self.milvus_handler.asearch(
+            embedding, top_k
+        )  # 在 Milvus 线程池中检索，不阻塞事件循环
         return matched_chunks  # 返回匹配到的文档片段
+
+
+_rag_service: RAGService | None = None
+
+
+def get_rag_service() -> RAGService:
+    global _rag_service
+    if _rag_service is None:
+        _rag_service = RAGService()
+    return _rag_service
+
+
+def is_rag_service_ready() -> bool:
+    """检索服务是否已创建并完成预热（不会触发创建）"""
+    return _rag_service is not None and _rag_service.ready
@@ -0,0 +1,84 @@
+"""广播耗时随连接数的变化：对比逐个 await send_text（改造前）与发送队列 + 并发等待写出
+
+每个模拟连接的 send_text 带随机网络延迟，其中一小部分为慢连接。
+用法：
+    python app/test/benchmark/broadcast_bench.py --connections 10 100 1000 --delay-ms 2 --slow-ratio 0.01
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+import argparse
+import asyncio
+import random
+import time
+
+from app.core.connection_manager import ConnectionManager
+from app.core.logger import logger
+
+
+class FakeSocket:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.delay)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def make_sockets(count: int, delay_ms: float, slow_ratio: float, slow_ms: float):
+    rng = random.Random(count)
+    return [
+        FakeSocket(
+            (slow_ms if rng.random() < slow_ratio else rng.uniform(0, 2 * delay_ms))
+            / 1000
+        )
+        for _ in range(count)
+    ]
+
+
+async def sequential(sockets, message: str) -> float:
+    """改造前：按连接顺序逐个发送"""
+    start = time.perf_counter()
+    for socket in sockets:
+        await socket.send_text(message)
+    return time.perf_counter() - start
+
+
+async def concurrent(sockets, message: str, timeout: float) -> float:
+    manager = ConnectionManager(queue_size=256, send_timeout=timeout)
+    for i, socket in enumerate(sockets):
+        await manager.connect(f"user-{i}", socket)
+    start = time.perf_counter()
+    await manager.broadcast_local(message, timeout=timeout)
+    elapsed = time.perf_counter() - start
+    for user_id in list(manager.active_connections):
+        manager.disconnect(user_id)
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--delay-ms", type=float, default=2.0, help="平均单次发送延迟")
+    parser.add_argument("--slow-ratio", type=float, default=0.01, help="慢连接比例")
+    parser.add_argument("--slow-ms", type=float, default=500.0, help="慢连接发送延迟")
+    parser.add_argument("--timeout", type=float, default=0.2, help="单连接写出超时(秒)")
+    args = parser.parse_args()
+    # 连接/断开与慢连接超时日志过多，只保留错误
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    print(f"{'connections':>12}{'sequential ms':>16}{'concurrent ms':>16}")
+    for count in args.connections:
+        sockets = make_sockets(count, args.delay_ms, args.slow_ratio, args.slow_ms)
+        seq = await sequential(sockets, "hello")
+        con = await concurrent(sockets, "hello", args.timeout)
+        print(f"{count:>12}{seq * 1000:>16.1f}{con * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
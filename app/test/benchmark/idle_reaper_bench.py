@@ -0,0 +1,76 @@
+"""连接反复建立后客户端失联（不发送关闭帧）时的内存占用：对比不回收（改造前）与空闲回收
+
+每一轮建立一批连接并向其发送队列写入若干帧，随后客户端全部失联。
+用法：
+    python app/test/benchmark/idle_reaper_bench.py --rounds 10 --connections 500 --frames 50
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+import argparse
+import asyncio
+import gc
+import tracemalloc
+
+from app.core.connection_manager import ConnectionManager
+from app.core.logger import logger
+
+
+class HalfOpenSocket:
+    """失联的客户端：写入一直阻塞，不会返回错误"""
+
+    async def send_text(self, text: str):
+        await asyncio.Event().wait()
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def run(reap: bool, rounds: int, connections: int, frames: int) -> None:
+    manager = ConnectionManager(
+        queue_size=256, send_timeout=3600, idle_timeout=60 if reap else 0
+    )
+    tracemalloc.start()
+    for round_no in range(1, rounds + 1):
+        for i in range(connections):
+            connection = await manager.connect(f"user-{round_no}-{i}", HalfOpenSocket())
+            if reap:
+                # 空闲回收只作用于启用心跳的客户端
+                await connection.on_heartbeat("pong")
+            for j in range(frames):
+                await connection.send_text(f"frame {j} " + "x" * 200)
+        if reap:
+            for devices in manager.active_connections.values():
+                for connection in devices.values():
+                    connection.last_seen -= 3600
+            await manager.reap()
+            await asyncio.sleep(0)
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        print(
+            f"{'reap' if reap else 'no reap':>8}{round_no:>7}"
+            f"{manager.connection_count:>13}{current / 1024 / 1024:>14.2f}"
+        )
+    tracemalloc.stop()
+    await manager.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--connections", type=int, default=500, help="每轮新建连接数")
+    parser.add_argument("--frames", type=int, default=50, help="每个连接积压的帧数")
+    args = parser.parse_args()
+    # 连接/回收日志过多，只保留错误
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    print(f"{'mode':>8}{'round':>7}{'registered':>13}{'traced MiB':>14}")
+    for reap in (False, True):
+        await run(reap, args.rounds, args.connections, args.frames)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""用户记忆检索延迟随用户数增长的基准：对比全集合检索与按分区键(user_id)过滤检索
+
+脚本会创建独立的临时集合并在结束时删除，不影响线上 user_memory 集合。
+用法（需可访问的 Milvus，ENV=dev 时连接 localhost）：
+    python app/test/benchmark/memory_partition_bench.py --users 100 1000 5000 --per-user 50
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+import argparse
+import time
+
+import numpy as np
+from pymilvus import utility
+
+from app.memory.milvus_memory_handler import MilvusMemoryHandler
+
+BENCH_COLLECTION = "user_memory_bench"
+
+
+def insert_users(handler, rng, start: int, end: int, per_user: int):
+    for uid in range(start, end):
+        vectors = rng.random((per_user, 1024), dtype=np.float32)
+        handler.insert_memory_bulk(
+            user_id=f"bench-user-{uid}",
+            embeddings=vectors.tolist(),
+            contents=[f"memory {uid}-{i}" for i in range(per_user)],
+            categories=["兴趣偏好"] * per_user,
+            source="bench",
+        )
+    handler.collection.flush()
+
+
+def measure(handler, rng, user_count: int, rounds: int, scoped: bool) -> dict:
+    search_params = {"metric_type": "COSINE", "params": {"ef": 64}}
+    samples = []
+    for i in range(rounds):
+        user_id = f"bench-user-{i % user_count}"
+        vector = rng.random(1024, dtype=np.float32).tolist()
+        start = time.perf_counter()
+        if scoped:
+            handler.search_memory(user_id=user_id, embedding=vector, top_k=5)
+        else:
+            # 旧实现：不带过滤条件，检索全部用户的记忆
+            handler.collection.search(
+                data=[vector],
+                anns_field="embedding",
+                param=search_params,
+                limit=5,
+                output_fields=["content", "category", "source", "timestamp"],
+            )
+        samples.append((time.perf_counter() - start) * 1000)
+    arr = np.array(samples)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--per-user", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    if utility.has_collection(BENCH_COLLECTION):
+        utility.drop_collection(BENCH_COLLECTION)
+    handler = MilvusMemoryHandler(collection_name=BENCH_COLLECTION)
+    rng = np.random.default_rng(7)
+
+    print(
+        f"{'users':>8}{'rows':>10}{'full p50':>12}{'full p99':>12}"
+        f"{'scoped p50':>12}{'scoped p99':>12}"
+    )
+    inserted = 0
+    try:
+        for user_count in sorted(args.users):
+            insert_users(handler, rng, inserted, user_count, args.per_user)
+            inserted = user_count
+            full = measure(handler, rng, user_count, args.rounds, scoped=False)
+            scoped = measure(handler, rng, user_count, args.rounds, scoped=True)
+            print(
+                f"{user_count:>8}{user_count * args.per_user:>10}"
+                f"{full['p50']:>12}{full['p99']:>12}"
+                f"{scoped['p50']:>12}{scoped['p99']:>12}"
+            )
+    finally:
+        utility.drop_collection(BENCH_COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""RAG 文档检索延迟基准：对比每次检索前查询 load_state（旧实现）与本地记录加载状态（新实现）
+
+用法（需可访问的 Milvus，ENV=dev 时连接 localhost）：
+    python app/test/benchmark/milvus_search_bench.py --rounds 500 --top-k 2
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+import argparse
+import time
+
+import numpy as np
+from pymilvus import utility
+
+from app.rag.milvus_handler import get_milvus_handler
+
+
+def percentile_report(name: str, samples_ms: list) -> dict:
+    arr = np.array(samples_ms)
+    return {
+        "name": name,
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+    }
+
+
+def bench_search(rounds: int, top_k: int, with_load_state: bool) -> list:
+    handler = get_milvus_handler()
+    rng = np.random.default_rng(42)
+    samples = []
+    for _ in range(rounds):
+        vector = rng.random(1024, dtype=np.float32).tolist()
+        start = time.perf_counter()
+        if with_load_state:
+            # 旧实现：每次检索前多一次 load_state RPC
+            if utility.load_state(handler.collection_name) != "Loaded":
+                handler.collection.load()
+        handler.search(vector, top_k)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=2)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    bench_search(args.warmup, args.top_k, with_load_state=False)
+    before = percentile_report(
+        "search + load_state", bench_search(args.rounds, args.top_k, True)
+    )
+    after = percentile_report(
+        "search (local state)", bench_search(args.rounds, args.top_k, False)
+    )
+
+    print(f"{'case':<24}{'p50(ms)':>10}{'p99(ms)':>10}{'mean(ms)':>10}")
+    for row in (before, after):
+        print(
+            f"{row['name']:<24}{row['p50_ms']:>10}{row['p99_ms']:>10}{row['mean_ms']:>10}"
+        )
+    print(
+        f"p50 change: {after['p50_ms'] - before['p50_ms']:+.3f} ms, "
+        f"p99 change: {after['p99_ms'] - before['p99_ms']:+.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""系统提示词布局对前缀缓存的影响：对比改造前（用户记忆在模板开头）与静态指令在前的布局
+
+每种布局模拟多个用户各发一条消息，统计输入 token、命中缓存的 token 与首字延迟(TTFT)。
+用法（需在 .env 中配置模型服务密钥，会产生少量调用费用）：
+    python app/test/benchmark/prompt_cache_bench.py --users 20 --rounds 2
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.llm.LLMModelConfig import LLMModelConfig
+from app.llm.openai_client import OpenAILLMClient
+from app.prompt.systemPrompt import SystemPrompt, build_prompt
+
+# 改造前的布局：用户记忆位于模板开头，静态指令无法形成稳定前缀
+LEGACY_PREFIX = """
+        # CONTEXT #
+        你是“通伴”，一位中文情绪陪伴助手，语气亲切自然，像朋友一样回应用户。
+        你了解用户的一些长期信息（如性格、习惯、偏好等），如下：
+        {user_memory}
+"""
+
+
+def legacy_prompt(user_memory: str) -> dict:
+    static = SystemPrompt.BASE_CALL.value.prefix.split("\n", 3)[3]
+    content = LEGACY_PREFIX.format(user_memory=user_memory) + static
+    return {"role": "system", "content": content}
+
+
+def user_memory(i: int) -> str:
+    return "\n".join(
+        [
+            f"【兴趣偏好】用户{i}喜欢在周末去{['爬山', '游泳', '看展', '露营'][i % 4]}",
+            f"【基本信息】用户{i}今年{20 + i % 30}岁，在{['杭州', '北京', '成都'][i % 3]}工作",
+        ]
+    )
+
+
+async def run_layout(client, layout: str, users: int, rounds: int) -> dict:
+    ttft, prompt_tokens, cached_tokens = [], 0, 0
+    for _ in range(rounds):
+        for i in range(users):
+            memory = user_memory(i)
+            system = (
+                legacy_prompt(memory)
+                if layout == "legacy"
+                else build_prompt(SystemPrompt.BASE_CALL, user_memory=memory)
+            )
+            start = time.perf_counter()
+            first = None
+            stream = await client.client.chat.completions.create(
+                model=client.model,
+                messages=[system, {"role": "user", "content": "最近压力有点大"}],
+                stream=True,
+                max_tokens=16,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                if first is None and chunk.choices and chunk.choices[0].delta.content:
+                    first = time.perf_counter() - start
+                if chunk.usage is not None:
+                    prompt_tokens += chunk.usage.prompt_tokens or 0
+                    details = chunk.usage.prompt_tokens_details
+                    cached_tokens += (details.cached_tokens or 0) if details else 0
+            ttft.append((first or time.perf_counter() - start) * 1000)
+    arr = np.array(ttft)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "ttft_p50": round(float(np.percentile(arr, 50)), 1),
+        "ttft_p90": round(float(np.percentile(arr, 90)), 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument(
+        "--model",
+        default="DOUBAO_1_5_LITE",
+        choices=[m.name for m in LLMModelConfig],
+    )
+    args = parser.parse_args()
+
+    client = OpenAILLMClient(LLMModelConfig[args.model])
+    print(
+        f"{'layout':>10}{'prompt tok':>12}{'cached tok':>12}{'cached %':>10}"
+        f"{'ttft p50':>10}{'ttft p90':>10}"
+    )
+    for layout in ("legacy", "prefix"):
+        result = await run_layout(client, layout, args.users, args.rounds)
+        ratio = (
+            result["cached_tokens"] / result["prompt_tokens"]
+            if result["prompt_tokens"]
+            else 0
+        )
+        print(
+            f"{layout:>10}{result['prompt_tokens']:>12}{result['cached_tokens']:>12}"
+            f"{ratio:>10.1%}{result['ttft_p50']:>10}{result['ttft_p90']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
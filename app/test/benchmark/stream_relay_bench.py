@@ -0,0 +1,131 @@
+"""流式回复转发开销：对比逐 token 发送（每个增量一次 pydantic 序列化 + 一次发送）与合并成帧发送
+
+模拟上游按固定间隔产生 token，发送端只计数不做网络 IO，统计每条回复的帧数、帧/秒与 CPU 时间。
+用法：
+    python app/test/benchmark/stream_relay_bench.py --responses 200 --tokens 400 --interval 0.001
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+import argparse
+import asyncio
+import time
+
+from app.core.stream_relay import StreamRelay, StreamRelayStats, websocket_sender
+from app.models.ws_message import StreamMessage
+
+TOKENS = [
+    "听起来",
+    "你最近",
+    "压力",
+    "确实",
+    "不小，",
+    "可以",
+    "试着",
+    "先把",
+    "事情",
+    "列出来。",
+]
+
+
+async def token_stream(count: int, interval: float):
+    for i in range(count):
+        if interval:
+            await asyncio.sleep(interval)
+        yield TOKENS[i % len(TOKENS)]
+
+
+async def per_token(uuid: str, count: int, interval: float, send) -> str:
+    """改造前的发送方式"""
+    full_response = ""
+    first_chunk = True
+    async for piece in token_stream(count, interval):
+        full_response += piece
+        message = StreamMessage(uuid=uuid, content=piece, status="streaming")
+        if first_chunk:
+            start_msg = StreamMessage(uuid=uuid, content="", status="start")
+            await send(start_msg.model_dump_json())
+            first_chunk = False
+        await send(message.model_dump_json())
+    await send(StreamMessage(uuid=uuid, content="", status="done").model_dump_json())
+    return full_response
+
+
+async def relayed(
+    uuid: str,
+    count: int,
+    interval: float,
+    socket,
+    flush_interval: float,
+    max_bytes: int,
+) -> str:
+    relay = StreamRelay(
+        websocket_sender(socket),
+        uuid,
+        flush_interval=flush_interval,
+        max_bytes=max_bytes,
+        stats=StreamRelayStats(),
+    )
+    async for piece in token_stream(count, interval):
+        await relay.push(piece)
+    return await relay.finish()
+
+
+async def run(mode: str, args) -> dict:
+    frames = 0
+
+    class CountingSocket:
+        async def send_text(self, frame: str):
+            nonlocal frames
+            frames += 1
+
+    socket = CountingSocket()
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for i in range(args.responses):
+        uuid = f"bench-{i}"
+        if mode == "per-token":
+            await per_token(uuid, args.tokens, args.interval, socket.send_text)
+        else:
+            await relayed(
+                uuid,
+                args.tokens,
+                args.interval,
+                socket,
+                args.flush_interval,
+                args.bytes,
+            )
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return {
+        "frames_per_response": frames / args.responses,
+        "frames_per_sec": frames / wall,
+        "cpu_ms_per_response": cpu / args.responses * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--responses", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=400, help="每条回复的 token 数")
+    parser.add_argument(
+        "--interval", type=float, default=0.0, help="上游 token 间隔(秒)，0 为不等待"
+    )
+    parser.add_argument("--flush-interval", type=float, default=0.02)
+    parser.add_argument("--bytes", type=int, default=256)
+    args = parser.parse_args()
+
+    print(f"{'mode':>10}{'frames/resp':>14}{'frames/s':>12}{'cpu ms/resp':>14}")
+    for mode in ("per-token", "relay"):
+        result = await run(mode, args)
+        print(
+            f"{mode:>10}{result['frames_per_response']:>14.1f}"
+            f"{result['frames_per_sec']:>12.0f}{result['cpu_ms_per_response']:>14.3f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
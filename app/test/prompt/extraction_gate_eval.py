@@ -0,0 +1,80 @@
+"""记忆提取过滤规则离线评估
+
+用 prompt_eval_100.jsonl 中的对话逐条调用记忆提取 LLM 作为标注，
+统计过滤规则的跳过率以及被跳过但 LLM 实际提取出记忆点的条数（漏提取）。
+
+用法：
+    python app/test/prompt/extraction_gate_eval.py
+    python app/test/prompt/extraction_gate_eval.py --min-chars 8 --output gate_eval.json
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+import argparse
+import asyncio
+import json
+from app.core.config import settings
+from app.llm.openai_client import get_llm_text_client
+from app.memory.extraction_gate import evaluate_gate
+from app.memory.memory_extractor import MemoryExtractor
+
+
+async def label_dialogues(records, concurrency: int):
+    """调用 LLM 标注每条对话是否包含可提取的记忆点"""
+    llm = get_llm_text_client()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def label(record):
+        system, prompt = MemoryExtractor.build_extraction_prompt(
+            [(record["input"], record["output"])]
+        )
+        async with semaphore:
+            response = await llm.chat(system=system, prompt=prompt, history=[])
+        contents, _ = MemoryExtractor.parse_memory_response(
+            response.choices[0].message.content.strip()
+        )
+        return bool(contents)
+
+    return await asyncio.gather(*(label(r) for r in records))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="记忆提取过滤规则离线评估")
+    parser.add_argument(
+        "--data",
+        default=str(Path(__file__).with_name("prompt_eval_100.jsonl")),
+        help="评估数据（每行包含 input/output 的 jsonl）",
+    )
+    parser.add_argument("--min-chars", type=int, default=settings.MEMORY_GATE_MIN_CHARS)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", help="评估结果输出路径（json）")
+    args = parser.parse_args()
+
+    with open(args.data, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    extracted = await label_dialogues(records, args.concurrency)
+    report = evaluate_gate(
+        [r["input"] for r in records], list(extracted), min_chars=args.min_chars
+    )
+
+    print(
+        f"对话数: {report['total']}  跳过: {report['skipped']} "
+        f"(跳过率 {report['skip_rate']:.1%})"
+    )
+    print(
+        f"LLM 有提取结果: {report['extracted']}  漏提取: {report['missed']} "
+        f"(漏提取率 {report['miss_rate']:.1%})"
+    )
+    for message in report["missed_messages"]:
+        print(f"  漏提取: {message}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
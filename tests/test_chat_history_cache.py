@@ -0,0 +1,72 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import pytest
+from app.services.chat_history_cache import ChatHistoryCache
+from app.services.chat_record_service import build_history_message
+
+
+class FakeLoader:
+    def __init__(self, records=None):
+        self.records = records or []
+        self.calls = []
+
+    async def __call__(self, user_id, limit):
+        self.calls.append((user_id, limit))
+        await asyncio.sleep(0.01)
+        return list(self.records)
+
+
+def _texts(history):
+    return [m["content"][0]["text"] for m in history]
+
+
+@pytest.mark.asyncio
+async def test_history_is_loaded_once_per_user():
+    loader = FakeLoader([build_history_message("user", "旧消息")])
+    cache = ChatHistoryCache(max_turns=2, loader=loader)
+
+    # 并发加载共用一次查询，之后直接命中内存
+    first, second = await asyncio.gather(cache.get("u1"), cache.get("u1"))
+    await cache.get("u1")
+    assert loader.calls == [("u1", 2)]
+    assert _texts(first) == _texts(second) == ["旧消息"]
+    assert cache.stats() == {"users": 1, "hits": 1, "loads": 1}
+
+
+@pytest.mark.asyncio
+async def test_window_is_trimmed_and_aged_out_messages_are_reported():
+    evicted = []
+    cache = ChatHistoryCache(
+        max_turns=1,
+        loader=FakeLoader(),
+        on_evict=lambda user_id, message: evicted.append((user_id, message)),
+    )
+    await cache.load("u1")
+    for role, text in [("user", "1"), ("assistant", "2"), ("user", "3")]:
+        cache.append("u1", role, text)
+
+    assert _texts(await cache.get("u1")) == ["2", "3"]
+    assert [(u, m["content"][0]["text"]) for u, m in evicted] == [("u1", "1")]
+
+    # 从其他 worker 同步来的消息不重复上报淘汰
+    cache.append("u1", "assistant", "4", notify_evict=False)
+    assert _texts(await cache.get("u1")) == ["3", "4"]
+    assert len(evicted) == 1
+
+
+@pytest.mark.asyncio
+async def test_evicted_user_is_reloaded_and_unloaded_user_is_not_appended():
+    loader = FakeLoader()
+    cache = ChatHistoryCache(max_turns=2, loader=loader)
+    cache.append("u1", "user", "尚未加载")
+    await cache.load("u1")
+    assert await cache.get("u1") == []
+
+    cache.evict("u1")
+    assert cache.stats()["users"] == 0
+    await cache.load("u1")
+    assert len(loader.calls) == 2
@@ -0,0 +1,76 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.services.chat_record_service import (
+    save_chat_record,
+    save_chat_records_bulk,
+)
+
+TIME_FIELDS = ("response_start_time", "response_end_time")
+
+
+def asyncpg_timestamp_encode(value):
+    """与 asyncpg 编码 timestamp without time zone 的方式一致：带时区的值抛出 TypeError"""
+    if value is not None:
+        value - datetime(2000, 1, 1)
+
+
+class FakeAsyncSession:
+    def __init__(self):
+        self.rows = []
+
+    async def execute(self, statement, params):
+        for row in params:
+            for field in TIME_FIELDS:
+                asyncpg_timestamp_encode(row.get(field))
+        self.rows.extend(params)
+
+    def add(self, record):
+        for field in TIME_FIELDS:
+            asyncpg_timestamp_encode(getattr(record, field))
+        self.rows.append(record)
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, record):
+        pass
+
+
+def _record(start):
+    return dict(
+        user_id="user",
+        uuid="m1",
+        role="assistant",
+        model="qwen",
+        text="你好",
+        image=None,
+        video=None,
+        response_start_time=start,
+        response_end_time=start + timedelta(seconds=1),
+    )
+
+
+@pytest.mark.asyncio
+async def test_bulk_save_stores_aware_timestamps_as_naive_utc():
+    db = FakeAsyncSession()
+    start = datetime(2025, 1, 1, 8, 0, tzinfo=timezone(timedelta(hours=8)))
+
+    assert await save_chat_records_bulk(db, [_record(start)]) == 1
+    row = db.rows[0]
+    assert row["response_start_time"] == datetime(2025, 1, 1, 0, 0)
+    assert row["response_end_time"] == datetime(2025, 1, 1, 0, 0, 1)
+
+
+@pytest.mark.asyncio
+async def test_save_chat_record_stores_aware_timestamps_as_naive_utc():
+    db = FakeAsyncSession()
+    now = datetime.now(timezone.utc)
+
+    record = await save_chat_record(db, **_record(now))
+    assert record.response_start_time.tzinfo is None
+    assert record.response_start_time == now.replace(tzinfo=None)
@@ -0,0 +1,99 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import pytest
+from app.services.chat_record_writer import ChatRecordWriter
+
+
+class FakeSessionFactory:
+    """记录每次多行 INSERT 的行数；fail 为 True 时模拟数据库不可用"""
+
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params):
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.batches.append([row["text"] for row in params])
+
+    async def commit(self):
+        pass
+
+
+def _add(writer, text):
+    writer.add(user_id="user", uuid=text, role="user", model=None, text=text)
+
+
+@pytest.mark.asyncio
+async def test_records_are_batched_within_flush_interval():
+    db = FakeSessionFactory()
+    writer = ChatRecordWriter(session_factory=db, flush_interval=0.05, max_batch=100)
+    for i in range(5):
+        _add(writer, str(i))
+    await asyncio.sleep(0.15)
+
+    assert db.batches == [["0", "1", "2", "3", "4"]]
+    assert writer.stats()["commits"] == 1
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_before_interval():
+    db = FakeSessionFactory()
+    writer = ChatRecordWriter(session_factory=db, flush_interval=10, max_batch=3)
+    for i in range(3):
+        _add(writer, str(i))
+    await asyncio.sleep(0.05)
+
+    assert db.batches == [["0", "1", "2"]]
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_requeued_and_retried_in_order():
+    db = FakeSessionFactory()
+    writer = ChatRecordWriter(session_factory=db, flush_interval=10, max_batch=10)
+    _add(writer, "a")
+    _add(writer, "b")
+    db.fail = True
+    assert await writer.flush() == 0
+    assert writer.stats()["failures"] == 1
+    assert writer.stats()["pending"] == 2
+
+    db.fail = False
+    _add(writer, "c")
+    assert await writer.flush() == 3
+    assert db.batches == [["a", "b", "c"]]
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_pending_is_capped_while_database_is_down():
+    db = FakeSessionFactory()
+    db.fail = True
+    writer = ChatRecordWriter(
+        session_factory=db, flush_interval=10, max_batch=100, max_pending=3
+    )
+    for i in range(5):
+        _add(writer, str(i))
+    await writer.flush()
+
+    # 只保留最新的 max_pending 条，丢弃最早的记录
+    assert writer.stats()["pending"] == 3
+    assert writer.stats()["dropped"] == 2
+    db.fail = False
+    await writer.close()
+    assert db.batches == [["2", "3", "4"]]
@@ -0,0 +1,272 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import WebSocketDisconnect
+from app.agents.response_cache import SemanticResponseCache
+from app.core.connection_manager import ConnectionManager
+
+with patch(
+    "app.memory.memory_service.get_milvus_memory_handler", return_value=MagicMock()
+):
+    # 模块级单例会连接 Milvus，测试中替换为 mock
+    from app.routers import chat
+
+DISCONNECT = object()
+
+
+class FakeSocket:
+    """客户端：消息通过 inbox 发送给服务端，收到的帧记录在 frames 中"""
+
+    def __init__(self):
+        self.inbox = asyncio.Queue()
+        self.frames = []
+
+    async def receive_text(self):
+        message = await self.inbox.get()
+        if message is DISCONNECT:
+            raise WebSocketDisconnect(code=1000)
+        return json.dumps(message)
+
+    async def send_text(self, text):
+        self.frames.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+    def frames_for(self, uuid):
+        return [f for f in self.frames if f.get("uuid") == uuid]
+
+
+class FakeAgent:
+    """逐字输出 reply 的模型流，记录每轮流是否被关闭"""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.client = SimpleNamespace(model="fake-model")
+        self.started = {}
+        self.closed = {}
+
+    async def run(self, text, user_uuid, history, context):
+        self.started[text] = asyncio.Event()
+        try:
+            for piece in f"回复{text}" * 20:
+                await asyncio.sleep(self.delay)
+                self.started[text].set()
+                yield SimpleNamespace(
+                    model="fake-model",
+                    choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))],
+                )
+        finally:
+            self.closed[text] = True
+
+
+class FakeRetrievalContext:
+    def __init__(self, query, user_id):
+        self.shareable = False
+        self.tool_queries = []
+
+    def start_memory_search(self):
+        pass
+
+    def cancel(self):
+        pass
+
+
+class FakeHistoryCache:
+    async def get(self, user_id):
+        return []
+
+    def append(self, user_id, role, text, image=None):
+        pass
+
+
+@pytest.fixture
+def session():
+    agent = FakeAgent()
+    records = []
+    writer = SimpleNamespace(add=lambda **record: records.append(record))
+    manager = ConnectionManager()
+    with patch.object(chat, "agent", agent), patch.object(
+        chat, "manager", manager
+    ), patch.object(chat, "chat_record_writer", writer), patch.object(
+        chat, "chat_history_cache", FakeHistoryCache()
+    ), patch.object(
+        chat, "response_cache", SemanticResponseCache(enabled=False)
+    ), patch.object(
+        chat, "RetrievalContext", FakeRetrievalContext
+    ), patch.object(
+        chat, "after_reply", AsyncMock()
+    ):
+        yield SimpleNamespace(agent=agent, records=records, manager=manager)
+
+
+async def _open(session):
+    socket = FakeSocket()
+    connection = await session.manager.connect("user", socket)
+    task = asyncio.create_task(
+        chat.chat_session(connection, "user", AsyncMock(side_effect=AssertionError))
+    )
+    return socket, connection, task
+
+
+async def _streaming(agent, text):
+    """等待该轮回复开始输出"""
+    while text not in agent.started:
+        await asyncio.sleep(0.005)
+    await agent.started[text].wait()
+
+
+def _assistant_text(records, uuid):
+    return [
+        r["text"] for r in records if r["role"] == "assistant" and r["uuid"] == uuid
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stop_message_ends_reply_and_saves_partial_text(session):
+    socket, connection, task = await _open(session)
+    await socket.inbox.put({"uuid": "m1", "text": "a"})
+    await _streaming(session.agent, "a")
+
+    await socket.inbox.put({"type": "stop", "uuid": "m1"})
+    await asyncio.sleep(0.1)
+
+    assert session.agent.closed["a"]
+    [partial] = _assistant_text(session.records, "m1")
+    assert 0 < len(partial) < len("回复a" * 20)
+    await connection.wait_closed(timeout=0.1)
+    frames = socket.frames_for("m1")
+    assert frames[0]["status"] == "start" and frames[-1]["status"] == "done"
+    assert "".join(f["content"] for f in frames) == partial
+
+    await socket.inbox.put(DISCONNECT)
+    with pytest.raises(WebSocketDisconnect):
+        await task
+
+
+@pytest.mark.asyncio
+async def test_new_message_cancels_previous_reply(session):
+    socket, connection, task = await _open(session)
+    await socket.inbox.put({"uuid": "m1", "text": "a"})
+    await _streaming(session.agent, "a")
+    await socket.inbox.put({"uuid": "m2", "text": "b"})
+    for _ in range(500):
+        if _assistant_text(session.records, "m2"):
+            break
+        await asyncio.sleep(0.01)
+
+    # 上一轮的上游流被关闭并保存部分回复，新一轮完整生成
+    assert session.agent.closed["a"]
+    assert len(_assistant_text(session.records, "m1")[0]) < len("回复a" * 20)
+    assert _assistant_text(session.records, "m2") == ["回复b" * 20]
+    roles = [(r["uuid"], r["role"]) for r in session.records]
+    assert roles.index(("m1", "assistant")) < roles.index(("m2", "user"))
+
+    await socket.inbox.put(DISCONNECT)
+    with pytest.raises(WebSocketDisconnect):
+        await task
+
+
+@pytest.mark.asyncio
+async def test_disconnect_while_streaming_cancels_and_saves_partial(session):
+    socket, connection, task = await _open(session)
+    await socket.inbox.put({"uuid": "m1", "text": "a"})
+    await _streaming(session.agent, "a")
+
+    await socket.inbox.put(DISCONNECT)
+    with pytest.raises(WebSocketDisconnect):
+        await task
+
+    # 最后一个设备断开：回复被取消，上游流关闭，已生成的内容仍然保存
+    assert session.agent.closed["a"]
+    assert "user" not in chat.generations
+    [partial] = _assistant_text(session.records, "m1")
+    assert 0 < len(partial) < len("回复a" * 20)
+
+
+@pytest.mark.asyncio
+async def test_unexpected_error_still_releases_connection(session):
+    async def failing_session(connection, user_uuid, handle_exception):
+        # 连接已关闭，错误通知本身也会失败
+        connection.close()
+        raise RuntimeError("boom")
+
+    release = AsyncMock()
+    with patch.object(chat, "chat_session", failing_session), patch.object(
+        chat, "warm_user_state", AsyncMock()
+    ), patch.object(chat, "release_user_state", release):
+        await chat.websocket_endpoint_auth(
+            FakeSocket(), db=MagicMock(), current_user=SimpleNamespace(userid="user")
+        )
+
+    assert not session.manager.is_connected("user")
+    assert "user" not in session.manager.active_connections
+    release.assert_awaited_once_with("user")
+
+
+class ManualAgent(FakeAgent):
+    """回答产品说明类问题：标记本轮可缓存，并记录生成时是否带了个人信息"""
+
+    def __init__(self, personalized):
+        super().__init__(delay=0)
+        self.personalized = personalized
+        self.shared = []
+
+    async def run(self, text, user_uuid, history, context):
+        context.tool_queries.append(text)
+        context.shareable = True
+        context.personalized = self.personalized
+        async for chunk in super().run(text, user_uuid, history, context):
+            yield chunk
+
+    async def shared_answer(self, text, context):
+        self.shared.append(text)
+        return f"通用回答{text}", "fake-model"
+
+
+class EmbeddingRetrievalContext(FakeRetrievalContext):
+    async def embed(self, text=None):
+        return [1.0, 0.0]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("personalized", [True, False])
+async def test_shareable_reply_caches_a_copy_without_personal_context(
+    session, personalized
+):
+    from app.core.task_queue import BackgroundTaskQueue
+
+    agent = ManualAgent(personalized)
+    cache = SemanticResponseCache()
+    queue = BackgroundTaskQueue(name="test")
+    with patch.object(chat, "agent", agent), patch.object(
+        chat, "response_cache", cache
+    ), patch.object(chat, "RetrievalContext", EmbeddingRetrievalContext), patch.object(
+        chat, "get_background_queue", return_value=queue
+    ):
+        socket, connection, task = await _open(session)
+        await socket.inbox.put({"uuid": "m1", "text": "a"})
+        for _ in range(500):
+            if _assistant_text(session.records, "m1"):
+                break
+            await asyncio.sleep(0.01)
+        await queue.drain(timeout=5)
+
+        # 用户收到的回复照常生成；带了个人信息时缓存的是另行生成的通用副本
+        assert _assistant_text(session.records, "m1") == ["回复a" * 20]
+        cached = cache.lookup([1.0, 0.0])
+        if personalized:
+            assert agent.shared == ["a"] and cached.answer == "通用回答a"
+        else:
+            assert agent.shared == [] and cached.answer == "回复a" * 20
+
+        await socket.inbox.put(DISCONNECT)
+        with pytest.raises(WebSocketDisconnect):
+            await task
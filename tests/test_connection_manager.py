@@ -0,0 +1,196 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import json
+import pytest
+from fastapi import WebSocketDisconnect
+from app.core.connection_manager import (
+    ClientConnection,
+    ConnectionManager,
+    SlowConsumerError,
+)
+
+
+class SlowSocket:
+    """send_text 在 release 之前一直阻塞，模拟网络很慢的客户端"""
+
+    def __init__(self):
+        self.frames = []
+        self.release = asyncio.Event()
+        self.closed_with = None
+
+    async def send_text(self, text):
+        await self.release.wait()
+        self.frames.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def _fill(connection, count):
+    await connection.send_frame("u", "", "start")
+    for i in range(count):
+        await connection.send_frame("u", str(i), "streaming")
+    await connection.send_frame("u", "", "done")
+
+
+@pytest.mark.asyncio
+async def test_coalesce_merges_frames_when_queue_is_full():
+    socket = SlowSocket()
+    connection = ClientConnection("user", socket, maxsize=3, policy="coalesce")
+    await _fill(connection, 6)
+    socket.release.set()
+    connection.close()
+    await connection.wait_closed(timeout=1)
+
+    frames = [json.loads(f) for f in socket.frames]
+    assert frames[0]["status"] == "start" and frames[-1]["status"] == "done"
+    assert "".join(f["content"] for f in frames) == "012345"
+    assert connection.stats()["coalesced"] > 0
+
+
+@pytest.mark.asyncio
+async def test_drop_discards_intermediate_frames_but_keeps_done():
+    socket = SlowSocket()
+    connection = ClientConnection("user", socket, maxsize=3, policy="drop")
+    await _fill(connection, 6)
+    socket.release.set()
+    connection.close()
+    await connection.wait_closed(timeout=1)
+
+    statuses = [json.loads(f)["status"] for f in socket.frames]
+    assert statuses[-1] == "done"
+    assert connection.stats()["dropped"] == 4
+
+
+@pytest.mark.asyncio
+async def test_disconnect_policy_closes_slow_consumer():
+    socket = SlowSocket()
+    connection = ClientConnection("user", socket, maxsize=2, policy="disconnect")
+    with pytest.raises(SlowConsumerError):
+        await _fill(connection, 6)
+    assert not connection.connected
+
+    socket.release.set()
+    await connection.wait_closed(timeout=1)
+    await asyncio.sleep(0)
+    assert socket.closed_with == 1013
+
+
+class FastSocket:
+    def __init__(self, delay=0.0):
+        self.frames = []
+        self.delay = delay
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.frames.append(text)
+
+    async def close(self, code=1000):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_multiple_devices_share_one_stream_and_disconnect_separately():
+    manager = ConnectionManager()
+    phone, laptop = FastSocket(), FastSocket()
+    first = await manager.connect("user", phone)
+    await manager.connect("user", laptop)
+
+    send = manager.user_sender("user")
+    await send("m1", "", "start")
+    await send("m1", "你好", "done")
+    assert manager.disconnect("user", first) == 1
+    await first.wait_closed(timeout=1)
+    await asyncio.sleep(0.01)
+
+    for socket in (phone, laptop):
+        assert [json.loads(f)["content"] for f in socket.frames] == ["", "你好"]
+    assert manager.is_connected("user")
+    stats = manager.stats()
+    assert stats["active"] == 1
+    assert "user" not in json.dumps(stats["connections"])
+
+
+@pytest.mark.asyncio
+async def test_broadcast_is_concurrent_and_times_out_per_connection():
+    manager = ConnectionManager()
+    for i in range(20):
+        await manager.connect(f"user-{i}", FastSocket(delay=0.05))
+    stuck = await manager.connect("stuck", SlowSocket())
+
+    start = asyncio.get_running_loop().time()
+    delivered = await manager.broadcast_local("hello", timeout=0.2)
+    elapsed = asyncio.get_running_loop().time() - start
+
+    assert delivered == 20
+    # 并发写出：总耗时接近单个连接的超时，而不是所有连接耗时之和
+    assert elapsed < 0.5
+    assert stuck.stats()["sent"] == 0
+
+
+class SilentSocket(FastSocket):
+    """客户端不再发送任何消息（半开连接），receive_text 永远等待"""
+
+    def __init__(self, fail_send=False):
+        super().__init__()
+        self.fail_send = fail_send
+        self.closed_with = None
+
+    async def send_text(self, text):
+        if self.fail_send:
+            raise ConnectionResetError("peer gone")
+        await super().send_text(text)
+
+    async def receive_text(self):
+        await asyncio.Event().wait()
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+@pytest.mark.asyncio
+async def test_reaper_pings_idle_and_reclaims_stale_connections():
+    manager = ConnectionManager(heartbeat_interval=10, idle_timeout=30)
+    quiet, gone, busy = SilentSocket(), SilentSocket(), SilentSocket()
+    legacy, dead = SilentSocket(), SilentSocket(fail_send=True)
+    quiet_conn = await manager.connect("quiet", quiet)
+    gone_conn = await manager.connect("gone", gone)
+    busy_conn = await manager.connect("busy", busy)
+    legacy_conn = await manager.connect("legacy", legacy)
+    dead_conn = await manager.connect("dead", dead)
+    # 客户端发送 ping 启用心跳，服务端回复 pong
+    for connection in (quiet_conn, gone_conn, busy_conn):
+        await connection.on_heartbeat("ping")
+    receiving = asyncio.create_task(gone_conn.receive_text())
+
+    # 发送失败的连接仍在注册表中，直到被回收
+    await dead_conn.send_text("hello")
+    await asyncio.sleep(0.01)
+    for connection in (quiet_conn, gone_conn, legacy_conn):
+        connection.last_seen -= 11
+    assert await manager.reap() == 1
+    await asyncio.sleep(0.01)
+    assert [json.loads(f)["type"] for f in quiet.frames] == ["pong", "ping"]
+    assert manager.stats()["reclaimed"] == {"idle": 0, "dead": 1}
+
+    # 回复了 pong 的连接与正在输出回复的连接保持，长时间无消息的连接被关闭，其消息循环随之结束
+    quiet_conn.last_seen += 11
+    gone_conn.last_seen -= 20
+    legacy_conn.last_seen -= 100
+    busy_conn.last_seen -= 100
+    await busy_conn.send_frame("m1", "你好", "streaming")
+    assert await manager.reap() == 1
+    with pytest.raises(WebSocketDisconnect):
+        await receiving
+    await gone_conn.wait_closed(timeout=1)
+    await asyncio.sleep(0)
+    assert gone.closed_with == 1001
+    assert sorted(manager.active_connections) == ["busy", "legacy", "quiet"]
+    assert manager.stats()["reclaimed"] == {"idle": 1, "dead": 1}
+    # 不支持心跳的旧客户端不会收到 ping，也不会因空闲被断开
+    assert legacy.frames == []
+    await manager.close()
@@ -0,0 +1,97 @@
+import sys
+import os
+import threading
+import pytest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.llm.context_budget import (
+    ContextAssembler,
+    ContextBudgetStats,
+    IMAGE_PART_TOKENS,
+    TokenCounter,
+    preload_token_counter,
+)
+
+
+def _assembler(budget, **kwargs):
+    return ContextAssembler(
+        budget=budget,
+        counter=TokenCounter(use_tiktoken=False),
+        stats=ContextBudgetStats(),
+        **kwargs,
+    )
+
+
+def _message(role, text, images=()):
+    content = [{"type": "text", "text": text}] + [
+        {"type": "image_url", "image_url": {"url": url}} for url in images
+    ]
+    return {"role": role, "content": content}
+
+
+def test_fallback_counter_estimates_cjk_and_truncates():
+    counter = TokenCounter(use_tiktoken=False)
+    assert counter.count("你好世界") == 4
+    assert counter.count("hello world!") == 3
+    assert counter.count(counter.truncate("一二三四五六七八", 5)) == 5
+
+
+def test_encoding_is_loaded_on_first_use_only_once():
+    with patch("tiktoken.get_encoding", side_effect=OSError("offline")) as get:
+        counter = TokenCounter()
+        assert get.call_count == 0  # 创建时不加载编码（不访问网络）
+        assert counter.count("你好世界") == 4  # 加载失败时按字符估算
+        assert counter.count("hello world!") == 3
+        assert get.call_count == 1
+        assert not counter.exact
+
+
+@pytest.mark.asyncio
+async def test_slow_preload_does_not_block_counting():
+    release = threading.Event()
+
+    def slow_download(name):
+        release.wait(5)
+        raise OSError("offline")
+
+    with patch("tiktoken.get_encoding", side_effect=slow_download) as get:
+        counter = TokenCounter()
+        assert not await preload_token_counter(counter, timeout=0.05)
+        # 加载仍在后台进行，计数不等待，按字符估算
+        assert counter.count("你好世界") == 4
+        release.set()
+        assert get.call_count == 1
+
+
+def test_history_keeps_latest_turns_within_budget():
+    assembler = _assembler(budget=60, keep_images=1)
+    system = {"role": "system", "content": "系统提示"}
+    prompt = {"role": "user", "content": "现在呢"}
+    history = [
+        _message("user", "很早之前的问题" * 3, images=["a.png"]),
+        _message("assistant", "很早之前的回答" * 3),
+        _message("user", "上一个问题", images=["b.png"]),
+        _message("assistant", "上一个回答"),
+    ]
+
+    kept = assembler.fit_history(system, prompt, history)
+
+    # 只保留最近一轮，且较早消息中的图片被去掉
+    assert [m["content"][0]["text"] for m in kept] == ["上一个问题", "上一个回答"]
+    assert all(p["type"] == "text" for p in kept[0]["content"])
+    stats = assembler.stats.stats()
+    assert stats["trimmed_tokens"]["history"] > IMAGE_PART_TOKENS
+    assert stats["max_input_tokens"] <= 60
+
+
+def test_memories_and_tool_results_respect_section_shares():
+    assembler = _assembler(budget=100, memory_share=0.1, tool_share=0.2)
+
+    memory_text = assembler.fit_memories(["喜欢咖啡", "住在杭州", "养了一只猫"])
+    assert memory_text == "喜欢咖啡\n住在杭州"
+
+    tool_text = assembler.fit_tool_results(["文" * 50, "第二段"])
+    assert tool_text == "文" * 19
+    assert set(assembler.stats.stats()["trimmed_tokens"]) == {"memory", "tool_result"}
@@ -0,0 +1,68 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from app.core.task_queue import BackgroundTaskQueue
+from app.prompt.systemPrompt import SystemPrompt, build_prompt
+from app.services.chat_history_cache import ChatHistoryCache
+from app.services.conversation_summary_service import ConversationSummarizer
+
+
+def _response(text):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30),
+    )
+
+
+@pytest.mark.asyncio
+async def test_aged_out_turns_are_merged_into_summary():
+    llm = SimpleNamespace(chat=AsyncMock(return_value=_response("用户最近工作压力大")))
+    saved = {}
+
+    async def loader(user_id):
+        return None
+
+    async def saver(user_id, summary, turn_count):
+        saved[user_id] = (summary, turn_count)
+
+    summarizer = ConversationSummarizer(
+        llm=llm, batch_messages=2, loader=loader, saver=saver
+    )
+    summarizer.queue = BackgroundTaskQueue(name="test", concurrency=1)
+
+    async def history_loader(user_id, limit):
+        return []
+
+    cache = ChatHistoryCache(
+        max_turns=1, loader=history_loader, on_evict=summarizer.add_aged_out
+    )
+    await cache.load("u1")
+    await summarizer.load("u1")
+
+    cache.append("u1", "user", "最近加班好多")
+    cache.append("u1", "assistant", "辛苦了")
+    assert not await summarizer.maybe_refresh("u1")
+    cache.append("u1", "user", "今天也没休息")
+    cache.append("u1", "assistant", "要照顾好自己")
+    assert await summarizer.maybe_refresh("u1")
+    await summarizer.queue.drain(timeout=5)
+
+    prompt = llm.chat.await_args.kwargs["prompt"]["content"]
+    assert "用户：最近加班好多" in prompt and "助手：辛苦了" in prompt
+    assert saved["u1"] == ("用户最近工作压力大", 2)
+    assert summarizer.get("u1") == "用户最近工作压力大"
+    assert summarizer.stats()["prompt_tokens"] == 120
+
+
+def test_empty_dynamic_sections_are_omitted():
+    content = build_prompt(SystemPrompt.BASE_CALL, user_memory="【偏好】喜欢咖啡")[
+        "content"
+    ]
+    assert "# USER MEMORY #" in content
+    assert "# CONVERSATION SUMMARY #" not in content
+    assert content.startswith(SystemPrompt.BASE_CALL.value.prefix)
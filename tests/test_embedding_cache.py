@@ -0,0 +1,106 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from app.rag.embedding_cache import EmbeddingCache, SqliteEmbeddingStore
+from app.rag.embedder import AliyunEmbedder
+
+
+def _response(texts):
+    return SimpleNamespace(
+        data=[SimpleNamespace(embedding=[float(len(t)), 1.0]) for t in texts]
+    )
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_ttl():
+    cache = EmbeddingCache(max_size=2, ttl=60)
+    await cache.put_many({"a": [1.0], "b": [2.0]})
+    await cache.get_many(["a"])  # a 变为最近使用
+    await cache.put_many({"c": [3.0]})
+
+    found = await cache.get_many(["a", "b", "c"])
+    assert set(found) == {"a", "c"}
+
+    expired = EmbeddingCache(max_size=2, ttl=-1)
+    await expired.put_many({"a": [1.0]})
+    assert await expired.get_many(["a"]) == {}
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_stores_float32_and_returns_copies():
+    cache = EmbeddingCache()
+    await cache.put_many({"k": [0.5] * 1024})
+    assert cache.stats()["memory_bytes"] == 1024 * 4
+
+    found = await cache.get_many(["k"])
+    found["k"][0] = 99.0  # 调用方修改返回值不影响缓存
+    assert (await cache.get_many(["k"]))["k"][0] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_disk_store_survives_new_cache_instance(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    first = EmbeddingCache(disk_store=SqliteEmbeddingStore(path, ttl=60))
+    await first.put_many({"k": [0.5, 0.25]})
+
+    second = EmbeddingCache(disk_store=SqliteEmbeddingStore(path, ttl=60))
+    assert await second.get_many(["k"]) == {"k": [0.5, 0.25]}
+    assert second.stats()["disk_hits"] == 1
+    # 磁盘命中后回填内存
+    await second.get_many(["k"])
+    assert second.stats()["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+@patch("app.rag.embedder.AsyncOpenAI")
+async def test_embedder_only_requests_cache_misses(mock_openai_cls):
+    mock_openai = AsyncMock()
+    mock_openai.embeddings.create = AsyncMock(
+        side_effect=lambda **kwargs: _response(kwargs["input"])
+    )
+    mock_openai_cls.return_value = mock_openai
+
+    embedder = AliyunEmbedder(cache=EmbeddingCache())
+    first = await embedder.embed_texts(["你好", "你好", "谢谢你"])
+    assert first == [[2.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert mock_openai.embeddings.create.call_args.kwargs["input"] == ["你好", "谢谢你"]
+
+    second = await embedder.embed_texts(["谢谢你", "你好"])
+    assert second == [[3.0, 1.0], [2.0, 1.0]]
+    assert mock_openai.embeddings.create.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("app.rag.embedder.AsyncOpenAI")
+async def test_embedder_concurrent_batches_keep_order_and_retry(mock_openai_cls):
+    import httpx
+    from openai import RateLimitError
+
+    calls = {"n": 0}
+
+    async def create(**kwargs):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            request = httpx.Request("POST", "http://test/embeddings")
+            raise RateLimitError(
+                "429", response=httpx.Response(429, request=request), body=None
+            )
+        return _response(kwargs["input"])
+
+    mock_openai = AsyncMock()
+    mock_openai.embeddings.create = AsyncMock(side_effect=create)
+    mock_openai_cls.return_value = mock_openai
+
+    embedder = AliyunEmbedder(cache=EmbeddingCache())
+    embedder.retry_base_delay = 0.01
+    texts = ["x" * (i + 1) for i in range(25)]
+    result = await embedder.embed_texts(texts)
+
+    assert result == [[float(i + 1), 1.0] for i in range(25)]
+    # 3 个批次 + 1 次 429 重试
+    assert mock_openai.embeddings.create.call_count == 4
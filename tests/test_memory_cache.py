@@ -0,0 +1,63 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.memory.memory_cache import UserMemoryCache, UserMemoryEntry
+
+
+def _row(embedding, content, category="偏好", timestamp=100):
+    return {
+        "embedding": embedding,
+        "content": content,
+        "category": category,
+        "source": "chat",
+        "timestamp": timestamp,
+    }
+
+
+def test_local_search_ranks_and_filters():
+    entry = UserMemoryEntry(
+        [
+            _row([1.0, 0.0], "喜欢咖啡", timestamp=100),
+            _row([0.8, 0.6], "住在杭州", category="事实", timestamp=200),
+            _row([0.0, 1.0], "养了一只猫", timestamp=300),
+        ],
+        dim=2,
+    )
+
+    results = entry.search([1.0, 0.1], top_k=2)
+    assert [r["entity"]["content"] for r in results] == ["喜欢咖啡", "住在杭州"]
+    assert results[0]["distance"] > results[1]["distance"]
+
+    results = entry.search([1.0, 0.1], top_k=5, categories=["偏好"], start_time=150)
+    assert [r["entity"]["content"] for r in results] == ["养了一只猫"]
+
+    entry.append([_row([1.0, 0.05], "喜欢拿铁", timestamp=400)])
+    assert entry.search([1.0, 0.05], top_k=1)[0]["entity"]["content"] == "喜欢拿铁"
+
+
+def test_cache_lru_eviction_by_bytes():
+    one = UserMemoryEntry([_row([1.0, 0.0], "a")], dim=2)
+    cache = UserMemoryCache(max_bytes=one.nbytes * 2)
+
+    cache.put("u1", one)
+    cache.put("u2", UserMemoryEntry([_row([1.0, 0.0], "b")], dim=2))
+    assert cache.get("u1") is one
+    cache.put("u3", UserMemoryEntry([_row([1.0, 0.0], "c")], dim=2))
+
+    assert "u2" not in cache
+    assert "u1" in cache and "u3" in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_append_beyond_row_limit_evicts_user():
+    cache = UserMemoryCache(max_rows_per_user=2)
+    cache.put("u1", UserMemoryEntry([_row([1.0, 0.0], "a")], dim=2))
+
+    cache.append("u1", [_row([0.0, 1.0], "b")])
+    assert cache.peek("u1").size == 2
+    cache.append("u1", [_row([1.0, 1.0], "c")])
+
+    assert "u1" not in cache
+    assert cache.stats()["bytes"] == 0
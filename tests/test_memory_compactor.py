@@ -0,0 +1,30 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from app.memory.memory_compactor import find_duplicate_indices
+
+
+def test_keeps_newest_of_each_cluster():
+    vectors = np.array(
+        [
+            [1.0, 0.0, 0.0],  # 0: 喜欢咖啡（最旧）
+            [0.0, 1.0, 0.0],  # 1: 住在杭州
+            [0.99, 0.01, 0.0],  # 2: 喜欢咖啡（最新）
+            [0.98, 0.02, 0.0],  # 3: 喜欢咖啡
+            [0.0, 0.0, 1.0],  # 4: 养猫
+        ]
+    )
+    timestamps = np.array([100, 200, 500, 300, 400])
+
+    duplicates = find_duplicate_indices(vectors, timestamps, threshold=0.95)
+
+    assert sorted(duplicates) == [0, 3]
+
+
+def test_no_duplicates_below_threshold():
+    vectors = np.eye(4)
+    assert find_duplicate_indices(vectors, np.arange(4), threshold=0.9) == []
+    assert find_duplicate_indices(vectors[:1], np.arange(1)) == []
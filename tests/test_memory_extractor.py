@@ -0,0 +1,121 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from app.core.task_queue import BackgroundTaskQueue
+from app.memory.extraction_gate import ExtractionGate
+from app.memory.memory_cache import UserMemoryCache, UserMemoryEntry
+from app.rag.embedding_cache import EmbeddingCache
+
+
+def _make_gate(**kwargs):
+    return ExtractionGate(
+        embedding_cache=EmbeddingCache(), memory_cache=UserMemoryCache(), **kwargs
+    )
+
+
+def _make_extractor(batch_turns=3, idle_seconds=60, gate=None):
+    from app.memory.memory_extractor import MemoryExtractor
+
+    llm = SimpleNamespace(
+        chat=AsyncMock(
+            return_value=SimpleNamespace(
+                choices=[
+                    SimpleNamespace(
+                        message=SimpleNamespace(
+                            content='[{"兴趣偏好": "喜欢咖啡"}, {"基本信息": "住在杭州"}]'
+                        )
+                    )
+                ]
+            )
+        )
+    )
+    service = SimpleNamespace(add_user_memories=AsyncMock(return_value=True))
+    queue = BackgroundTaskQueue(name="test", concurrency=1)
+    with patch(
+        "app.memory.memory_extractor.get_llm_text_client", return_value=llm
+    ), patch(
+        "app.memory.memory_extractor.get_memory_service", return_value=service
+    ), patch(
+        "app.memory.memory_extractor.get_background_queue", return_value=queue
+    ):
+        extractor = MemoryExtractor(
+            batch_turns=batch_turns,
+            idle_seconds=idle_seconds,
+            gate=gate or _make_gate(),
+        )
+    return extractor, llm, service, queue
+
+
+@pytest.mark.asyncio
+async def test_turns_are_batched_into_one_llm_call():
+    extractor, llm, service, queue = _make_extractor(batch_turns=3)
+
+    for i in range(3):
+        await extractor.add_turn(f"我最近在学做菜{i}", f"回复{i}", user_id="u1")
+    await queue.drain(timeout=5)
+
+    assert llm.chat.await_count == 1
+    prompt = llm.chat.await_args.kwargs["prompt"]["content"]
+    assert "我最近在学做菜0" in prompt and "回复2" in prompt
+    service.add_user_memories.assert_awaited_once_with(
+        user_id="u1",
+        contents=["喜欢咖啡", "住在杭州"],
+        categories=["兴趣偏好", "基本信息"],
+    )
+    assert extractor.stats()["avg_turns_per_batch"] == 3
+
+
+@pytest.mark.asyncio
+async def test_idle_timeout_and_disconnect_flush():
+    extractor, llm, service, queue = _make_extractor(batch_turns=10, idle_seconds=0.05)
+
+    await extractor.add_turn("我每天早上跑步", "回复", user_id="u1")
+    await extractor.add_turn("我喜欢喝咖啡", "回复", user_id="u2")
+    assert await extractor.flush_user("u2")
+    await asyncio.sleep(0.1)
+    await queue.drain(timeout=5)
+
+    assert llm.chat.await_count == 2
+    assert extractor.stats()["pending_turns"] == 0
+
+
+@pytest.mark.asyncio
+async def test_gate_skips_filler_and_known_memories():
+    gate = _make_gate()
+    key = gate.embedding_cache.make_key(
+        "text-embedding-v3", 1024, "我喜欢喝咖啡，每天都要喝"
+    )
+    await gate.embedding_cache.put_many({key: [1.0] + [0.0] * 1023})
+    gate.memory_cache.put(
+        "u1",
+        UserMemoryEntry(
+            [
+                {
+                    "embedding": [1.0] + [0.0] * 1023,
+                    "content": "喜欢喝咖啡",
+                    "category": "兴趣偏好",
+                    "timestamp": 1,
+                }
+            ],
+            dim=1024,
+        ),
+    )
+
+    assert not await gate.should_extract("嗯嗯，谢谢！", "u1")
+    assert not await gate.should_extract("今天下雨了", "u1")
+    assert await gate.should_extract("我28岁", "u1")
+    assert not await gate.should_extract("我喜欢喝咖啡，每天都要喝", "u1")
+    assert await gate.should_extract("我喜欢喝咖啡，每天都要喝", "u2")
+
+    stats = gate.stats()
+    assert stats["skipped"] == {"filler": 1, "too_short": 1, "duplicate": 1}
+    assert stats["skip_rate"] == 0.6
+    # 相似度检查不计入向量缓存的命中率
+    cache_stats = gate.embedding_cache.stats()
+    assert cache_stats["memory_hits"] == cache_stats["misses"] == 0
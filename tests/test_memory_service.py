@@ -0,0 +1,114 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import time
+import pytest
+from unittest.mock import patch
+from app.core.task_queue import BackgroundTaskQueue
+from app.memory.memory_cache import UserMemoryCache
+
+
+class FakeMemoryHandler:
+    """aquery_user_memories 在 release 之前阻塞，模拟较慢的缓存加载"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.querying = asyncio.Event()
+        self.searches = 0
+
+    async def aquery_user_memories(self, user_id, limit):
+        self.querying.set()
+        await self.release.wait()
+        return [
+            {
+                "embedding": [1.0] + [0.0] * 1023,
+                "content": "旧记忆",
+                "category": "偏好",
+                "source": "chat",
+                "timestamp": 1,
+            }
+        ]
+
+    async def adelete_user_memory(self, user_id):
+        return True
+
+    async def asearch_memory(self, **kwargs):
+        self.searches += 1
+        return []
+
+
+def _make_service(queue):
+    from app.memory.memory_service import MemoryService
+
+    handler = FakeMemoryHandler()
+    with patch(
+        "app.memory.memory_service.get_milvus_memory_handler", return_value=handler
+    ), patch("app.memory.memory_service.get_aliyun_embedder"), patch(
+        "app.memory.memory_service.get_user_memory_cache",
+        return_value=UserMemoryCache(),
+    ), patch(
+        "app.memory.memory_service.get_background_queue", return_value=queue
+    ):
+        service = MemoryService()
+    return service, handler
+
+
+@pytest.mark.asyncio
+async def test_load_in_flight_during_clear_is_discarded():
+    service, handler = _make_service(BackgroundTaskQueue(name="test"))
+    loading = asyncio.create_task(service.warm_user_cache("u1"))
+    await handler.querying.wait()
+
+    await service.clear_user_memory("u1")
+    handler.release.set()
+    await loading
+
+    assert "u1" not in service.cache
+    # 之后的加载不受影响
+    await service.warm_user_cache("u1")
+    assert "u1" in service.cache
+
+
+@pytest.mark.asyncio
+async def test_search_submits_warm_job_once_without_blocking():
+    queue = BackgroundTaskQueue(name="test", concurrency=1, maxsize=1, put_timeout=5)
+    service, handler = _make_service(queue)
+    with patch("app.memory.memory_service.get_background_queue", return_value=queue):
+        # 任务开始执行前的多次检索只提交一次
+        await service._search("u1", [1.0, 0.0], top_k=1)
+        await service._search("u1", [1.0, 0.0], top_k=1)
+        assert queue.stats()["submitted"] == 1
+
+        # 队列已满时立即返回，不等待 put_timeout
+        start = time.perf_counter()
+        await service._search("u2", [1.0, 0.0], top_k=1)
+        await service._search("u3", [1.0, 0.0], top_k=1)
+        assert time.perf_counter() - start < 1
+        assert queue.stats()["dropped"] >= 1
+        assert handler.searches == 4
+
+    handler.release.set()
+    await queue.drain(timeout=5)
+
+
+@pytest.mark.asyncio
+async def test_memory_change_is_reported_and_remote_change_evicts_cache():
+    service, handler = _make_service(BackgroundTaskQueue(name="test"))
+    handler.release.set()
+    changed = []
+
+    async def on_change(user_id):
+        changed.append(user_id)
+
+    service.on_change = on_change
+    await service.warm_user_cache("u1")
+    await service.clear_user_memory("u1")
+    assert changed == ["u1"]
+
+    # 其他 worker 修改了记忆：淘汰本地缓存，下次检索重新加载
+    await service.warm_user_cache("u1")
+    service.invalidate_user_cache("u1")
+    assert "u1" not in service.cache
@@ -0,0 +1,67 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import threading
+import time
+import pytest
+from app.rag.milvus_executor import MilvusExecutor
+
+
+class BlockingStub:
+    """模拟同步 pymilvus 调用：阻塞线程直到 release，并记录最大并发数"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.timeouts = []
+
+    def __call__(self, value, timeout=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        self.timeouts.append(timeout)
+        self.release.wait(5)
+        with self.lock:
+            self.active -= 1
+        return value
+
+
+@pytest.mark.asyncio
+async def test_call_times_out_and_passes_timeout_to_pymilvus():
+    executor = MilvusExecutor(max_workers=2, max_concurrency=2, timeout=0.05)
+    stub = BlockingStub()
+    start = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        await executor.run(stub, "x")
+    assert time.perf_counter() - start < 1
+    assert stub.timeouts == [0.05]
+    assert executor.stats()["timeouts"] == 1
+
+    stub.release.set()
+    # 单次调用可指定更长的超时（例如文档批量写入）
+    assert await executor.run(stub, "y", timeout=5) == "y"
+    assert stub.timeouts[-1] == 5
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited_and_excess_calls_wait():
+    executor = MilvusExecutor(max_workers=8, max_concurrency=2, timeout=5)
+    stub = BlockingStub()
+    calls = [asyncio.create_task(executor.run(stub, i)) for i in range(5)]
+    await asyncio.sleep(0.1)
+
+    stats = executor.stats()
+    assert stats["in_flight"] == 2
+    assert stats["waiting"] == 3
+
+    stub.release.set()
+    assert await asyncio.gather(*calls) == [0, 1, 2, 3, 4]
+    assert stub.max_active == 2
+    assert executor.stats()["calls"] == 5
+    executor.shutdown()
@@ -51,3 +51,124 @@ async def test_stream_chat(mock_openai_cls):
 
     assert chunks == [{"mock_chunk": 1}, {"mock_chunk": 2}]
     mock_openai.chat.completions.create.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch("app.llm.openai_client.AsyncOpenAI")
+async def test_stream_chat_closes_upstream_when_consumer_stops(mock_openai_cls):
+    from contextlib import aclosing
+    from openai.types.chat import ChatCompletionChunk
+    from openai.types.chat.chat_completion_chunk import Choice, ChoiceDelta
+
+    class FakeStream:
+        closed = False
+        sent = 0
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            self.closed = True
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            self.sent += 1
+            return ChatCompletionChunk(
+                id="c",
+                object="chat.completion.chunk",
+                created=0,
+                model="m",
+                choices=[Choice(index=0, delta=ChoiceDelta(content="字"))],
+            )
+
+    upstream = FakeStream()
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create = AsyncMock(return_value=upstream)
+    mock_openai_cls.return_value = mock_openai
+
+    client = OpenAILLMClient(model_config=LLMModelConfig.QWEN_TURBO)
+    stream = client.stream_chat({"role": "system", "content": ""}, {}, [])
+    async with aclosing(stream):
+        async for _ in stream:
+            break
+
+    assert upstream.closed
+    assert upstream.sent == 1
+
+
+@pytest.mark.asyncio
+@patch("app.llm.openai_client.AsyncOpenAI")
+async def test_tool_call_stream_records_usage_after_finish(mock_openai_cls):
+    from openai.types.chat import ChatCompletionChunk
+    from openai.types.chat.chat_completion_chunk import (
+        Choice,
+        ChoiceDelta,
+        ChoiceDeltaToolCall,
+        ChoiceDeltaToolCallFunction,
+    )
+    from openai.types.completion_usage import CompletionUsage, PromptTokensDetails
+    from app.llm.openai_client import get_llm_usage_stats
+
+    def chunk(choices, usage=None):
+        return ChatCompletionChunk(
+            id="c",
+            object="chat.completion.chunk",
+            created=0,
+            model="m",
+            choices=choices,
+            usage=usage,
+        )
+
+    call = ChoiceDeltaToolCall(
+        index=0,
+        function=ChoiceDeltaToolCallFunction(name="query_manual", arguments="{}"),
+    )
+
+    async def upstream():
+        yield chunk([Choice(index=0, delta=ChoiceDelta(tool_calls=[call]))])
+        yield chunk([Choice(index=0, delta=ChoiceDelta(), finish_reason="tool_calls")])
+        # include_usage 时用量在 finish_reason 之后单独发送
+        yield chunk(
+            [],
+            CompletionUsage(
+                prompt_tokens=100,
+                completion_tokens=5,
+                total_tokens=105,
+                prompt_tokens_details=PromptTokensDetails(cached_tokens=64),
+            ),
+        )
+
+    class FakeStream:
+        def __init__(self):
+            self.chunks = upstream()
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            pass
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            return await self.chunks.__anext__()
+
+    mock_openai = AsyncMock()
+    mock_openai.chat.completions.create = AsyncMock(return_value=FakeStream())
+    mock_openai_cls.return_value = mock_openai
+
+    client = OpenAILLMClient(model_config=LLMModelConfig.QWEN_TURBO)
+    client.model = "tool-usage-test"
+    chunks = [
+        c
+        async for c in client.stream_chat_with_tools(
+            {"role": "system", "content": ""}, {"role": "user", "content": "?"}, [], []
+        )
+    ]
+
+    assert chunks[-1].choices[0].finish_reason == "tool_calls"
+    usage = get_llm_usage_stats().stats()["tool-usage-test"]
+    assert usage["prompt_tokens"] == 100 and usage["cached_tokens"] == 64
@@ -0,0 +1,157 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import json
+import pytest
+from app.core.connection_manager import ConnectionManager
+from app.core.pubsub import InMemoryPubSub, PubSubBackend, RedisPubSub
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, text):
+        self.frames.append(text)
+
+    async def close(self, code=1000):
+        pass
+
+
+async def _wait_for(predicate, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("等待消息超时")
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_in_memory_backend_routes_to_subscribed_users_only():
+    manager = ConnectionManager(backend=InMemoryPubSub())
+    alice, bob = RecordingSocket(), RecordingSocket()
+    await manager.connect("alice", alice)
+    await manager.connect("bob", bob)
+
+    await manager.send_personal_message("hi alice", "alice")
+    await manager.broadcast("hello all")
+    await _wait_for(lambda: len(alice.frames) == 2 and len(bob.frames) == 1)
+    assert alice.frames == ["hi alice", "hello all"]
+    assert bob.frames == ["hello all"]
+
+    # 最后一个设备断开后退订用户频道
+    manager.disconnect("alice")
+    await asyncio.sleep(0)
+    await manager.send_personal_message("gone", "alice")
+    assert manager.backend.stats()["channels"] == 2  # 广播频道 + bob
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_routes_across_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+
+    def backend():
+        client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        return RedisPubSub(client=client)
+
+    worker_a = ConnectionManager(backend=backend())
+    worker_b = ConnectionManager(backend=backend())
+    phone, laptop = RecordingSocket(), RecordingSocket()
+    await worker_a.connect("user", phone)
+    await worker_b.connect("user", laptop)
+
+    # 在 worker A 上生成的回复同时送达 worker B 上的设备，A 本地不重复投递
+    send = worker_a.user_sender("user")
+    await send("u1", "", "start")
+    await send("u1", "你好", "done")
+    await worker_b.send_personal_message("notice", "user")
+    await _wait_for(lambda: len(phone.frames) == 3 and len(laptop.frames) == 3)
+
+    assert [json.loads(f)["status"] for f in laptop.frames[:2]] == ["start", "done"]
+    assert phone.frames[:2] == laptop.frames[:2]
+    assert phone.frames[2] == laptop.frames[2] == "notice"
+
+    await worker_a.close()
+    await worker_b.close()
+
+
+def test_backend_requires_channel_methods():
+    class Incomplete(PubSubBackend):
+        async def publish(self, channel, data):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.asyncio
+async def test_redis_slow_handler_does_not_block_reading():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    backend = RedisPubSub(client=client)
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(channel, data):
+        if data == "slow":
+            await release.wait()
+        handled.append(data)
+
+    await backend.start(handler)
+    await backend.subscribe("a")
+    await backend.subscribe("b")
+    await backend.publish("a", "slow")
+    await backend.publish("b", "fast")
+    await _wait_for(lambda: handled == ["fast"])
+
+    release.set()
+    await _wait_for(lambda: handled == ["fast", "slow"])
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_user_events_reach_other_workers_only():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+
+    def backend():
+        client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        return RedisPubSub(client=client)
+
+    workers = [ConnectionManager(backend=backend()) for _ in range(3)]
+    events = {i: [] for i in range(3)}
+    for i, worker in enumerate(workers):
+
+        async def handler(user_id, data, i=i):
+            events[i].append((user_id, data))
+
+        worker.on_event("stop", handler)
+        worker.on_event("memory", handler)
+        await worker.start()
+    # 用户的设备连接在 worker 0 和 1 上，worker 2 没有该用户的连接
+    await workers[0].connect("user", RecordingSocket())
+    await workers[1].connect("user", RecordingSocket())
+
+    await workers[0].publish_event("stop", "user", uuid="m1")
+    await _wait_for(lambda: events[1])
+    await workers[0].publish_event("memory", "user", everywhere=True)
+    await _wait_for(lambda: len(events[1]) == 2 and events[2])
+
+    # 不指定用户的全局事件发送给所有 worker
+    await workers[0].publish_event("memory", doc_version="v2")
+    await _wait_for(lambda: len(events[1]) == 3 and len(events[2]) == 2)
+
+    assert events[0] == []
+    assert events[1] == [
+        ("user", {"uuid": "m1"}),
+        ("user", {}),
+        ("", {"doc_version": "v2"}),
+    ]
+    assert events[2] == [("user", {}), ("", {"doc_version": "v2"})]
+    for worker in workers:
+        await worker.close()
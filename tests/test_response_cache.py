@@ -0,0 +1,45 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.agents.response_cache import SemanticResponseCache
+
+
+def test_lookup_hits_only_above_threshold():
+    cache = SemanticResponseCache(threshold=0.95, doc_version="v1")
+    cache.store("怎么修改昵称", [1.0, 0.0], "在设置页修改", "m", latency=2.0)
+
+    assert cache.lookup([0.99, 0.05]).answer == "在设置页修改"
+    assert cache.lookup([0.6, 0.8]) is None
+    stats = cache.stats()
+    assert stats["lookups"] == 2 and stats["hits"] == 1
+
+
+def test_expired_and_invalidated_entries_are_dropped():
+    cache = SemanticResponseCache(ttl=0, doc_version="v1")
+    cache.store("q", [1.0, 0.0], "a", "m", latency=1.0)
+    assert cache.lookup([1.0, 0.0]) is None
+
+    cache = SemanticResponseCache(doc_version="v1")
+    cache.store("q", [1.0, 0.0], "a", "m", latency=1.0)
+    cache.invalidate("v2")
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.stats()["doc_version"] == "v2"
+
+
+def test_disabled_cache_never_stores():
+    cache = SemanticResponseCache(enabled=False)
+    cache.store("q", [1.0, 0.0], "a", "m", latency=1.0)
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_only_unrewritten_tool_queries_are_standalone():
+    from app.agents.response_cache import is_standalone_query
+
+    assert is_standalone_query("怎么修改昵称", "怎么修改昵称？")
+    assert is_standalone_query("How do I reset it", "how do I reset it?")
+    # 追问被模型结合历史改写后与原话不同，不能缓存
+    assert not is_standalone_query("修改昵称的第二步是什么", "那第二步呢")
+    assert not is_standalone_query("", "")
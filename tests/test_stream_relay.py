@@ -0,0 +1,78 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import json
+import pytest
+from app.core.stream_relay import FrameEncoder, StreamRelay, StreamRelayStats
+from app.models.ws_message import StreamMessage
+
+
+def test_encoder_matches_pydantic_json():
+    encoder = FrameEncoder('u-"1"')
+    for content in ["", "你好，\n世界", 'quote " \\ \t \x01 😀']:
+        for status in ("start", "streaming", "done", "error"):
+            expected = StreamMessage(
+                uuid='u-"1"', content=content, status=status
+            ).model_dump_json()
+            assert encoder.encode(content, status) == expected
+
+
+@pytest.mark.asyncio
+async def test_relay_coalesces_by_size_and_keeps_protocol():
+    frames = []
+
+    async def send(uuid, content, status):
+        frames.append({"uuid": uuid, "content": content, "status": status})
+
+    relay = StreamRelay(
+        send, "u", flush_interval=10, max_bytes=6, stats=StreamRelayStats()
+    )
+    for piece in ["ab", "cd", "ef", "g"]:
+        await relay.push(piece)
+    assert await relay.finish() == "abcdefg"
+
+    assert [f["status"] for f in frames] == ["start", "streaming", "done"]
+    assert [f["content"] for f in frames] == ["", "abcdef", "g"]
+    assert relay.stats.chunks == 4 and relay.stats.frames == 3
+
+
+@pytest.mark.asyncio
+async def test_relay_flushes_after_interval():
+    frames = []
+
+    async def send(uuid, content, status):
+        frames.append({"uuid": uuid, "content": content, "status": status})
+
+    relay = StreamRelay(
+        send, "u", flush_interval=0.01, max_bytes=1024, stats=StreamRelayStats()
+    )
+    await relay.push("慢")
+    await asyncio.sleep(0.05)
+    assert [f["content"] for f in frames] == ["", "慢"]
+
+    await relay.finish()
+    assert frames[-1] == {"uuid": "u", "content": "", "status": "done"}
+
+
+@pytest.mark.asyncio
+async def test_stop_sends_buffered_content_and_returns_partial():
+    frames = []
+
+    async def send(uuid, content, status):
+        frames.append({"uuid": uuid, "content": content, "status": status})
+
+    relay = StreamRelay(
+        send, "u", flush_interval=10, max_bytes=1024, stats=StreamRelayStats()
+    )
+    await relay.push("说到")
+    await relay.push("一半")
+    assert await relay.stop() == "说到一半"
+
+    assert [(f["status"], f["content"]) for f in frames] == [
+        ("start", ""),
+        ("done", "说到一半"),
+    ]
+    assert relay.stats.stopped == 1
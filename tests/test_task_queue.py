@@ -0,0 +1,69 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import pytest
+from app.core.task_queue import BackgroundTaskQueue
+
+
+@pytest.mark.asyncio
+async def test_submit_runs_in_background_and_drains():
+    queue = BackgroundTaskQueue(name="test", concurrency=2, maxsize=10)
+    done = []
+
+    async def job(n):
+        await asyncio.sleep(0.01)
+        done.append(n)
+
+    for i in range(5):
+        assert await queue.submit(f"job-{i}", job, i)
+
+    # 提交后立即返回，任务在后台执行
+    assert len(done) < 5
+    await queue.drain(timeout=5)
+
+    assert sorted(done) == [0, 1, 2, 3, 4]
+    stats = queue.stats()
+    assert stats["completed"] == 5
+    assert stats["depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_backpressure_drops_when_full():
+    queue = BackgroundTaskQueue(name="test", concurrency=1, maxsize=1, put_timeout=0.05)
+    release = asyncio.Event()
+
+    async def blocker():
+        await release.wait()
+
+    assert await queue.submit("running", blocker)
+    await asyncio.sleep(0)  # worker 取走第一个任务
+    assert await queue.submit("queued", blocker)
+    assert not await queue.submit("overflow", blocker)
+    assert queue.stats()["dropped"] == 1
+
+    release.set()
+    await queue.drain(timeout=5)
+    assert queue.stats()["completed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_job_does_not_stop_worker():
+    queue = BackgroundTaskQueue(name="test", concurrency=1, maxsize=10)
+    done = []
+
+    async def boom():
+        raise RuntimeError("boom")
+
+    async def ok():
+        done.append(True)
+
+    await queue.submit("boom", boom)
+    await queue.submit("ok", ok)
+    await queue.drain(timeout=5)
+
+    assert done == [True]
+    assert queue.stats()["failed"] == 1
+    assert not await queue.submit("after-close", ok)